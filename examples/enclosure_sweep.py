@@ -0,0 +1,52 @@
+"""
+Creates enclosure variants over a grid of wall thicknesses and lid radii in
+parallel, see py2scad.sweep.
+"""
+from py2scad import *
+from py2scad.sweep import sweep
+
+INCH2MM = 25.4
+
+params = {
+        'inner_dimensions'        : (8*INCH2MM, 5.15*INCH2MM, 1.5*INCH2MM),
+        'wall_thickness'          : (1.0/8.0)*INCH2MM,
+        'lid_radius'              : 0.25*INCH2MM,
+        'top_x_overhang'          : 0.2*INCH2MM,
+        'top_y_overhang'          : 0.2*INCH2MM,
+        'bottom_x_overhang'       : 0.75*INCH2MM,
+        'bottom_y_overhang'       : 0.2*INCH2MM,
+        'lid2front_tabs'          : (0.2,0.5,0.8),
+        'lid2side_tabs'           : (0.25, 0.75),
+        'side2side_tabs'          : (0.5,),
+        'lid2front_tab_width'     : 0.75*INCH2MM,
+        'lid2side_tab_width'      : 0.75*INCH2MM,
+        'side2side_tab_width'     : 0.5*INCH2MM,
+        'standoff_diameter'       : 0.25*INCH2MM,
+        'standoff_offset'         : 0.05*INCH2MM,
+        'standoff_hole_diameter'  : 0.116*INCH2MM,
+        'hole_list'               : [],
+        }
+
+grid = {
+        'wall_thickness' : [3.0, 1.0/8.0*INCH2MM, 4.0],
+        'lid_radius'     : [3.0, 0.25*INCH2MM, 8.0],
+        }
+
+def build(params):
+    enclosure = Basic_Enclosure(params)
+    enclosure.make()
+    prog = SCAD_Prog()
+    prog.fn = 50
+    prog.add(enclosure.get_assembly(explode=(5,5,5)))
+    return prog
+
+if __name__ == '__main__':
+    for result in sweep(build, grid, base_params=params, directory='enclosures',
+                        name='enclosure_{index:02d}'):
+        if result.error:
+            print result.name, 'failed'
+            print result.error
+        elif result.duplicate_of:
+            print result.name, 'same as', result.duplicate_of
+        else:
+            print result.name, result.scadfile
@@ -0,0 +1,243 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Keyframe animation of $t driven assemblies.
+
+Keyframes are compiled into openscad lookup() tables of $t, which can be
+given to AnimRotate and AnimTranslate (or pasted into any expression):
+
+    swing = Keyframes([(0.0, 0.0), (0.5, 90.0), (1.0, 0.0)])
+    slide = Keyframes([(0.0, [0,0,0]), (0.5, [0,0,0]), (1.0, [0,0,20])])
+    lid = AnimTranslate(AnimRotate(lid, a=swing, v=[1,0,0]), v=slide)
+
+Vector keyframes also serve as the explode vectors of the highlevel
+get_assembly methods, e.g. enclosure.get_assembly(explode=slide).
+
+export_frames renders the frames of the animation in parallel, passing $t
+with -D so the program is only generated once. The keyframes are evaluated in
+python as well, so frames which come out the same (e.g. holds between
+keyframes) are rendered once and copied, and frames unchanged since the last
+export are not rendered again.
+"""
+import os
+import json
+import shutil
+import numpy
+import base
+import render
+import utility
+import expression
+
+# Records the keys of the frames in an export directory
+MANIFEST = '.py2scad_frames.json'
+
+class Keyframes(expression.Expr):
+    """
+    A value, scalar or vector, interpolated linearly between keyframes. Before
+    the first and after the last keyframe the value is held, as by lookup.
+    Keyframes are expressions, so they can be used in arithmetic and anywhere
+    a value is formatted.
+
+    frames = list of (t, value) pairs
+    var    = the openscad variable the value is looked up by
+    """
+
+    def __init__(self, frames, var='$t'):
+        if not frames:
+            raise ValueError, 'no keyframes'
+        frames = sorted(frames, key=lambda frame: frame[0])
+        self.var = var
+        self.times = numpy.array([frame[0] for frame in frames], dtype=float)
+        try:
+            self.values = numpy.array([frame[1] for frame in frames], dtype=float)
+        except ValueError:
+            raise ValueError, 'keyframe values must all be numbers or vectors of the same length'
+        self.is_vector = self.values.ndim == 2
+
+    def __call__(self, t):
+        """Returns the value at t, a float or a tuple of floats for vectors."""
+        if self.is_vector:
+            return tuple(numpy.interp(t, self.times, col) for col in self.values.T)
+        return float(numpy.interp(t, self.times, self.values))
+
+    def __iter__(self):
+        """Iterate over the components of vector keyframes as scalar keyframes."""
+        if not self.is_vector:
+            raise TypeError, 'scalar keyframes are not iterable'
+        for col in self.values.T:
+            yield Keyframes(zip(self.times, col), var=self.var)
+
+    def table_str(self, values):
+        rows = ['[{0}, {1}]'.format(utility.val_to_str(t), utility.val_to_str(val))
+                for t, val in zip(self.times, values)]
+        return 'lookup({0}, [{1}])'.format(self.var, ', '.join(rows))
+
+    def lookup_str(self):
+        """The openscad expression of the value, one lookup per component."""
+        if self.is_vector:
+            return '[' + ', '.join(self.table_str(col) for col in self.values.T) + ']'
+        return self.table_str(self.values)
+
+    def expr_str(self):
+        return self.lookup_str()
+
+    def variables(self):
+        if self.var.startswith('$'):
+            return set()
+        return set([self.var])
+
+    def evaluate(self, env):
+        try:
+            t = env[self.var]
+        except KeyError:
+            raise ValueError, 'no value for {0}'.format(self.var)
+        return self(t)
+
+    def __repr__(self):
+        return 'Keyframes({0!r}, var={1!r})'.format(zip(self.times, self.values.tolist()), self.var)
+
+class Frame(object):
+    """
+    A frame of an exported animation.
+
+    index    = frame number
+    t        = value of $t
+    filename = output file
+    key      = hash identifying what the frame renders
+    result   = Render_Result of the render, None if the frame was not rendered
+    source   = 'render', 'copy' (same as an earlier frame) or 'cache'
+               (unchanged since the last export)
+    """
+
+    def __init__(self, index, t, filename, key):
+        self.index = index
+        self.t = t
+        self.filename = filename
+        self.key = key
+        self.result = None
+        self.source = 'render'
+
+    def ok(self):
+        if self.result is None:
+            return os.path.exists(self.filename)
+        return self.result.ok()
+
+def get_keyframes(prog):
+    """
+    Returns the list of Keyframes used by the objects in prog, including those
+    inside expressions such as the exploded offsets of get_assembly.
+    """
+    keyframes = []
+    def add(val):
+        if isinstance(val, Keyframes):
+            if not any(val is kf for kf in keyframes):
+                keyframes.append(val)
+        elif isinstance(val, expression.Expr):
+            for item in val.operands():
+                add(item)
+        elif isinstance(val, (list, tuple)):
+            for item in val:
+                add(item)
+    for obj, depth, path in base.iter_tree(prog):
+        for val in getattr(obj, '__dict__', {}).values():
+            add(val)
+    return keyframes
+
+def frame_times(num_frames):
+    """$t of each frame, as stepped by openscad: 0, 1/num_frames, ..."""
+    return [i/float(num_frames) for i in range(num_frames)]
+
+def frame_keys(text, keyframes, times):
+    """
+    Returns a key for each frame which is the same for frames rendering the
+    same: the program less its lookup tables, the keyframe values and, if $t
+    is also used outside of the keyframes, $t itself.
+    """
+    free_text = text
+    for kf in keyframes:
+        free_text = free_text.replace(kf.lookup_str(), '')
+    uses_t = '$t' in free_text
+    keys = []
+    for t in times:
+        key = {'text': free_text, 'values': [kf(t) for kf in keyframes]}
+        if uses_t:
+            key['t'] = t
+        keys.append(utility.params_hash(key))
+    return keys
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as fid:
+            return json.load(fid)
+    except (IOError, ValueError):
+        return {}
+
+def write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST), 'w') as fid:
+        json.dump(manifest, fid, indent=1, sort_keys=True)
+
+def export_frames(prog, num_frames, directory, name='frame_{index:04d}', ext='.png',
+                  max_workers=4, openscad=None, timeout=None, cache=True):
+    """
+    Render the frames of an animation to files in directory. Returns the list
+    of Frames.
+
+    Arguments:
+        prog        = SCAD_Prog (or objects) animated by $t
+        num_frames  = number of frames, $t steps by 1/num_frames
+        directory   = output directory, created if needed
+        name        = frame file name, formatted with the frame index
+        ext         = output type, e.g. '.png' or '.stl'
+        max_workers = maximum number of concurrent openscad processes
+        openscad    = openscad executable (default render.OPENSCAD)
+        timeout     = timeout of each render in seconds
+        cache       = skip frames unchanged since the last export
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    text = render.scad_str(prog)
+    times = frame_times(num_frames)
+    keys = frame_keys(text, get_keyframes(prog), times)
+    manifest = read_manifest(directory) if cache else {}
+    frames = []
+    first = {}  # key -> first frame with the key
+    for index, (t, key) in enumerate(zip(times, keys)):
+        filename = os.path.join(directory, name.format(index=index) + ext)
+        frames.append(Frame(index, t, filename, key))
+    with render.Render_Pool(max_workers=max_workers, openscad=openscad,
+                            timeout=timeout, workdir=os.path.abspath(directory)) as pool:
+        jobs = []
+        for frame in frames:
+            basename = os.path.basename(frame.filename)
+            if cache and manifest.get(basename) == frame.key and os.path.exists(frame.filename):
+                frame.source = 'cache'
+                first.setdefault(frame.key, frame)
+            elif frame.key in first:
+                frame.source = 'copy'
+            else:
+                first[frame.key] = frame
+                job = pool.submit(text, outfile=frame.filename, defines={'$t': repr(frame.t)})
+                jobs.append((frame, job))
+        for frame, job in jobs:
+            frame.result = job.wait()
+    for frame in frames:
+        if frame.source == 'copy':
+            source = first[frame.key]
+            frame.result = source.result
+            if source.ok():
+                shutil.copyfile(source.filename, frame.filename)
+    manifest = dict((os.path.basename(frame.filename), frame.key) for frame in frames if frame.ok())
+    write_manifest(directory, manifest)
+    return frames
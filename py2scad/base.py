@@ -13,17 +13,35 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import os
+import sys
+import hashlib
+import threading
 from utility import TAB_WIDTH, val_to_str
 
+# Construction site recording, see record_sites.
+_record_sites = False
+_core_modules = ('base', 'primitives', 'transforms')
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+# Level of detail policy of the program being written in each thread, see
+# SCAD_Prog.
+_lod_state = threading.local()
+
+def get_active_lod():
+    """Level of detail policy of the program being written by this thread."""
+    return getattr(_lod_state, 'lod', None)
+
 class SCAD_Prog(object):
     """Wrapper for Openscad program."""
 
-    def __init__(self, fn=None, fa=None, fs=None):
+    def __init__(self, fn=None, fa=None, fs=None, lod=None):
         self.objlist = []
         # Global facet settings
         self.fn = fn
         self.fa = fa
         self.fs = fs
+        # Level of detail policy, see lod.LOD_Policy
+        self.lod = lod
 
     def add(self, obj):
         """Add a scad object to this program container."""
@@ -35,22 +53,35 @@ class SCAD_Prog(object):
     def __str__(self):
         rtn_str = ''
         if not self.fn == None:
-            rtn_str = '%s$fn = %d;\n'%(rtn_str, self.fn)
+            rtn_str = '%s$fn = %d;\n'%(rtn_str, int(self.fn))
         if not self.fa == None:
-            rtn_str = '%s$fa = %d;\n'%(rtn_str, self.fa)
+            rtn_str = '%s$fa = %s;\n'%(rtn_str, val_to_str(self.fa))
         if not self.fs == None:
-            rtn_str = '%s$fs = %d;\n'%(rtn_str, self.fs)
+            rtn_str = '%s$fs = %s;\n'%(rtn_str, val_to_str(self.fs))
 
-        for obj in self.objlist:
-            rtn_str = '%s%s\n\n'%(rtn_str,obj)
+        # Objects read the policy while they are written
+        prev_lod = get_active_lod()
+        _lod_state.lod = self.lod
+        try:
+            emitted = set()
+            for obj in self.objlist:
+                # Blocks such as primitives.Variables are written once
+                if getattr(obj, 'emit_once', False):
+                    if id(obj) in emitted:
+                        continue
+                    emitted.add(id(obj))
+                rtn_str = '%s%s\n\n'%(rtn_str,obj)
+        finally:
+            _lod_state.lod = prev_lod
 
         return rtn_str
 
     def write(self, filename):
-        fid = open(filename, 'w')
-        fid.write(get_header_str(filename))
-        fid.write('{0}'.format(self))
-        fid.close()
+        """
+        Write the program to filename. Unchanged files are not rewritten, so
+        their modification times are kept. Returns True if the file was written.
+        """
+        return write_if_changed(filename, get_header_str(filename) + '{0}'.format(self))
 
 class SCAD_Object(object):
     """Scad object wrapper base class."""
@@ -68,9 +99,29 @@ class SCAD_Object(object):
         self.fn = fn
         # Integrated transform
         self.translate = translate
+        # Profiling, id tag written with the object and where it was created
+        self.node_id = None
+        self.site = None
+        if _record_sites:
+            self.site = get_construction_site()
+
+    def feature_size(self):
+        """
+        Returns the radius used to choose the facets of round objects, None
+        for objects without facets or of unknown size.
+        """
+        return None
 
     def facets(self):
-        """Return any facet arguments that are set."""
+        """
+        Return any facet arguments that are set. While a program with a level
+        of detail policy is written the policy sets $fn from feature_size.
+        """
+        lod = get_active_lod()
+        if lod is not None and lod.applies(self):
+            size = self.feature_size()
+            if size is not None:
+                return ", $fn={0}".format(lod.get_fn(size))
         facets = ''
         if self.fn: # $fn is exclusive!
             return ", $fn={0}".format(self.fn)
@@ -95,6 +146,8 @@ class SCAD_Object(object):
         comment = ''
         if self.comment:
             comment = tab_str + '// ' + self.comment + '\n'
+        if self.node_id:
+            comment += tab_str + '// node ' + self.node_id + '\n'
         rtn_str = '{0}{1}{2}'.format(tab_str, mod_str,
                                self.cmd_str(tab_level=tab_level))
         if self.translate:
@@ -137,6 +190,68 @@ class SCAD_CMP_Object(SCAD_Object):
 
         return rtn_str
 
+def record_sites(flag=True):
+    """
+    Turn recording of object construction sites on or off. When on, each new
+    object stores the python file, line and function it was created from in
+    its site attribute, see get_construction_site. Used for profiling.
+    """
+    global _record_sites
+    _record_sites = flag
+
+def get_construction_site(num=3):
+    """
+    Returns a tuple of up to num (filename, line, function) frames, innermost
+    first, for the code creating an object. Frames in the core py2scad modules
+    (the object constructors) are skipped.
+    """
+    site = []
+    frame = sys._getframe(1)
+    while frame is not None and len(site) < num:
+        filename = frame.f_code.co_filename
+        module = os.path.splitext(os.path.basename(filename))[0]
+        in_core = (module in _core_modules and
+                   os.path.dirname(os.path.abspath(filename)) == _package_dir)
+        if not in_core:
+            site.append((filename, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(site)
+
+def iter_tree(obj, depth=0, path='0'):
+    """
+    Iterate over an object tree, yielding (obj, depth, path) for each object
+    where path is the dotted child index path from the root. obj may be a
+    SCAD_Prog, an object, or a list of objects. Strings (e.g. module calls)
+    and variable declarations are yielded but have no children.
+    """
+    if isinstance(obj, SCAD_Prog):
+        obj = obj.objlist
+    if type(obj) == list:
+        for i, item in enumerate(obj):
+            for rtn_val in iter_tree(item, depth, '{0}'.format(i)):
+                yield rtn_val
+        return
+    yield obj, depth, path
+    if getattr(obj, 'cmp', False):
+        for i, child in enumerate(obj.obj):
+            for rtn_val in iter_tree(child, depth+1, '{0}.{1}'.format(path, i)):
+                yield rtn_val
+
+def write_if_changed(filename, text):
+    """
+    Write text to filename unless the file already has the same content, by
+    comparing content hashes. Returns True if the file was written.
+    """
+    if os.path.exists(filename):
+        # Universal newlines, the file is written in text mode
+        with open(filename, 'rU') as fid:
+            old_hash = hashlib.sha1(fid.read()).hexdigest()
+        if old_hash == hashlib.sha1(text).hexdigest():
+            return False
+    with open(filename, 'w') as fid:
+        fid.write(text)
+    return True
+
 def get_header_str(filename):
     import textwrap
     width = 70
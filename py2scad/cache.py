@@ -0,0 +1,276 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Part cache for the highlevel builders.
+
+Parts are memoized by a canonical hash of their parameters (see
+utility.params_hash), so builders called repeatedly with the same parameters,
+e.g. the same tabbed plate across a product line, are not rebuilt. Each call
+returns its own shell of the cached part, see own_part: the top node is the
+caller's, so setting its mod, comment, etc. or adding children does not affect
+other callers, but the subtree below it is shared and must not be changed.
+
+Caching is off by default. It is enabled by setting a cache, bounded to the
+max_size most recently used parts and optionally persisted to a directory of
+pickles shared between processes and runs:
+
+    cache.set_part_cache(cache.Part_Cache(max_size=4096, directory='.parts'))
+
+set_part_cache(None) disables caching again. Keys include a hash of the
+py2scad sources, so parts pickled by other versions are not reused.
+"""
+import os
+import copy
+import glob
+import hashlib
+import inspect
+import cPickle
+import tempfile
+import functools
+import threading
+import itertools
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import base
+import utility
+
+# Default bound of the number of parts kept in memory
+DEFAULT_MAX_SIZE = 1024
+
+_source_hash = None
+
+def source_hash():
+    """sha1 of the py2scad module sources, part of every cache key."""
+    global _source_hash
+    if _source_hash is None:
+        sha = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(glob.glob(os.path.join(directory, '*.py'))):
+            with open(filename, 'rb') as fid:
+                sha.update(fid.read())
+        _source_hash = sha.hexdigest()
+    return _source_hash
+
+def own_part(part):
+    """
+    Returns a shell of part for a caller to own: a shallow copy of the top
+    node with its own list of children, sharing the children themselves.
+    """
+    if isinstance(part, list):
+        return list(part)
+    if isinstance(part, base.SCAD_Object):
+        # What copy.copy does for these, without its overhead
+        owned = object.__new__(part.__class__)
+        owned.__dict__.update(part.__dict__)
+    else:
+        owned = copy.copy(part)
+    if isinstance(getattr(part, 'obj', None), list):
+        owned.obj = list(part.obj)
+    return owned
+
+# Marks values in memory keys which are kept by their repr
+_REPR = object()
+# Values which are their own memory key
+_KEY_TYPES = frozenset([float, int, long, str, type(None)])
+
+def memory_key(val):
+    """
+    Returns a hashable key of a parameter value, equal for the same values
+    as utility.canonical_str but much cheaper to compute. Used to find parts
+    in memory, the disk keys are hashes of the canonical strings.
+    """
+    val_type = type(val)
+    if val_type in _KEY_TYPES:
+        return val
+    if val_type is list or val_type is tuple:
+        return tuple([item if type(item) in _KEY_TYPES else memory_key(item) for item in val])
+    if isinstance(val, dict):
+        items = [(k if type(k) in _KEY_TYPES else memory_key(k),
+                  v if type(v) in _KEY_TYPES else memory_key(v)) for k, v in val.iteritems()]
+        items.sort()
+        return (dict, tuple(items))
+    if numpy is not None and isinstance(val, (numpy.ndarray, numpy.generic)):
+        return memory_key(val.tolist())
+    if isinstance(val, (list, tuple)):
+        return tuple([memory_key(item) for item in val])
+    return (_REPR, repr(val))
+
+def shared_maker(maker):
+    """
+    Returns a function which builds a part with maker on its first call and
+    returns a shell of that part (see own_part) on every call. Used to build
+    identical parts once, e.g. the front and back panels of an enclosure.
+    """
+    parts = []
+    def make():
+        if not parts:
+            parts.append(maker())
+        return own_part(parts[0])
+    return make
+
+class Part_Cache(object):
+    """
+    Least recently used cache of parts, with optional persistence.
+
+    max_size  = maximum number of parts kept in memory, None for no bound
+    directory = directory the parts are also pickled to, None for none
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, directory=None):
+        self.max_size = max_size
+        self.directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.parts = {}     # memory key -> [last use, part]
+        self.clock = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.parts)
+
+    def key(self, kind, params):
+        """
+        Cache key of a part of the given kind (builder name) and parameters,
+        for the current py2scad sources.
+        """
+        text = '{0}\n{1}\n{2}'.format(kind, source_hash(), utility.canonical_str(params))
+        return hashlib.sha1(text).hexdigest()
+
+    def get_filename(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get_part(self, kind, params, maker):
+        """
+        Returns a shell (see own_part) of the cached part of the given kind
+        and parameters, calling maker() to build it if it is not cached. The
+        caller owns the top node of the returned part, its subtree is shared.
+        """
+        mem_key = (kind, memory_key(params))
+        with self.lock:
+            entry = self.parts.get(mem_key)
+            if entry is not None:
+                entry[0] = next(self.clock)
+                self.hits += 1
+                return own_part(entry[1])
+        part = None
+        if self.directory is not None:
+            key = self.key(kind, params)
+            try:
+                part = self.load(key)
+            except KeyError:
+                pass
+        with self.lock:
+            if part is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if part is None:
+            part = maker()
+            if self.directory is not None:
+                self.save(key, part)
+        with self.lock:
+            self.parts[mem_key] = [next(self.clock), part]
+            self.evict()
+        return own_part(part)
+
+    def clear(self, disk=False):
+        """Empty the cache, and its directory if disk is True."""
+        with self.lock:
+            self.parts.clear()
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def evict(self):
+        if self.max_size is None:
+            return
+        # Only on misses, which build a part anyway
+        while len(self.parts) > self.max_size:
+            del self.parts[min(self.parts, key=lambda mem_key: self.parts[mem_key][0])]
+
+    def load(self, key):
+        """Load a part from the directory, raises KeyError if not found."""
+        if self.directory is None:
+            raise KeyError(key)
+        try:
+            with open(self.get_filename(key), 'rb') as fid:
+                return cPickle.load(fid)
+        except Exception:
+            # Missing or unreadable (e.g. truncated or stale) pickles are rebuilt
+            raise KeyError(key)
+
+    def save(self, key, part):
+        # Write to a temporary file and rename, so readers never see partial files
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fid:
+                cPickle.dump(part, fid, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmpname, self.get_filename(key))
+        except (cPickle.PicklingError, TypeError):
+            # Parts which cannot be pickled are only kept in memory
+            os.remove(tmpname)
+
+# Off by default, see set_part_cache
+_part_cache = None
+
+def get_part_cache():
+    """Returns the part cache used by the builders, None if disabled."""
+    return _part_cache
+
+def set_part_cache(part_cache):
+    """Set the part cache used by the builders, None disables caching."""
+    global _part_cache
+    _part_cache = part_cache
+
+def get_part(kind, params, maker):
+    """
+    Returns the part of the given kind and parameters from the part cache,
+    built by maker() if not cached (or if caching is disabled).
+    """
+    part_cache = _part_cache
+    if part_cache is None:
+        return maker()
+    return part_cache.get_part(kind, params, maker)
+
+def cached(kind=None):
+    """
+    Decorator caching the parts returned by a builder function, keyed by the
+    function name (or kind) and the values of all of its arguments.
+    """
+    def decorator(func):
+        name = kind or func.__name__
+        spec = inspect.getargspec(func)
+        arg_names = frozenset(spec.args)
+        defaults = dict(zip(spec.args[len(spec.args) - len(spec.defaults or ()):], spec.defaults or ()))
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _part_cache is None:
+                return func(*args, **kwargs)
+            if (spec.varargs or spec.keywords or len(args) > len(spec.args)
+                    or not arg_names.issuperset(kwargs)):
+                params = inspect.getcallargs(func, *args, **kwargs)
+            else:
+                # Same as getcallargs for plain arguments, without its cost
+                params = dict(defaults)
+                params.update(zip(spec.args, args))
+                params.update(kwargs)
+            return _part_cache.get_part(name, params, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,408 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Direct DXF (R12) and SVG output of flat geometry.
+
+Writes profiles (profile2d.Profile) and simple 2D scad trees straight to
+files for laser cutting, without rendering with openscad. Circles are written
+as true circles rather than polygons. Scad trees may contain squares, circles,
+polygons, 2D transforms (translate, rotate and mirror which keep the xy plane,
+scale), unions, differences and arrays; every outline and hole in them is
+written as a closed path.
+
+No boolean operations are computed, so unions and differences are limited to
+what can be written as separate paths: the members of a union (including the
+implicit union of the children of a transform) must not overlap or touch, and
+the cutters of a difference must lie inside the first child and not overlap
+or touch each other or its outline. Anything else raises ValueError. Circles
+are checked as polygons of CHECK_SEGMENTS sides.
+
+The shapes are streamed to the file as they are generated, only the members
+of unions and differences are held to be checked. SVG output walks the items
+twice, first to find the bounds.
+
+    write_dxf('panels.dxf', enclosure.get_profiles().values())
+    write_svg('panels.svg', [Translate(Square([10,20]), v=[5,0,0]), Circle(r=3)])
+"""
+import os
+import math
+import numpy
+import base
+import primitives
+import transforms
+import profile2d
+
+# Sides of the polygons circles are checked as
+CHECK_SEGMENTS = 64
+# Relative tolerance of the overlap checks
+CHECK_TOL = 1.0e-9
+
+class Geometry(object):
+    """
+    Flat geometry to write: closed paths (arrays of shape (N,2)) and circles
+    (an array of (x, y, radius) rows).
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.circles = []
+
+    def add_profile(self, profile, mat=None):
+        """Add a profile transformed by the 3x3 affine matrix mat."""
+        for shape in _profile_shapes(profile, mat):
+            self.add_shape(shape)
+
+    def add_circle(self, mat, x, y, r):
+        self.add_shape(circle_shape(mat, x, y, r))
+
+    def add_shape(self, shape):
+        kind, value = shape
+        if kind == 'path':
+            self.paths.append(value)
+        else:
+            self.circles.append(value)
+
+    def shapes(self):
+        for path in self.paths:
+            yield 'path', path
+        for circle in self.circles:
+            yield 'circle', circle
+
+    def bounds(self):
+        """Returns (xmin, ymin, xmax, ymax) of the geometry."""
+        return shape_bounds(self.shapes())
+
+def circle_shape(mat, x, y, r):
+    """The ('circle', (x, y, r)) shape of a circle transformed by mat."""
+    scale = 1.0
+    if mat is not None:
+        lin = mat[:2,:2]
+        scale = math.sqrt(abs(numpy.linalg.det(lin)))
+        if not numpy.allclose(numpy.dot(lin, lin.T), scale**2*numpy.eye(2)):
+            raise ValueError, 'circles can only be exported with uniform scaling'
+    (cx, cy), = apply_matrix(mat, [(x, y)]).tolist()
+    return 'circle', (cx, cy, r*scale)
+
+def shape_bounds(shapes):
+    """Returns (xmin, ymin, xmax, ymax) of an iterable of shapes."""
+    lower = numpy.array([numpy.inf, numpy.inf])
+    upper = -lower
+    for kind, value in shapes:
+        if kind == 'path':
+            lower = numpy.minimum(lower, value.min(axis=0))
+            upper = numpy.maximum(upper, value.max(axis=0))
+        else:
+            x, y, r = value
+            lower = numpy.minimum(lower, (x - r, y - r))
+            upper = numpy.maximum(upper, (x + r, y + r))
+    if numpy.isinf(lower[0]):
+        return 0.0, 0.0, 0.0, 0.0
+    return lower[0], lower[1], upper[0], upper[1]
+
+def apply_matrix(mat, points):
+    points = profile2d.as_points(points)
+    if mat is None:
+        return points
+    return numpy.dot(points, mat[:2,:2].T) + mat[:2,2]
+
+def translate_matrix(v):
+    mat = numpy.eye(3)
+    mat[:2,2] = v[:2]
+    return mat
+
+def linear_matrix(lin3d, name):
+    """2D affine matrix of a 3D linear map, which must keep the xy plane."""
+    lin3d = numpy.asarray(lin3d, dtype=float)
+    if not numpy.allclose(lin3d[2,:2], 0) or not numpy.allclose(lin3d[:2,2], 0):
+        raise ValueError, '{0} does not keep the xy plane'.format(name)
+    mat = numpy.eye(3)
+    mat[:2,:2] = lin3d[:2,:2]
+    return mat
+
+def rotation_matrix(obj):
+    """Rotation matrix of a Rotate object."""
+    if obj.a:
+        axis = numpy.asarray(obj.v, dtype=float)
+        axis = axis/numpy.sqrt(numpy.dot(axis, axis))
+        ang = numpy.radians(obj.a)
+        cross = numpy.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+        return (numpy.cos(ang)*numpy.eye(3) + numpy.sin(ang)*cross
+                + (1 - numpy.cos(ang))*numpy.outer(axis, axis))
+    # Angles about x, then y, then z
+    mat = numpy.eye(3)
+    for i, ang in enumerate(numpy.radians(numpy.asarray(obj.v, dtype=float))):
+        c, s = numpy.cos(ang), numpy.sin(ang)
+        j, k = [(1,2), (2,0), (0,1)][i]
+        rot = numpy.eye(3)
+        rot[j,j], rot[j,k], rot[k,j], rot[k,k] = c, -s, s, c
+        mat = numpy.dot(rot, mat)
+    return mat
+
+def get_geometry(items):
+    """
+    Returns the Geometry of items: a profile, scad object, SCAD_Prog, or a
+    list of them. Raises ValueError for objects which are not flat.
+    """
+    geometry = Geometry()
+    for shape in iter_shapes(items):
+        geometry.add_shape(shape)
+    return geometry
+
+def iter_shapes(items):
+    """
+    Generates the shapes of items (see get_geometry): ('path', points) for
+    closed paths and ('circle', (x, y, r)) for circles. The items of a list
+    are separate parts and are not checked against each other.
+    """
+    if isinstance(items, base.SCAD_Prog):
+        items = items.objlist
+    if not isinstance(items, (list, tuple)):
+        items = [items]
+    for item in items:
+        for shape in _item_shapes(item, None):
+            yield shape
+
+def _profile_shapes(profile, mat):
+    for loop in [profile.outline] + profile.holes:
+        yield 'path', apply_matrix(mat, loop)
+    for x, y, r in profile.circles.tolist():
+        yield circle_shape(mat, x, y, r)
+
+def _union_shapes(children, mat):
+    """Shapes of the members of a union, which must not overlap."""
+    if len(children) == 1:
+        return _item_shapes(children[0], mat)
+    members = [list(_item_shapes(child, mat)) for child in children]
+    regions = [_Region(shapes) for shapes in members]
+    for i, region in enumerate(regions):
+        for other in regions[i+1:]:
+            if region.overlaps(other):
+                raise ValueError, 'overlapping union members can not be exported'
+    return (shape for shapes in members for shape in shapes)
+
+def _difference_shapes(children, mat):
+    """Shapes of a difference, the cutters must lie inside the first child."""
+    outline = list(_union_shapes(children[:1], mat))
+    cutters = list(_union_shapes(children[1:], mat))
+    if cutters:
+        outline_region = _Region(outline)
+        cutter_region = _Region(cutters)
+        if not outline_region.contains(cutter_region):
+            raise ValueError, 'difference cutters must lie inside the first child'
+    return outline + cutters
+
+def _item_shapes(item, mat):
+    if isinstance(item, (list, tuple)):
+        return _union_shapes(item, mat)
+    if isinstance(item, profile2d.Profile):
+        return _profile_shapes(item, mat)
+    if not isinstance(item, base.SCAD_Object):
+        raise ValueError, 'can not export {0!r}'.format(item)
+    if item.translate:
+        mat = _combine(mat, translate_matrix(item.translate))
+    if isinstance(item, primitives.Square):
+        size = item.size
+        if not isinstance(size, (list, tuple)):
+            size = [size, size]
+        center = (0, 0) if item.center else (0.5*size[0], 0.5*size[1])
+        return [('path', apply_matrix(mat, profile2d.rect_points(size[0], size[1], center)))]
+    elif isinstance(item, primitives.Circle):
+        return [circle_shape(mat, 0.0, 0.0, item.r)]
+    elif isinstance(item, primitives.Polygon):
+        points = numpy.asarray(item.points, dtype=float)
+        paths = item.paths
+        if paths is None or len(paths) == 0:
+            paths = [range(len(points))]
+        return [('path', apply_matrix(mat, points[numpy.asarray(path, dtype=int)])) for path in paths]
+    elif isinstance(item, transforms.Pattern_Array):
+        return _item_shapes(item.inline_obj(), mat)
+    elif isinstance(item, transforms.Union):
+        return _union_shapes(item.obj, mat)
+    elif isinstance(item, transforms.Difference):
+        return _difference_shapes(item.obj, mat)
+    elif isinstance(item, transforms.Translate):
+        return _union_shapes(item.obj, _combine(mat, translate_matrix(item.v)))
+    elif isinstance(item, transforms.Rotate):
+        return _union_shapes(item.obj, _combine(mat, linear_matrix(rotation_matrix(item), 'rotation')))
+    elif isinstance(item, transforms.Mirror):
+        v = numpy.asarray(item.v, dtype=float)
+        v = v/numpy.sqrt(numpy.dot(v, v))
+        return _union_shapes(item.obj, _combine(mat, linear_matrix(numpy.eye(3) - 2*numpy.outer(v, v), 'mirror')))
+    elif isinstance(item, transforms.Scale):
+        return _union_shapes(item.obj, _combine(mat, linear_matrix(numpy.diag(item.v), 'scale')))
+    elif isinstance(item, transforms.Color):
+        return _union_shapes(item.obj, mat)
+    else:
+        raise ValueError, 'can not export {0} objects'.format(item.__class__.__name__)
+
+class _Region(object):
+    """
+    The area enclosed by a list of shapes under the even-odd rule, used to
+    check unions and differences. Circles are checked as polygons.
+    """
+
+    def __init__(self, shapes):
+        self.loops = []
+        for kind, value in shapes:
+            if kind == 'circle':
+                x, y, r = value
+                value = profile2d.regular_polygon_points(r, CHECK_SEGMENTS, center=(x, y))
+            self.loops.append(numpy.asarray(value, dtype=float))
+        points = numpy.vstack(self.loops) if self.loops else numpy.zeros((1,2))
+        self.lower = points.min(axis=0)
+        self.upper = points.max(axis=0)
+        self.tol = CHECK_TOL*max(1.0, numpy.abs(points).max())
+
+    def contains_point(self, point):
+        """True if point lies inside the region."""
+        inside = False
+        for loop in self.loops:
+            x0, y0 = loop[:,0], loop[:,1]
+            x1, y1 = numpy.roll(x0, -1), numpy.roll(y0, -1)
+            # Only edges crossing the point's y, horizontal edges never do
+            cross = (y0 > point[1]) != (y1 > point[1])
+            x0, y0, x1, y1 = x0[cross], y0[cross], x1[cross], y1[cross]
+            x_cross = x0 + (point[1] - y0)*(x1 - x0)/(y1 - y0)
+            if numpy.count_nonzero(x_cross > point[0]) % 2:
+                inside = not inside
+        return inside
+
+    def boundaries_meet(self, other):
+        """True if an edge of the region crosses or touches one of other."""
+        if (numpy.any(self.lower > other.upper + self.tol)
+                or numpy.any(other.lower > self.upper + self.tol)):
+            return False
+        tol = max(self.tol, other.tol)
+        for loop in self.loops:
+            for other_loop in other.loops:
+                if _edges_meet(loop, other_loop, tol):
+                    return True
+        return False
+
+    def overlaps(self, other):
+        """True if the regions share any area or boundary."""
+        if self.boundaries_meet(other):
+            return True
+        # Boundaries which do not meet are each inside or outside the other region
+        return (any(other.contains_point(loop[0]) for loop in self.loops)
+                or any(self.contains_point(loop[0]) for loop in other.loops))
+
+    def contains(self, other):
+        """True if other lies inside the region without touching its boundary."""
+        if self.boundaries_meet(other):
+            return False
+        return (all(self.contains_point(loop[0]) for loop in other.loops)
+                and not any(other.contains_point(loop[0]) for loop in self.loops))
+
+def _edges_meet(loop0, loop1, tol):
+    """True if any edge of closed loop0 crosses or touches an edge of loop1."""
+    p0, p1 = loop0[:,None,:], numpy.roll(loop0, -1, axis=0)[:,None,:]
+    q0, q1 = loop1[None,:,:], numpy.roll(loop1, -1, axis=0)[None,:,:]
+    def side(a, b, c):
+        return (b[...,0] - a[...,0])*(c[...,1] - a[...,1]) - (b[...,1] - a[...,1])*(c[...,0] - a[...,0])
+    d0, d1 = side(q0, q1, p0), side(q0, q1, p1)
+    d2, d3 = side(p0, p1, q0), side(p0, p1, q1)
+    straddle = (d0*d1 <= tol**2) & (d2*d3 <= tol**2)
+    # Collinear edges only meet where their bounding boxes overlap
+    boxes = numpy.all((numpy.minimum(p0, p1) <= numpy.maximum(q0, q1) + tol)
+                      & (numpy.minimum(q0, q1) <= numpy.maximum(p0, p1) + tol), axis=-1)
+    return bool(numpy.any(straddle & boxes))
+
+def _combine(mat, child_mat):
+    if mat is None:
+        return child_mat
+    return numpy.dot(mat, child_mat)
+
+def _open(fileobj):
+    """Returns (file, close) for a file name or an open file."""
+    if hasattr(fileobj, 'write'):
+        return fileobj, False
+    return open(fileobj, 'w'), True
+
+# DXF ---------------------------------------------------------------------------
+
+def _dxf_pair(fid, code, value):
+    if isinstance(value, float):
+        value = '{0:0.6f}'.format(value)
+    fid.write('{0:3d}\n{1}\n'.format(code, value))
+
+def _dxf_path(fid, path, layer):
+    for code, value in ((0, 'POLYLINE'), (8, layer), (66, 1), (70, 1)):
+        _dxf_pair(fid, code, value)
+    for x, y in path.tolist():
+        for code, value in ((0, 'VERTEX'), (8, layer), (10, x), (20, y)):
+            _dxf_pair(fid, code, value)
+    _dxf_pair(fid, 0, 'SEQEND')
+    _dxf_pair(fid, 8, layer)
+
+def write_dxf(fileobj, items, layer='0'):
+    """
+    Write items (see get_geometry) to a DXF R12 file, fileobj is a file name
+    or an open file. Paths are closed POLYLINE entities and circles CIRCLE
+    entities on the given layer. The entities are written as they are
+    generated, a file which could not be completed is removed.
+    """
+    fid, close = _open(fileobj)
+    try:
+        for code, value in ((0, 'SECTION'), (2, 'HEADER'), (9, '$ACADVER'), (1, 'AC1009'),
+                            (0, 'ENDSEC'), (0, 'SECTION'), (2, 'ENTITIES')):
+            _dxf_pair(fid, code, value)
+        for kind, value in iter_shapes(items):
+            if kind == 'path':
+                _dxf_path(fid, value, layer)
+            else:
+                x, y, r = value
+                for code, value in ((0, 'CIRCLE'), (8, layer), (10, x), (20, y), (40, r)):
+                    _dxf_pair(fid, code, value)
+        for code, value in ((0, 'ENDSEC'), (0, 'EOF')):
+            _dxf_pair(fid, code, value)
+    except:
+        # Do not leave a partly written file
+        if close:
+            fid.close()
+            os.remove(fileobj)
+            close = False
+        raise
+    finally:
+        if close:
+            fid.close()
+
+# SVG ---------------------------------------------------------------------------
+
+def write_svg(fileobj, items, margin=1.0, stroke_width=0.1):
+    """
+    Write items (see get_geometry) to an SVG file in millimeters, fileobj is a
+    file name or an open file. The y axis points up, as in the scad output.
+    """
+    xmin, ymin, xmax, ymax = shape_bounds(iter_shapes(items))
+    width = xmax - xmin + 2*margin
+    height = ymax - ymin + 2*margin
+    fid, close = _open(fileobj)
+    try:
+        fid.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        fid.write('<svg xmlns="http://www.w3.org/2000/svg" width="{0:0.6f}mm" height="{1:0.6f}mm" '
+                  'viewBox="0 0 {0:0.6f} {1:0.6f}">\n'.format(width, height))
+        fid.write('<g transform="translate({0:0.6f},{1:0.6f}) scale(1,-1)" fill="none" '
+                  'stroke="black" stroke-width="{2}">\n'.format(margin - xmin, margin + ymax, stroke_width))
+        for kind, value in iter_shapes(items):
+            if kind == 'path':
+                points = ' L '.join('{0:0.6f} {1:0.6f}'.format(x, y) for x, y in value.tolist())
+                fid.write('<path d="M {0} Z"/>\n'.format(points))
+            else:
+                fid.write('<circle cx="{0:0.6f}" cy="{1:0.6f}" r="{2:0.6f}"/>\n'.format(*value))
+        fid.write('</g>\n</svg>\n')
+    finally:
+        if close:
+            fid.close()
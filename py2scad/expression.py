@@ -0,0 +1,307 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Symbolic openscad expressions.
+
+Python arithmetic on variable references builds expression trees which are
+written as openscad expressions, so a design can be generated once with its
+dimensions as variables (e.g. for the openscad customizer) rather than being
+regenerated for every variant:
+
+    width, height = Var('width'), Var('height')
+    box = Cube(size=[width, height, 2*height - 1])
+
+gives "cube(size=[width, height, 2.00000 * height - 1.00000], ...)".
+Variables.__getattr__ returns Var references. Var is a str subclass, so
+existing code pasting variable names into strings keeps working, and adding
+a plain string to any expression concatenates the strings.
+"""
+import math
+import operator
+
+# Operator precedences, higher binds tighter
+PREC_ADD = 1
+PREC_MUL = 2
+PREC_NEG = 3
+PREC_ATOM = 4
+
+def num_str(val):
+    """Formats a number as utility.val_to_str does."""
+    return "{0:0.5f}".format(val)
+
+def operand_str(val, prec, right=False):
+    """Formats an operand of an operator of precedence prec."""
+    if isinstance(val, Expr):
+        val_prec = val.precedence
+        if val_prec < prec or (right and val_prec == prec and val_prec < PREC_NEG):
+            return '(' + val.expr_str() + ')'
+        return val.expr_str()
+    if isinstance(val, str):
+        return '(' + val + ')'
+    if val < 0:
+        return '(' + num_str(val) + ')'
+    return num_str(val)
+
+def evaluate(val, env):
+    """Numeric value of a number or expression given the variable values in env."""
+    if isinstance(val, Expr):
+        return val.evaluate(env)
+    if isinstance(val, str):
+        raise ValueError, 'cannot evaluate openscad expression string {0}'.format(val)
+    return val
+
+def variables(val):
+    """Names of the variables referenced by a number or expression."""
+    if isinstance(val, Expr):
+        return val.variables()
+    return set()
+
+def is_operand(val):
+    """Numbers, expressions and openscad expression strings can be operands."""
+    if isinstance(val, (Expr, str, int, long, float)):
+        return True
+    # numpy scalars, but not arrays
+    return hasattr(val, '__float__') and getattr(val, 'ndim', 0) == 0
+
+class Expr(object):
+    """
+    Base of the expression nodes. Subclasses define precedence, expr_str,
+    variables and evaluate, and operands if they have sub-expressions.
+    """
+
+    precedence = PREC_ATOM
+    # Keeps numpy scalars from taking over the arithmetic
+    __array_ufunc__ = None
+
+    def expr_str(self):
+        raise NotImplementedError
+
+    def variables(self):
+        return set()
+
+    def evaluate(self, env):
+        raise NotImplementedError
+
+    def operands(self):
+        """The sub-expressions of the expression."""
+        return ()
+
+    def __str__(self):
+        return self.expr_str()
+
+    def __format__(self, spec):
+        return format(self.expr_str(), spec)
+
+    def binop(self, op, other, reverse=False):
+        if not is_operand(other):
+            return NotImplemented
+        # Drop operations with no effect, e.g. x + 0 and x*1
+        if not isinstance(other, (Expr, str)):
+            if other == 0 and (op == '+' or (op == '-' and not reverse)):
+                return self
+            if other == 0 and op == '-':
+                return Neg(self)
+            if other == 1 and (op == '*' or (op == '/' and not reverse)):
+                return self
+            if other == -1 and op == '*':
+                return Neg(self)
+        if reverse:
+            return BinOp(op, other, self)
+        return BinOp(op, self, other)
+
+    def __add__(self, other):
+        if isinstance(other, str) and not isinstance(other, Expr):
+            return self.expr_str() + other
+        return self.binop('+', other)
+
+    def __radd__(self, other):
+        if isinstance(other, str) and not isinstance(other, Expr):
+            return other + self.expr_str()
+        return self.binop('+', other, reverse=True)
+
+    def __sub__(self, other):
+        return self.binop('-', other)
+
+    def __rsub__(self, other):
+        return self.binop('-', other, reverse=True)
+
+    def __mul__(self, other):
+        return self.binop('*', other)
+
+    def __rmul__(self, other):
+        return self.binop('*', other, reverse=True)
+
+    def __div__(self, other):
+        return self.binop('/', other)
+
+    def __rdiv__(self, other):
+        return self.binop('/', other, reverse=True)
+
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+
+    def __mod__(self, other):
+        return self.binop('%', other)
+
+    def __rmod__(self, other):
+        return self.binop('%', other, reverse=True)
+
+    def __neg__(self):
+        return Neg(self)
+
+    def __pos__(self):
+        return self
+
+    def compare(self, other):
+        raise TypeError, 'openscad expressions can not be compared in python: {0}'.format(self.expr_str())
+
+    # The value of an expression is only known in openscad
+    __lt__ = __le__ = __gt__ = __ge__ = compare
+
+class Var(str, Expr):
+    """Reference to a named openscad variable."""
+
+    def __new__(cls, name):
+        return str.__new__(cls, name)
+
+    @property
+    def name(self):
+        return str.__str__(self)
+
+    def expr_str(self):
+        return self.name
+
+    def variables(self):
+        return set([self.name])
+
+    def evaluate(self, env):
+        try:
+            val = env[self.name]
+        except KeyError:
+            raise ValueError, 'undefined variable {0}'.format(self.name)
+        return evaluate(val, env)
+
+    def __repr__(self):
+        return 'Var({0!r})'.format(self.name)
+
+    # str defines these, use the expression versions
+    __str__ = Expr.__dict__['__str__']
+    __add__ = Expr.__dict__['__add__']
+    __mul__ = Expr.__dict__['__mul__']
+    __rmul__ = Expr.__dict__['__rmul__']
+    __mod__ = Expr.__dict__['__mod__']
+    __rmod__ = Expr.__dict__['__rmod__']
+    __lt__ = __le__ = __gt__ = __ge__ = Expr.__dict__['compare']
+
+class BinOp(Expr):
+    """A binary arithmetic operation, op is one of + - * / %."""
+
+    OPERATORS = {
+            '+': (PREC_ADD, operator.add),
+            '-': (PREC_ADD, operator.sub),
+            '*': (PREC_MUL, operator.mul),
+            '/': (PREC_MUL, operator.truediv),
+            '%': (PREC_MUL, math.fmod),
+            }
+
+    def __init__(self, op, left, right):
+        if not op in self.OPERATORS:
+            raise ValueError, 'unknown operator {0}'.format(op)
+        self.op = op
+        self.left = left
+        self.right = right
+        self.precedence = self.OPERATORS[op][0]
+
+    def expr_str(self):
+        return '{0} {1} {2}'.format(operand_str(self.left, self.precedence),
+                                    self.op,
+                                    operand_str(self.right, self.precedence, right=True))
+
+    def variables(self):
+        return variables(self.left) | variables(self.right)
+
+    def operands(self):
+        return (self.left, self.right)
+
+    def evaluate(self, env):
+        func = self.OPERATORS[self.op][1]
+        return func(evaluate(self.left, env), evaluate(self.right, env))
+
+    def __repr__(self):
+        return 'BinOp({0!r}, {1!r}, {2!r})'.format(self.op, self.left, self.right)
+
+class Neg(Expr):
+    """Negation of an expression."""
+
+    precedence = PREC_NEG
+
+    def __init__(self, val):
+        self.val = val
+
+    def expr_str(self):
+        return '-' + operand_str(self.val, PREC_NEG + 1)
+
+    def variables(self):
+        return variables(self.val)
+
+    def operands(self):
+        return (self.val,)
+
+    def evaluate(self, env):
+        return -evaluate(self.val, env)
+
+    def __repr__(self):
+        return 'Neg({0!r})'.format(self.val)
+
+class Call(Expr):
+    """A call of an openscad function, e.g. Call('sqrt', x)."""
+
+    # Python equivalents, the openscad trigonometric functions use degrees
+    FUNCTIONS = {
+            'abs'  : abs,
+            'min'  : min,
+            'max'  : max,
+            'sqrt' : math.sqrt,
+            'pow'  : math.pow,
+            'sin'  : lambda a: math.sin(math.radians(a)),
+            'cos'  : lambda a: math.cos(math.radians(a)),
+            'tan'  : lambda a: math.tan(math.radians(a)),
+            }
+
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+    def expr_str(self):
+        return '{0}({1})'.format(self.name, ', '.join(operand_str(arg, 0) for arg in self.args))
+
+    def variables(self):
+        names = set()
+        for arg in self.args:
+            names |= variables(arg)
+        return names
+
+    def operands(self):
+        return self.args
+
+    def evaluate(self, env):
+        try:
+            func = self.FUNCTIONS[self.name]
+        except KeyError:
+            raise ValueError, 'cannot evaluate openscad function {0}'.format(self.name)
+        return func(*[evaluate(arg, env) for arg in self.args])
+
+    def __repr__(self):
+        return 'Call({0})'.format(', '.join(repr(val) for val in (self.name,) + self.args))
@@ -13,6 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import functools
 try:
     import scipy as numpy
 except ImportError:
@@ -21,6 +22,11 @@ from primitives import *
 from transforms import *
 from utility import DEG2RAD
 from utility import RAD2DEG
+from utility import add_expr
+from utility import neg_expr
+import stl_tools
+import profile2d
+import cache
 
 INCH2MM = 25.4
 
@@ -31,10 +37,59 @@ class Basic_Enclosure(object):
     to be help together without any gluing (or solvent welding) using standoffs.
 
     Need to add more documentaion on how to use this class ...
+
+    The panels (top, bottom, front, back, left and right) are built lazily:
+    make only prepares how to build each panel and collects its holes, and a
+    panel is built, with all of its holes cut by a single difference, on
+    first access of the attribute. Parts which are never used are never
+    built.
     """
 
+    PANEL_NAMES = ('top', 'bottom', 'front', 'back', 'left', 'right')
+
     def __init__(self,params):
         self.params = params 
+        self.panel_holes = {}
+        self.panel_makers = {}  # panel name -> function building the panel
+        self.panel_cuts = {}    # panel name -> list of (hole, cut_depth)
+
+    def __getattr__(self, name):
+        """Build a panel on first access, see make."""
+        try:
+            maker = self.__dict__['panel_makers'][name]
+        except KeyError:
+            raise AttributeError(name)
+        panel = maker()
+        cutter_list = []
+        for hole, cut_depth in self.panel_cuts.get(name, []):
+            cutter_list.extend(hole_cutters(hole, cut_depth))
+        if len(cutter_list) == 1:
+            panel = Difference([panel, cutter_list[0]])
+        elif cutter_list:
+            panel = Difference([panel, Union(cutter_list)])
+        setattr(self, name, panel)
+        return panel
+
+    def set_panel_maker(self, name, maker):
+        """
+        Set the function building the named panel. The panel is built on
+        first access, with its holes.
+        """
+        self.__dict__.pop(name, None)
+        self.panel_makers[name] = maker
+        self.panel_cuts[name] = []
+
+    def built_panels(self):
+        """Names of the panels built so far."""
+        return [name for name in self.PANEL_NAMES if name in self.__dict__]
+
+    def reset(self, *names):
+        """
+        Forget the built panels given (all by default), they are rebuilt with
+        all of their holes on next access.
+        """
+        for name in names or self.PANEL_NAMES:
+            self.__dict__.pop(name, None)
 
     def make_top_and_bottom(self):
         """
@@ -84,9 +139,11 @@ class Basic_Enclosure(object):
         bottom_z = wall_thickness
         self.bottom_x, self.bottom_y = bottom_x, bottom_y
 
-        # Create top and bottom panels
-        self.top = rounded_box(top_x, top_y, top_z, lid_radius, round_z=False)
-        self.bottom = rounded_box(bottom_x, bottom_y, bottom_z, lid_radius, round_z=False)
+        # Create top and bottom panels, on first access
+        self.set_panel_maker('top', functools.partial(rounded_box, top_x, top_y, top_z,
+                                                      lid_radius, round_z=False, hull=True))
+        self.set_panel_maker('bottom', functools.partial(rounded_box, bottom_x, bottom_y, bottom_z,
+                                                         lid_radius, round_z=False, hull=True))
 
         # Create slot holes for top and bottom panels
         self.tab_hole_list = []
@@ -199,9 +256,12 @@ class Basic_Enclosure(object):
                 'yz-'  : yz_neg,
                 }
 
+        # Left and right are the same plate, built once
         plate_maker = Plate_W_Tabs(params)
-        self.left = plate_maker.make()
-        self.right = plate_maker.make()
+        make_plate = cache.shared_maker(plate_maker.make)
+        self.set_panel_maker('left', make_plate)
+        self.set_panel_maker('right', make_plate)
+        self.side_maker = plate_maker
         
     def make_front_and_back(self):
         """
@@ -270,61 +330,37 @@ class Basic_Enclosure(object):
                 'yz-'  : yz_neg,
                 }
 
+        # Front and back are the same plate, built once
         plate_maker = Plate_W_Tabs(params)
-        self.front = plate_maker.make()
-        self.back = plate_maker.make()
+        make_plate = cache.shared_maker(plate_maker.make)
+        self.set_panel_maker('front', make_plate)
+        self.set_panel_maker('back', make_plate)
+        self.front_maker = plate_maker
 
     def add_holes(self, hole_list, cut_depth = None):
         """
-        Add holes to given panel of the enclosure.
+        Add holes to given panel of the enclosure. Holes in panels not built
+        yet are cut when the panel is built, with a single difference for all
+        of its holes. Holes in built panels are cut at once, see cut_holes.
+        The holes are also kept per panel in panel_holes for the flat
+        profiles.
         """
         if not cut_depth:
             cut_depth = 2*self.params['wall_thickness']
-
-        #panels2holes = {}
-
-        for hole in hole_list:
-
-            # Create differencing cylinder for hole based on hole type.
-            if hole['type'] == 'round':
-                radius = 0.5*hole['size']
-                hole_cyl = Cylinder(r1=radius, r2=radius, h=cut_depth)
-            elif hole['type'] == 'square':
-                sz_x, sz_y = hole['size']
-                sz_z = cut_depth 
-                hole_cyl = Cube(size = (sz_x,sz_y,sz_z))
-            elif hole['type'] == 'rounded_square':
-                sz_x, sz_y, radius = hole['size']
-                sz_z = cut_depth 
-                hole_cyl = rounded_box(sz_x, sz_y, sz_z, radius, round_z=False)
-            else:
-                raise ValueError, 'unkown hole type {0}'.format(hole['type'])
-
-            # Translate cylinder into position
-            x,y = hole['location']
-            hole_cyl = Translate(hole_cyl, v = (x,y,0.0))
-
-            # Get panel in which to make hole
-            panel = getattr(self, hole['panel'])
-
-            # Cut hole
-            panel = Difference([panel, hole_cyl])
-            setattr(self, hole['panel'], panel)
-
-            #try:
-            #    panels2holes[hole['panel']].append(hole_cyl)
-            #except KeyError:
-            #    panels2holes[hole['panel']] = [hole_cyl]
-
-        #for panel_name, panel_holes in panels2holes.iteritems():
-        #    panel = getattr(self, hole['panel'])
-        #    panel = Difference([panel] + panel_holes)
-        #    setattr(self, hole['panel'], panel)
-
-
-
+        for name, holes in group_holes(hole_list, key='panel'):
+            self.panel_holes.setdefault(name, []).extend(holes)
+            if name in self.panel_cuts:
+                self.panel_cuts[name].extend((hole, cut_depth) for hole in holes)
+            if name in self.__dict__ or not name in self.panel_makers:
+                cut_holes(self, holes, cut_depth, key='panel')
 
     def make(self):
+        """
+        Prepare the panels and standoffs. The panels are built on first
+        access.
+        """
+        self.panel_holes = {}
+        self.reset()
         self.make_left_and_right()
         self.make_front_and_back()
         self.make_top_and_bottom()
@@ -334,6 +370,10 @@ class Basic_Enclosure(object):
     def get_assembly(self,**kwargs):
         """
         Returns a list of the enclosure parts in assembled positions.
+
+        The explode components may be openscad expressions, e.g.
+        explode=(0,0,'20*$t') or animation.Keyframes, so that a single
+        program animates the explosion.
         """
         assembly_options= {
                 'explode'       : (0,0,0), 
@@ -352,54 +392,47 @@ class Basic_Enclosure(object):
         wall_thickness = self.params['wall_thickness']
         explode_x, explode_y, explode_z = explode
 
-        # Translate top and bottom into assembled positions
-        top_z_shift = 0.5*inner_z + 0.5*wall_thickness + explode_z
-        bottom_z_shift = -top_z_shift
-        top = Translate(self.top, v=(0.0,0.0,top_z_shift))
-        bottom = Translate(self.bottom,v=(0.0,0.0,bottom_z_shift))
-
-        # Rotate and translate front and back into assembled positions
-        back = Rotate(self.back, a=90, v=(1,0,0))
-        front = Rotate(self.front, a=90, v=(1,0,0))
-        back_y_shift = 0.5*inner_y + 0.5*wall_thickness + explode_y
-        front_y_shift = -back_y_shift
-        back = Translate(back, v=(0.0, back_y_shift, 0.0))
-        front = Translate(front, v=(0.0, front_y_shift, 0.0))
-
-        # Rotate and translate sides into assembled positions
-        right = Rotate(self.right, a=90, v=(0,0,1))
-        right = Rotate(right, a=90, v=(0,1,0))
-        left = Rotate(self.left, a=90, v=(0,0,1))
-        left = Rotate(left, a=90, v=(0,1,0))
-        right_x_shift = 0.5*inner_x + 0.5*wall_thickness + explode_x
-        left_x_shift = -right_x_shift
-        right = Translate(right,v=(right_x_shift,0,0))
-        left = Translate(left,v=(left_x_shift,0,0))
-
-        # Translate standoffs into position
-        standoff_list = []
-        for pos, standoff in zip(self.standoff_xy_pos, self.standoff_list):
-            x_shift, y_shift = pos
-            z_shift = 0.0
-            standoff = Translate(standoff,v=(x_shift,y_shift,z_shift))
-            standoff_list.append(standoff)
-
-        # Return list of parts in assembly
+        # Panels are built on first access (see make), so only the panels
+        # shown are positioned
         part_list = []
+
+        # Translate top and bottom into assembled positions
+        top_z_shift = add_expr(0.5*inner_z + 0.5*wall_thickness, explode_z)
+        bottom_z_shift = neg_expr(top_z_shift)
         if assembly_options['show_top'] == True:
-            part_list.append(top)
+            part_list.append(Translate(self.top, v=(0.0,0.0,top_z_shift)))
         if assembly_options['show_bottom'] == True:
-            part_list.append(bottom)
+            part_list.append(Translate(self.bottom,v=(0.0,0.0,bottom_z_shift)))
+
+        # Rotate and translate front and back into assembled positions
+        back_y_shift = add_expr(0.5*inner_y + 0.5*wall_thickness, explode_y)
+        front_y_shift = neg_expr(back_y_shift)
         if assembly_options['show_front'] == True:
-            part_list.append(front)
+            front = Rotate(self.front, a=90, v=(1,0,0))
+            part_list.append(Translate(front, v=(0.0, front_y_shift, 0.0)))
         if assembly_options['show_back'] == True:
-            part_list.append(back)
+            back = Rotate(self.back, a=90, v=(1,0,0))
+            part_list.append(Translate(back, v=(0.0, back_y_shift, 0.0)))
+
+        # Rotate and translate sides into assembled positions
+        right_x_shift = add_expr(0.5*inner_x + 0.5*wall_thickness, explode_x)
+        left_x_shift = neg_expr(right_x_shift)
         if assembly_options['show_left'] == True:
-            part_list.append(left)
+            left = Rotate(self.left, a=90, v=(0,0,1))
+            left = Rotate(left, a=90, v=(0,1,0))
+            part_list.append(Translate(left,v=(left_x_shift,0,0)))
         if assembly_options['show_right'] == True:
-            part_list.append(right)
+            right = Rotate(self.right, a=90, v=(0,0,1))
+            right = Rotate(right, a=90, v=(0,1,0))
+            part_list.append(Translate(right,v=(right_x_shift,0,0)))
+
+        # Translate standoffs into position
         if assembly_options['show_standoffs'] == True:
-            part_list.extend(standoff_list)
+            for pos, standoff in zip(self.standoff_xy_pos, self.standoff_list):
+                x_shift, y_shift = pos
+                z_shift = 0.0
+                standoff = Translate(standoff,v=(x_shift,y_shift,z_shift))
+                part_list.append(standoff)
         return part_list
 
 
@@ -417,31 +450,40 @@ class Basic_Enclosure(object):
         bottom_x_overhang = self.params['bottom_x_overhang']
         bottom_y_overhang = self.params['bottom_y_overhang']
         spacing = spacing_factor*wall_thickness
-        bottom = self.bottom
+        # Panels are built on first access (see make), excluded panels are not
+        # touched
+        part_dict = {}
+        if not 'bottom' in exclude_list:
+            part_dict['bottom'] = self.bottom
 
         # Translate front panel
-        y_shift = -(0.5*self.bottom_y + 0.5*inner_z + wall_thickness + spacing)
-        front = Translate(self.front, v=(0,y_shift,0))
+        if not 'front' in exclude_list:
+            y_shift = -(0.5*self.bottom_y + 0.5*inner_z + wall_thickness + spacing)
+            part_dict['front'] = Translate(self.front, v=(0,y_shift,0))
 
         # Translate back panel
-        y_shift = 0.5*self.bottom_y + 0.5*inner_z + wall_thickness + spacing
-        back = Rotate(self.back,a=180,v=(1,0,0)) # Rotate part so that outside face is up in projection
-        back = Translate(back, v=(0,y_shift,0))
+        if not 'back' in exclude_list:
+            y_shift = 0.5*self.bottom_y + 0.5*inner_z + wall_thickness + spacing
+            back = Rotate(self.back,a=180,v=(1,0,0)) # Rotate part so that outside face is up in projection
+            part_dict['back'] = Translate(back, v=(0,y_shift,0))
 
         # Rotate and Translate left panel
-        left = Rotate(self.left,a=90,v=(0,0,1))
-        left = Rotate(left,a=180,v=(0,1,0)) # Rotate part so that outside face is up in projection
-        x_shift = -(0.5*self.bottom_x + 0.5*inner_z + wall_thickness + spacing)
-        left = Translate(left, v=(x_shift,0,0))
+        if not 'left' in exclude_list:
+            left = Rotate(self.left,a=90,v=(0,0,1))
+            left = Rotate(left,a=180,v=(0,1,0)) # Rotate part so that outside face is up in projection
+            x_shift = -(0.5*self.bottom_x + 0.5*inner_z + wall_thickness + spacing)
+            part_dict['left'] = Translate(left, v=(x_shift,0,0))
 
         # Rotate and translate right panel
-        right = Rotate(self.right,a=90,v=(0,0,1))
-        x_shift = 0.5*self.bottom_x + 0.5*inner_z + wall_thickness + spacing
-        right = Translate(right,v=(x_shift,0,0))
+        if not 'right' in exclude_list:
+            right = Rotate(self.right,a=90,v=(0,0,1))
+            x_shift = 0.5*self.bottom_x + 0.5*inner_z + wall_thickness + spacing
+            part_dict['right'] = Translate(right,v=(x_shift,0,0))
 
         # Rotate and translate top
-        y_shift = -(0.5*self.bottom_y + 0.5*self.top_y + inner_z + 2*wall_thickness + 2*spacing)
-        top = Translate(self.top, v=(0,y_shift,0))
+        if not 'top' in exclude_list:
+            y_shift = -(0.5*self.bottom_y + 0.5*self.top_y + inner_z + 2*wall_thickness + 2*spacing)
+            part_dict['top'] = Translate(self.top, v=(0,y_shift,0))
 
         # Create reference cube
         ref_cube = Cube(size=(INCH2MM,INCH2MM,INCH2MM))
@@ -449,18 +491,8 @@ class Basic_Enclosure(object):
         ref_cube = Translate(ref_cube,v=(0,y_shift,0))
 
         # Create part list
-        part_dict = {
-                'top'     : top, 
-                'bottom'  : bottom, 
-                'front'   : front, 
-                'back'    : back, 
-                'left'    : left,
-                'right'   : right
-                }
         part_list= []
         for name, part in part_dict.iteritems():
-            if name in exclude_list:
-                continue
             part_list.append(part)
 
         #part_list = [top, bottom, front, back, left, right]
@@ -479,6 +511,49 @@ class Basic_Enclosure(object):
 
         return part_list_proj
 
+    def get_profiles(self, layout=True, spacing_factor=4, exclude_list=[], kerf=0.0):
+        """
+        Returns a dictionary of the flat profiles (profile2d.Profile) of the
+        enclosure panels, computed directly rather than by projection. With
+        layout the panels are oriented and placed as in get_projection,
+        otherwise they are in their own coordinates. The profiles are
+        compensated for the cutter kerf, see profile2d.Profile.kerf.
+        """
+        inner_x, inner_y, inner_z = self.params['inner_dimensions']
+        wall_thickness = self.params['wall_thickness']
+        lid_radius = self.params['lid_radius']
+
+        profile_dict = {
+                'top'    : profile2d.Profile(profile2d.rounded_rect_points(self.top_x, self.top_y, lid_radius)),
+                'bottom' : profile2d.Profile(profile2d.rounded_rect_points(self.bottom_x, self.bottom_y, lid_radius)),
+                'front'  : self.front_maker.get_profile(),
+                'back'   : self.front_maker.get_profile(),
+                'left'   : self.side_maker.get_profile(),
+                'right'  : self.side_maker.get_profile(),
+                }
+        for name, holes in self.panel_holes.items():
+            for hole in holes:
+                profile_dict[name].add_hole_dict(hole)
+        if kerf:
+            for name in profile_dict:
+                profile_dict[name] = profile_dict[name].kerf(kerf)
+
+        if layout:
+            spacing = spacing_factor*wall_thickness
+            side_shift = 0.5*self.bottom_x + 0.5*inner_z + wall_thickness + spacing
+            front_shift = 0.5*self.bottom_y + 0.5*inner_z + wall_thickness + spacing
+            top_shift = 0.5*self.bottom_y + 0.5*self.top_y + inner_z + 2*wall_thickness + 2*spacing
+            # Same orientations as the projection, outside faces up
+            profile_dict['front'] = profile_dict['front'].translate((0, -front_shift))
+            profile_dict['back'] = profile_dict['back'].mirror((0,1)).translate((0, front_shift))
+            profile_dict['left'] = profile_dict['left'].transform([[0,1],[1,0]], (-side_shift, 0))
+            profile_dict['right'] = profile_dict['right'].rotate(90).translate((side_shift, 0))
+            profile_dict['top'] = profile_dict['top'].translate((0, -top_shift))
+
+        for name in exclude_list:
+            profile_dict.pop(name, None)
+        return profile_dict
+
 
 class Plate_W_Slots(object):
 
@@ -517,14 +592,16 @@ class Plate_W_Slots(object):
         hole_list = []
 
         for pos, size in self.params['slots']:
-            x, y = size
-            z = 2*self.params['size'][2]
-            hole = Cube(size=(x, y, z))
-            pos_x, pos_y = pos
-            hole = Translate(hole,v=[pos_x, pos_y, 0])
+            hole = {
+                    'type'     : 'square',
+                    'location' : pos,
+                    'size'     : size,
+                    }
             hole_list.append(hole)
 
-        self.plate = Difference([self.plate] + hole_list)
+        if hole_list:
+            cutter = hole_list_cutter(hole_list, 2*self.params['size'][2])
+            self.plate = Difference([self.plate, cutter])
 
 
     def make(self):
@@ -537,11 +614,29 @@ class Plate_W_Slots(object):
             self.plate = Cube(size=self.params['size'])
         else:
             x,y,z = self.params['size']
-            self.plate = rounded_box(x, y, z, radius, round_z=False)
+            self.plate = rounded_box(x, y, z, radius, round_z=False, hull=True)
 
         self.__add_holes()
         return self.plate
 
+    def get_profile(self, kerf=0.0):
+        """
+        Returns the flat profile (profile2d.Profile) of the plate, compensated
+        for the cutter kerf.
+        """
+        try:
+            radius = self.params['radius']
+        except KeyError:
+            radius = None
+        x,y,z = self.params['size']
+        if radius is None:
+            profile = profile2d.Profile(profile2d.rect_points(x, y))
+        else:
+            profile = profile2d.Profile(profile2d.rounded_rect_points(x, y, radius))
+        for pos, size in self.params['slots']:
+            profile.add_hole(profile2d.rect_points(size[0], size[1], center=pos))
+        return profile.kerf(kerf)
+
 class Plate_W_Tabs(object):
 
     """
@@ -634,12 +729,38 @@ class Plate_W_Tabs(object):
 
     def make(self):
         """
-        Creates a tabbed plate.
+        Creates a tabbed plate. Plates with the same parameters may be taken
+        from the part cache, see cache.
         """
+        self.plate = cache.get_part('Plate_W_Tabs', self.params, self.__make_plate)
+        return self.plate
+
+    def __make_plate(self):
         self.plate = Cube(size=self.params['size'])
         self.__add_tabs()
         return self.plate
 
+    def get_profile(self, kerf=0.0):
+        """
+        Returns the flat profile (profile2d.Profile) of the plate, with the
+        tabs walked into the outline edges and compensated for the cutter
+        kerf.
+        """
+        plate_x, plate_y, plate_z = self.params['size']
+        corners = profile2d.rect_points(plate_x, plate_y)
+        # Edges in counter clockwise order from the lower left corner
+        edge_tabs = []
+        for face, sign_val in (('xz-',-1), ('yz+',1), ('xz+',1), ('yz-',-1)):
+            tabs = []
+            for fpos, width, depth, tab_dir in self.params[face]:
+                if face.startswith('xz'):
+                    center = (fpos*plate_x - 0.5*plate_x, sign_val*0.5*plate_y)
+                else:
+                    center = (sign_val*0.5*plate_x, fpos*plate_y - 0.5*plate_y)
+                tabs.append((center, width, depth, tab_dir))
+            edge_tabs.append(tabs)
+        return profile2d.Profile(profile2d.tab_outline(corners, edge_tabs)).kerf(kerf)
+
 
 class Right_Angle_Bracket(object):
 
@@ -797,37 +918,8 @@ class Right_Angle_Bracket(object):
         """
         Add holes to base or face
         """
-        # Get plate in which to cut hole
         thickness = max([self.base_size[2], self.face_size[2]])
-
-        for hole in hole_list:
-
-            # Create differencing cylinder for hole based on hole type.
-            if hole['type'] == 'round':
-                radius = 0.5*hole['size']
-                hole_cyl = Cylinder(r1=radius, r2=radius, h = 2*thickness)
-            elif hole['type'] == 'square':
-                sz_x, sz_y = hole['size']
-                sz_z = 2*thickness
-                hole_cyl = Cube(size = (sz_x,sz_y,sz_z))
-            elif hole['type'] == 'rounded_square':
-                sz_x, sz_y, radius = hole['size']
-                sz_z = 2*thickness
-                hole_cyl = rounded_box(sz_x, sz_y, sz_z, radius, round_z=False)
-            else:
-                raise ValueError, 'unkown hole type {0}'.format(hole['type'])
-
-            # Translate hole cylinder into position
-            x,y = hole['location']
-            hole_cyl = Translate(hole_cyl,v=(x,y,0))
-
-            # Get plate in which to make hole
-            plate = getattr(self, hole['plate'])
-
-            # Cut hole
-            plate = Difference([plate, hole_cyl])
-            setattr(self, hole['plate'], plate)
-
+        cut_holes(self, hole_list, 2*thickness, key='plate')
 
     def make(self):
         """
@@ -841,14 +933,15 @@ class Right_Angle_Bracket(object):
 
     def get_assembly(self,explode=(0,0,0)):
         """
-        Returns list of parts in assembled positions.
+        Returns list of parts in assembled positions. The explode components
+        may be openscad expressions, see Basic_Enclosure.get_assembly.
         """
         explode_x, explode_y, explode_z = explode
 
         # Position base and face plates
         face = Rotate(self.face,a=90,v=(1,0,0))
-        y_shift = 0.5*self.base_size[1] + 0.5*self.face_size[2] + explode_y
-        z_shift = 0.5*self.face_size[1] - 0.5*self.base_size[2] + explode_z
+        y_shift = add_expr(0.5*self.base_size[1] + 0.5*self.face_size[2], explode_y)
+        z_shift = add_expr(0.5*self.face_size[1] - 0.5*self.base_size[2], explode_z)
         face = Translate(face,v=(0,y_shift,z_shift))
 
         # Add supports
@@ -858,7 +951,7 @@ class Right_Angle_Bracket(object):
             support = Rotate(support, a=-90, v=(0,0,1))
             x_shift = pos
             y_shift = 0.5*self.base_size[1]
-            z_shift = 0.5*self.base_size[2] + explode_z
+            z_shift = add_expr(0.5*self.base_size[2], explode_z)
             support = Translate(support,v=(x_shift,y_shift,z_shift))
             support_list.append(support)
 
@@ -1011,14 +1104,52 @@ class RT_Triangle_W_Tabs(object):
             self.rt_triangle = Difference([self.rt_triangle] + neg_tab_list)
 
     def make(self):
+        """
+        Creates the tabbed triangle. Triangles with the same parameters may be
+        taken from the part cache, see cache.
+        """
+        self.rt_triangle = cache.get_part('RT_Triangle_W_Tabs', self.params, self.__make_triangle)
+        return self.rt_triangle
+
+    def __make_triangle(self):
         self.__make_rt_triangle()
         self.__add_tabs()
         return self.rt_triangle
 
+    def get_profile(self, kerf=0.0):
+        """
+        Returns the flat profile (profile2d.Profile) of the triangle, with the
+        tabs walked into the outline edges and compensated for the cutter
+        kerf.
+        """
+        plate_x, plate_y, plate_z = self.params['size']
+        corners = [(0,0), (plate_x,0), (0,plate_y)]
+        edge_tabs = []
+        for face in ('xz', 'hz', 'yz'):
+            tabs = []
+            for fpos, width, depth, tab_dir in self.params[face]:
+                if face == 'xz':
+                    center = (fpos*plate_x, 0)
+                elif face == 'yz':
+                    center = (0, fpos*plate_y)
+                else:
+                    # fpos is measured along the hypotenuse from (plate_x,0)
+                    center = ((1 - fpos)*plate_x, fpos*plate_y)
+                tabs.append((center, width, depth, tab_dir))
+            edge_tabs.append(tabs)
+        return profile2d.Profile(profile2d.tab_outline(corners, edge_tabs)).kerf(kerf)
+
+@cache.cached()
 def rounded_box(length, width, height, radius,
-                round_x=True, round_y=True, round_z=True):
+                round_x=True, round_y=True, round_z=True, hull=False):
     """
-    Create a box with rounded corners
+    Create a box with rounded corners. Boxes with the same arguments may be
+    taken from the part cache, see cache.
+
+    If hull is True the box is created as the convex hull of the corner
+    spheres (or cylinders when only two axes are rounded) rather than as a
+    union of cubes, cylinders and spheres. The shape is the same, but the
+    hull has far fewer operands and renders much faster in openscad.
     """
     assert round_x or round_y == True, 'x and y faces not rounded - at least two sides must be rounded'
     assert round_x or round_z == True, 'x and z faces not rounded - at least two faces must be rounded'
@@ -1036,6 +1167,10 @@ def rounded_box(length, width, height, radius,
         dz = height - 2.0*radius
     else:
         dz = height
+
+    if hull == True:
+        return rounded_box_hull(dx, dy, dz, radius, round_x, round_y, round_z)
+
     union_list = []
 
     inner_box = Cube([dx,dy,dz])
@@ -1088,6 +1223,42 @@ def rounded_box(length, width, height, radius,
     box = Union(union_list)
     return box
 
+def rounded_box_hull(dx, dy, dz, radius, round_x=True, round_y=True, round_z=True):
+    """
+    Create the hull of the rounded corners of a box. dx, dy and dz are the
+    distances between the corner centers along each axis, i.e. the box
+    dimensions less the rounding on the rounded axes. Used by rounded_box.
+    """
+    corner_list = []
+    if round_x==True and round_y==True and round_z==True:
+        corner_sph = Sphere(r=radius)
+        for i in [-1,1]:
+            for j in [-1,1]:
+                for k in [-1,1]:
+                    temp_sph = Translate(corner_sph,v=[i*0.5*dx,j*0.5*dy,k*0.5*dz])
+                    corner_list.append(temp_sph)
+    elif round_z==False:
+        zaxis_cyl = Cylinder(h=dz,r1=radius,r2=radius)
+        for i in [-1,1]:
+            for j in [-1,1]:
+                temp_cyl = Translate(zaxis_cyl,v=[i*0.5*dx,j*0.5*dy,0])
+                corner_list.append(temp_cyl)
+    elif round_y==False:
+        yaxis_cyl = Cylinder(h=dy,r1=radius,r2=radius)
+        yaxis_cyl = Rotate(yaxis_cyl,a=90,v=[1,0,0])
+        for i in [-1,1]:
+            for j in [-1,1]:
+                temp_cyl = Translate(yaxis_cyl,v=[i*0.5*dx,0,j*0.5*dz])
+                corner_list.append(temp_cyl)
+    else:
+        xaxis_cyl = Cylinder(h=dx,r1=radius,r2=radius)
+        xaxis_cyl = Rotate(xaxis_cyl,a=90,v=[0,1,0])
+        for i in [-1,1]:
+            for j in [-1,1]:
+                temp_cyl = Translate(xaxis_cyl,v=[0,i*0.5*dy,j*0.5*dz])
+                corner_list.append(temp_cyl)
+    return Hull(corner_list)
+
 def plate_w_holes(length, width, height, holes=[], hole_mod='', radius=False):
     """
     Create a plate with holes in it.
@@ -1096,20 +1267,18 @@ def plate_w_holes(length, width, height, holes=[], hole_mod='', radius=False):
         length = x dimension of plate
         width  = y dimension of plate
         height = z dimension of plate
-        holes  = list of tuples giving x position, y position and diameter of
-            holes
+        holes  = list of tuples (or an array with shape (N,3)) giving x
+            position, y position and diameter of holes
     """
     if radius == False:
         plate = Cube(size=[length,width,height])
     else:
-        plate = rounded_box(length,width,height,radius,round_z=False)
-    cylinders = []
-    for x,y,r in holes:
-        c = Cylinder(h=4*height,r1=0.5*r, r2=0.5*r)
-        c = Translate(c,v=[x,y,0],mod=hole_mod)
-        cylinders.append(c)
-    obj_list = [plate] + cylinders
-    plate = Difference(obj_list)
+        plate = rounded_box(length,width,height,radius,round_z=False,hull=True)
+    hole_list = round_hole_list(holes)
+    if not hole_list:
+        return plate
+    cutter = hole_list_cutter(hole_list, 4*height, mod=hole_mod)
+    plate = Difference([plate, cutter])
     return plate
 
 def disk_w_holes(height, d1, holes=[], hole_mod=''):
@@ -1119,113 +1288,250 @@ def disk_w_holes(height, d1, holes=[], hole_mod=''):
     Arguments:
         d1 = diameter of the disk
         height = z dimension of disk
-        holes  = list of tuples giving x position, y position and diameter of
-            holes
+        holes  = list of tuples (or an array with shape (N,3)) giving x
+            position, y position and diameter of holes
     """
 
     cyl = Cylinder(h=height,r1=d1*0.5,r2=d1*0.5)
-    cylinders = []
-    for x,y,r in holes:
-        c = Cylinder(h=4*height,r1=0.5*r, r2=0.5*r)
-        c = Translate(c,v=[x,y,0],mod=hole_mod)
-        cylinders.append(c)
-    obj_list = [cyl] + cylinders
-    disk = Difference(obj_list)
+    hole_list = round_hole_list(holes)
+    if not hole_list:
+        return cyl
+    cutter = hole_list_cutter(hole_list, 4*height, mod=hole_mod)
+    disk = Difference([cyl, cutter])
     return disk
 
+# Hole cutting ----------------------------------------------------------------
+
+HOLE_TYPES = ('round', 'square', 'rounded_square', 'slot', 'hexagon')
+
+def hole_cutters(hole, cut_depth):
+    """
+    Create the positioned differencing objects for a hole. A hole is a
+    dictionary of the form
+
+    hole = {
+        'type'     : hole_type,   # one of HOLE_TYPES
+        'location' : location,    # (x,y) or array of positions with shape (N,2)
+        'size'     : size,        # hole size, depends on hole type (see below)
+        }
+
+    where the size is given by
+
+    'round'          : diameter
+    'square'         : (x, y)
+    'rounded_square' : (x, y, radius)
+    'slot'           : (x, y), rounded at the ends of the longer dimension
+    'hexagon'        : distance across flats
+
+    When the location is an array of positions the cutter is emitted once,
+    inside a PointArray loop over the positions, which keeps large perforation
+    grids cheap to build and to emit. Returns a list of positioned cutters.
+    """
+    hole_type = hole['type']
+    if hole_type == 'round':
+        radius = 0.5*hole['size']
+        cutter = Cylinder(r1=radius, r2=radius, h=cut_depth)
+    elif hole_type == 'square':
+        sz_x, sz_y = hole['size']
+        cutter = Cube(size=(sz_x, sz_y, cut_depth))
+    elif hole_type == 'rounded_square':
+        sz_x, sz_y, radius = hole['size']
+        cutter = rounded_box(sz_x, sz_y, cut_depth, radius, round_z=False, hull=True)
+    elif hole_type == 'slot':
+        sz_x, sz_y = hole['size']
+        radius = 0.5*min(sz_x, sz_y)
+        cutter = rounded_box(sz_x, sz_y, cut_depth, radius, round_z=False, hull=True)
+    elif hole_type == 'hexagon':
+        radius = 0.5*hole['size']/numpy.cos(DEG2RAD(30.0))
+        cutter = Cylinder(r1=radius, h=cut_depth, fn=6)
+    else:
+        raise ValueError, 'unkown hole type {0}'.format(hole_type)
+
+    try:
+        locations = numpy.reshape(numpy.asarray(hole['location'], dtype=float), (-1,2)).tolist()
+    except (TypeError, ValueError):
+        # Symbolic locations, see expression
+        locations = hole['location']
+        if len(locations) == 0:
+            return []
+        if not isinstance(locations[0], (list, tuple)):
+            locations = [locations]
+        for location in locations:
+            if not (isinstance(location, (list, tuple)) and len(location) == 2):
+                raise ValueError, 'hole location must be an (x, y) pair: {0}'.format(location)
+    if len(locations) > 1:
+        return [PointArray(cutter, locations)]
+    return [Translate(cutter, v=(x,y,0.0)) for x, y in locations]
+
+def hole_list_cutter(hole_list, cut_depth, mod=''):
+    """
+    Create a single differencing object for all holes in hole_list. Multiple
+    cutters are combined in one union so that the part needs only a single
+    difference.
+    """
+    cutter_list = []
+    for hole in hole_list:
+        cutter_list.extend(hole_cutters(hole, cut_depth))
+    if len(cutter_list) == 1:
+        cutter = cutter_list[0]
+    else:
+        cutter = Union(cutter_list)
+    cutter.mod = mod
+    return cutter
+
+def group_holes(hole_list, key='panel'):
+    """
+    Group holes by the part they are cut from, as given by hole[key]. Returns
+    a list of (name, holes) tuples in order of first occurance.
+    """
+    name_list = []
+    name2holes = {}
+    for hole in hole_list:
+        name = hole[key]
+        if not name in name2holes:
+            name_list.append(name)
+            name2holes[name] = []
+        name2holes[name].append(hole)
+    return [(name, name2holes[name]) for name in name_list]
+
+def cut_holes(obj, hole_list, cut_depth, key='panel'):
+    """
+    Cut the holes in hole_list from the parts of obj. The part for each hole is
+    the attribute of obj named by hole[key]. Each part gets a single
+    difference with a union of all of its cutters.
+    """
+    for name, holes in group_holes(hole_list, key=key):
+        part = getattr(obj, name)
+        part = Difference([part, hole_list_cutter(holes, cut_depth)])
+        setattr(obj, name, part)
+
+def round_hole_list(holes):
+    """
+    Convert (x, y, diameter) hole data, given as a list of tuples or an array
+    with shape (N,3), into a list of round hole dictionaries. Holes with the
+    same diameter are grouped into a single hole with an array of locations.
+    """
+    holes = numpy.reshape(numpy.asarray(holes, dtype=float), (-1,3))
+    hole_list = []
+    for diam in numpy.unique(holes[:,2]):
+        hole = {
+                'type'     : 'round',
+                'location' : holes[holes[:,2] == diam, :2],
+                'size'     : diam,
+                }
+        hole_list.append(hole)
+    return hole_list
+
 def grid_box(length, width, height, num_length, num_width,top_func=None,bot_func=None):
     """
     Create a box with given length, width, and height. The top and bottom surface of the
     box will be triangulate bases on a grid with num_length and num_width points.
     Optional functions top_func and bot_func can be given to distort the top or bottom
-    surfaces of the box.
+    surfaces of the box. Functions which accept arrays of x and y values are
+    evaluated once over the whole grid, see grid_func_values.
     """
     nl = num_length + 1
     nw = num_width + 1
     xpts = numpy.linspace(-0.5*length,0.5*length,nl)
     ypts = numpy.linspace(-0.5*width,0.5*width,nw)
 
-    points_top = []
-    points_bot = []
-    for y in ypts:
-        for x in xpts:
-            if top_func == None:
-                zval_top = 0.0
-            else:
-                zval_top = top_func(x,y)
-            if bot_func == None:
-                zval_bot = 0.0
-            else:
-                zval_bot = bot_func(x,y)
-            points_top.append([x,y,0.5*height+zval_top])
-            points_bot.append([x,y,-0.5*height+zval_bot])
-
-    faces_top = []
-    faces_bot = []
-    numtop = len(points_top)
-    for i in range(0,nl-1):
-        for j in range(0,nw-1):
-            # Top triangles
-            f = [(j+1)*nl+i, (j+1)*nl+i+1, j*nl+i+1]
-            faces_top.append(f)
-            f = [(j+1)*nl+i, j*nl+i+1, j*nl+i]
-            faces_top.append(f)
-            # Botton triangles
-            f = [numtop+j*nl+i+1, numtop+(j+1)*nl+i+1, numtop+(j+1)*nl+i]
-            faces_bot.append(f)
-            f = [numtop+j*nl+i, numtop+j*nl+i+1,  numtop+(j+1)*nl+i]
-            faces_bot.append(f)
-
-    faces_front = []
-    faces_back = []
-    for i in range(0,nl-1):
-        # Front triangles
-        f = [i+1,numtop+i+1,numtop+i]
-        faces_front.append(f)
-        f = [i,i+1,numtop+i]
-        faces_front.append(f)
-        # Back triangles
-        f = [2*numtop-nl+i+1,numtop-nl+i+1,numtop-nl+i]
-        faces_back.append(f)
-        f = [2*numtop-nl+i,2*numtop-nl+i+1,numtop-nl+i]
-        faces_back.append(f)
-
-    faces_right = []
-    faces_left = []
-    for j in range(0,nw-1):
-        # Right triangles
-        f = [nl-1 +(j+1)*nl,numtop+nl-1+(j+1)*nl,numtop+nl-1+j*nl]
-        faces_right.append(f)
-        f = [nl-1 + j*nl,nl-1 +(j+1)*nl,numtop+nl-1+j*nl]
-        faces_right.append(f)
-        # Left triangles
-        f = [numtop+(j+1)*nl,(j+1)*nl,j*nl]
-        faces_left.append(f)
-        f = [numtop+j*nl,numtop+(j+1)*nl,j*nl]
-        faces_left.append(f)
-
-    points = points_top + points_bot
-    faces = faces_top + faces_bot
-    faces.extend(faces_front)
-    faces.extend(faces_back)
-    faces.extend(faces_right)
-    faces.extend(faces_left)
+    # Grid points ordered with x varying fastest
+    x, y = numpy.meshgrid(xpts, ypts)
+    x = x.ravel()
+    y = y.ravel()
+    numtop = nl*nw
+    points = numpy.empty((2*numtop,3))
+    points[:numtop,0] = x
+    points[:numtop,1] = y
+    points[:numtop,2] = 0.5*height + grid_func_values(top_func, x, y)
+    points[numtop:,0] = x
+    points[numtop:,1] = y
+    points[numtop:,2] = -0.5*height + grid_func_values(bot_func, x, y)
+
+    # Corner indices of the grid cells, ordered with y varying fastest
+    i, j = numpy.meshgrid(numpy.arange(nl-1), numpy.arange(nw-1), indexing='ij')
+    p00 = (j*nl + i).ravel()
+    p10 = p00 + 1
+    p01 = p00 + nl
+    p11 = p01 + 1
+
+    # Top and bottom triangles, two per grid cell
+    faces_top = numpy.column_stack([p01, p11, p10, p01, p10, p00])
+    faces_bot = numtop + numpy.column_stack([p10, p11, p01, p00, p10, p01])
+
+    # Front and back triangles
+    i = numpy.arange(nl-1)
+    back = numtop - nl + i
+    faces_front = numpy.column_stack([i+1, numtop+i+1, numtop+i, i, i+1, numtop+i])
+    faces_back = numpy.column_stack([numtop+back+1, back+1, back, numtop+back, numtop+back+1, back])
+
+    # Right and left triangles
+    j = numpy.arange(nw-1)
+    right = nl - 1 + j*nl
+    left = j*nl
+    faces_right = numpy.column_stack([right+nl, numtop+right+nl, numtop+right, right, right+nl, numtop+right])
+    faces_left = numpy.column_stack([numtop+left+nl, left+nl, left, numtop+left, numtop+left+nl, left])
+
+    faces = [faces_top, faces_bot, faces_front, faces_back, faces_right, faces_left]
+    faces = numpy.vstack([f.reshape(-1,3) for f in faces])
 
     p = Polyhedron(points=points,faces=faces)
     return p
 
+def grid_func_values(func, x, y):
+    """
+    Evaluate the surface function func at the grid points given by the arrays
+    x and y. Functions which accept arrays are called once with the whole grid,
+    other functions (e.g. those using the math module or if statements) fall
+    back to being called point by point.
+    """
+    if func is None:
+        return numpy.zeros(x.shape)
+    try:
+        z = numpy.asarray(func(x,y), dtype=float)
+    except (TypeError, ValueError):
+        z = None
+    if z is not None and z.shape == ():
+        z = z*numpy.ones(x.shape)
+    if z is None or z.shape != x.shape:
+        z = numpy.array([func(xx,yy) for xx, yy in zip(x.tolist(), y.tolist())], dtype=float)
+    return z
+
+def stl_to_polyhedron(stl, decimals=None, *args, **kwargs):
+    """
+    Create a polyhedron from a triangle mesh so that it can be embedded in the
+    scad file, and transformed in python beforehand, rather than imported with
+    Import_STL.
+
+    Arguments:
+        stl = the name of an ascii stl file, a list of stl_tools facets, or
+            a welded mesh (points, faces) with faces ordered counter-clockwise
+            when viewed from outside, e.g. from stl_tools.get_indexed_mesh.
+        decimals = number of decimals used to merge nearly coincident vertices
+            when welding stl facets.
+    """
+    if type(stl) == str:
+        stl = stl_tools.read_stl(stl)
+    if type(stl) == tuple:
+        points, faces = stl
+    else:
+        points, faces = stl_tools.get_indexed_mesh(stl, decimals=decimals)
+    # Openscad expects faces ordered clockwise when viewed from outside
+    faces = numpy.asarray(faces)[:,::-1]
+    return Polyhedron(points=points, faces=faces, *args, **kwargs)
+
 def wedge_cut(obj,ang0,ang1,r,h,numpts=20,mod=''):
     """
     Cut out a wedge from obj from ang0 to ang1 with given radius r
     and height h.
     """
-    ang0rad = DEG2RAD*ang0
-    ang1rad = DEG2RAD*ang1
+    ang0rad = DEG2RAD(ang0)
+    ang1rad = DEG2RAD(ang1)
     angs = numpy.linspace(ang0rad,ang1rad,numpts)
-    points_arc = [[r*numpy.cos(a),r*numpy.sin(a)] for a in angs]
-    points = [[0,0]]
-    points.extend(points_arc)
-    paths = [range(0,len(points))]
+    points = numpy.zeros((numpts+1,2))
+    points[1:,0] = r*numpy.cos(angs)
+    points[1:,1] = r*numpy.sin(angs)
+    paths = [numpy.arange(numpts+1)]
     poly = Polygon(points=points, paths=paths)
     cut = Linear_Extrude(poly,h=h,mod=mod)
     cut_obj = Difference([obj,cut])
@@ -0,0 +1,124 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Shared scad libraries.
+
+Assemblies (modules) used by many programs are normally written into each
+program. A SCAD_Library collects them into one library file instead, and the
+programs only contain a use (or include) statement and the module calls.
+share_assemblies does this for all assemblies used by several programs.
+
+Note that modules in a used library only see the variables of the library
+file, use include=True for assemblies depending on program variables.
+"""
+import base
+import primitives
+import transforms
+
+class SCAD_Library(object):
+    """
+    A scad library file of assemblies.
+
+    filename = library file name, as referred to by the programs
+    include  = reference the library with include rather than use
+    """
+
+    def __init__(self, filename, assemblies=None, include=False):
+        self.filename = filename
+        self.include = include
+        self.assemblies = []
+        if assemblies:
+            for assembly in assemblies:
+                self.add(assembly)
+
+    def add(self, assembly):
+        """Add an assembly, assemblies are identified by name."""
+        if assembly.name in self.get_names():
+            raise ValueError, 'assembly {0} already in library'.format(assembly.name)
+        self.assemblies.append(assembly)
+
+    def get_names(self):
+        return [assembly.name for assembly in self.assemblies]
+
+    def reference(self):
+        """Returns the Use or Include object referencing the library."""
+        if self.include:
+            return primitives.Include(self.filename)
+        return primitives.Use(self.filename)
+
+    def link(self, prog):
+        """
+        Remove the definitions of the library's assemblies from prog, a
+        SCAD_Prog, and reference the library instead.
+        """
+        names = self.get_names()
+        objlist = [obj for obj in prog.objlist
+                   if not (isinstance(obj, transforms.Assembly) and obj.name in names)]
+        references = [obj for obj in objlist if isinstance(obj, (primitives.Use, primitives.Include))
+                      and obj.filename == self.filename]
+        if not references:
+            objlist.insert(0, self.reference())
+        prog.objlist = objlist
+        return prog
+
+    def __str__(self):
+        return ''.join('{0}\n\n'.format(assembly) for assembly in self.assemblies)
+
+    def write(self, filename=None):
+        """
+        Write the library, by default to its filename. Returns True if the
+        file was written, unchanged libraries are not rewritten.
+        """
+        if filename is None:
+            filename = self.filename
+        return base.write_if_changed(filename, base.get_header_str(filename) + str(self))
+
+def get_assemblies(prog):
+    """
+    Returns a dictionary of name -> Assembly for the assemblies prog, a
+    SCAD_Prog, defines at the top level or calls.
+    """
+    assemblies = {}
+    for obj, depth, path in base.iter_tree(prog):
+        if isinstance(obj, transforms.Module_Call):
+            obj = obj.assembly
+        if isinstance(obj, transforms.Assembly):
+            assemblies.setdefault(obj.name, obj)
+    return assemblies
+
+def share_assemblies(progs, filename, min_progs=2, include=False):
+    """
+    Move the assemblies used by at least min_progs of the programs progs into
+    a library and link the programs to it. Assemblies with the same name but
+    different definitions in different programs are left in the programs.
+    Returns the SCAD_Library, write it along with the programs.
+    """
+    found = {}  # name -> list of assemblies, one per program using it
+    for prog in progs:
+        for name, assembly in get_assemblies(prog).items():
+            found.setdefault(name, []).append(assembly)
+    library = SCAD_Library(filename, include=include)
+    for name in sorted(found):
+        assembly_list = found[name]
+        if len(assembly_list) < min_progs:
+            continue
+        if len(set(str(assembly) for assembly in assembly_list)) > 1:
+            continue
+        library.add(assembly_list[0])
+    if library.assemblies:
+        for prog in progs:
+            if set(get_assemblies(prog)) & set(library.get_names()):
+                library.link(prog)
+    return library
@@ -0,0 +1,72 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Level of detail policies.
+
+A policy attached to a SCAD_Prog sets the facets of each round object (sphere,
+cylinder, circle) from its size when the program is written. The number of
+fragments is chosen so the chord of each facet deviates at most tolerance from
+the true circle, so small features such as screw holes stay round while large
+ones are not over tessellated. Objects with explicit facet settings keep them
+unless the policy overrides them, e.g. hexagonal cutters with $fn=6.
+
+    prog = SCAD_Prog(lod=lod.PREVIEW)
+    prog.write('preview.scad')
+    prog.lod = lod.FINAL
+    prog.write('final.scad')
+"""
+import math
+
+class LOD_Policy(object):
+    """
+    Facet policy from feature size.
+
+    tolerance = maximum deviation of a facet from the true surface
+    min_fn    = minimum number of fragments
+    max_fn    = maximum number of fragments
+    override  = replace explicit object facet settings as well
+    """
+
+    def __init__(self, tolerance=0.05, min_fn=8, max_fn=128, override=False):
+        if tolerance <= 0:
+            raise ValueError, 'tolerance must be > 0'
+        if min_fn < 3 or max_fn < min_fn:
+            raise ValueError, 'must have 3 <= min_fn <= max_fn'
+        self.tolerance = tolerance
+        self.min_fn = int(min_fn)
+        self.max_fn = int(max_fn)
+        self.override = override
+
+    def __repr__(self):
+        return 'LOD_Policy(tolerance={0}, min_fn={1}, max_fn={2}, override={3})'.format(
+                self.tolerance, self.min_fn, self.max_fn, self.override)
+
+    def get_fn(self, r):
+        """Returns the number of fragments for a circle of radius r."""
+        if r <= self.tolerance:
+            return self.min_fn
+        # Deviation of a chord spanning 2*pi/n is r*(1 - cos(pi/n))
+        fn = int(math.ceil(math.pi/math.acos(1.0 - float(self.tolerance)/r)))
+        return min(max(fn, self.min_fn), self.max_fn)
+
+    def applies(self, obj):
+        """Returns True if the policy sets the facets of obj."""
+        if obj.fn or obj.fa or obj.fs:
+            return self.override
+        return True
+
+# Presets
+PREVIEW = LOD_Policy(tolerance=0.25, min_fn=6, max_fn=32)
+FINAL = LOD_Policy(tolerance=0.01, min_fn=16, max_fn=256)
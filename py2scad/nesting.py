@@ -0,0 +1,188 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Sheet nesting of flat parts.
+
+Packs the bounding boxes of parts onto sheets of material with a skyline
+(bottom left) heuristic. Parts are placed largest first, each at the lowest
+position on the first sheet it fits on, optionally rotated by 90 degrees.
+New sheets are started as needed.
+
+    profiles = enclosure.get_profiles(layout=False).values()
+    sheets = nest_profiles(profiles, sheet_size=(600, 400), spacing=3.0)
+    for i, sheet in enumerate(sheets):
+        export2d.write_dxf('sheet_{0}.dxf'.format(i), sheet)
+"""
+import transforms
+
+class Placement(object):
+    """
+    Position of a part on a sheet.
+
+    index   = index of the part in the list given to nest
+    sheet   = index of the sheet
+    x, y    = lower left corner of the part's bounding box on the sheet
+    rotated = True if the part is rotated by 90 degrees
+    width   = width of the placed part (after rotation)
+    height  = height of the placed part (after rotation)
+    """
+
+    def __init__(self, index, sheet, x, y, rotated, width, height):
+        self.index = index
+        self.sheet = sheet
+        self.x = x
+        self.y = y
+        self.rotated = rotated
+        self.width = width
+        self.height = height
+
+    def __repr__(self):
+        return 'Placement(index={0}, sheet={1}, x={2}, y={3}, rotated={4})'.format(
+                self.index, self.sheet, self.x, self.y, self.rotated)
+
+class Skyline(object):
+    """
+    The skyline of the parts placed on a sheet, a list of [x, y, width]
+    segments from left to right.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.segments = [[0.0, 0.0, float(width)]]
+
+    def find(self, w, h):
+        """
+        Returns the lowest (then leftmost) position (top, x, y) for a w by h
+        rectangle, or None if it does not fit.
+        """
+        best = None
+        segments = self.segments
+        for i in range(len(segments)):
+            x = segments[i][0]
+            if x + w > self.width:
+                break
+            y = 0.0
+            j = i
+            while j < len(segments) and segments[j][0] < x + w:
+                y = max(y, segments[j][1])
+                j += 1
+            if y + h <= self.height and (best is None or (y + h, x) < best[:2]):
+                best = (y + h, x, y)
+        return best
+
+    def place(self, x, y, w, h):
+        """Raise the skyline over a w by h rectangle placed at x, y."""
+        new_segments = []
+        for sx, sy, sw in self.segments:
+            if sx + sw <= x or sx >= x + w:
+                new_segments.append([sx, sy, sw])
+                continue
+            # Keep the parts of the segment outside the rectangle
+            if sx < x:
+                new_segments.append([sx, sy, x - sx])
+            if sx + sw > x + w:
+                new_segments.append([x + w, sy, sx + sw - x - w])
+        new_segments.append([x, y + h, w])
+        new_segments.sort()
+        # Merge neighbours of equal height
+        self.segments = [new_segments[0]]
+        for segment in new_segments[1:]:
+            last = self.segments[-1]
+            if segment[1] == last[1]:
+                last[2] += segment[2]
+            else:
+                self.segments.append(segment)
+
+def nest(sizes, sheet_size, spacing=0.0, margin=0.0, rotate=True):
+    """
+    Pack rectangles onto sheets. Returns a list of Placements in the order of
+    sizes.
+
+    Arguments:
+        sizes      = list of (width, height) of the parts
+        sheet_size = (width, height) of the sheets
+        spacing    = minimum gap between parts
+        margin     = minimum gap between parts and the sheet edges
+        rotate     = allow parts to be rotated by 90 degrees
+    """
+    sheet_w = sheet_size[0] - 2*margin + spacing
+    sheet_h = sheet_size[1] - 2*margin + spacing
+    # Largest parts first
+    order = sorted(range(len(sizes)), key=lambda i: (-max(sizes[i]), -min(sizes[i]), i))
+    skylines = []
+    placements = [None]*len(sizes)
+    for i in order:
+        w, h = sizes[i][0] + spacing, sizes[i][1] + spacing
+        options = [(w, h, False)]
+        if rotate and w != h:
+            options.append((h, w, True))
+        for sheet in range(len(skylines) + 1):
+            if sheet == len(skylines):
+                skyline = Skyline(sheet_w, sheet_h)
+            else:
+                skyline = skylines[sheet]
+            best = None
+            for ow, oh, rotated in options:
+                pos = skyline.find(ow, oh)
+                if pos is not None and (best is None or pos[:2] < best[0][:2]):
+                    best = (pos, ow, oh, rotated)
+            if best is None:
+                if sheet == len(skylines):
+                    raise ValueError, 'part {0} of size {1} does not fit on the sheet'.format(i, sizes[i])
+                continue
+            if sheet == len(skylines):
+                skylines.append(skyline)
+            (top, x, y), ow, oh, rotated = best
+            skyline.place(x, y, ow, oh)
+            width, height = sizes[i][::-1] if rotated else sizes[i][:2]
+            placements[i] = Placement(i, sheet, x + margin, y + margin, rotated, width, height)
+            break
+    return placements
+
+def nest_profiles(profiles, sheet_size, spacing=0.0, margin=0.0, rotate=True):
+    """
+    Nest flat profiles (profile2d.Profile) on sheets. Returns a list of sheets,
+    each a list of the profiles placed on it.
+    """
+    profiles = list(profiles)
+    bounds = [profile.bounds() for profile in profiles]
+    sizes = [(xmax - xmin, ymax - ymin) for xmin, ymin, xmax, ymax in bounds]
+    placements = nest(sizes, sheet_size, spacing=spacing, margin=margin, rotate=rotate)
+    sheets = [[] for i in range(max([p.sheet for p in placements] or [-1]) + 1)]
+    for profile, placement in zip(profiles, placements):
+        if placement.rotated:
+            profile = profile.rotate(90)
+        xmin, ymin, xmax, ymax = profile.bounds()
+        sheets[placement.sheet].append(profile.translate((placement.x - xmin, placement.y - ymin)))
+    return sheets
+
+def nest_objects(objects, bounds, sheet_size, spacing=0.0, margin=0.0, rotate=True):
+    """
+    Nest scad objects, e.g. projections of panels, given their bounding boxes
+    (xmin, ymin, xmax, ymax). Returns a list of sheets, each a list of the
+    objects translated (and rotated) into place.
+    """
+    sizes = [(xmax - xmin, ymax - ymin) for xmin, ymin, xmax, ymax in bounds]
+    placements = nest(sizes, sheet_size, spacing=spacing, margin=margin, rotate=rotate)
+    sheets = [[] for i in range(max([p.sheet for p in placements] or [-1]) + 1)]
+    for obj, (xmin, ymin, xmax, ymax), placement in zip(objects, bounds, placements):
+        if placement.rotated:
+            # Rotating by 90 degrees maps the box to (-ymax, xmin, -ymin, xmax)
+            obj = transforms.Rotate(obj, a=90, v=[0,0,1])
+            xmin, ymin = -ymax, xmin
+        obj = transforms.Translate(obj, v=[placement.x - xmin, placement.y - ymin, 0])
+        sheets[placement.sheet].append(obj)
+    return sheets
@@ -13,45 +13,161 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import re
+import heapq
 import base
 import utility
+import expression
 
 # Variable delcaration -------------------------------------------------------
 
+# Names in expression strings
+IDENTIFIER = re.compile(r'\$?[A-Za-z_][A-Za-z0-9_]*')
+
 class Variables(dict):
-    """Group variable declarations for inclusion in output file."""
+    """
+    Group variable declarations for inclusion in output file.
+
+    Variables are written in the order they are defined, except that each
+    variable is written after the variables its value refers to (through
+    expression.Expr values or names in expression strings). The written block
+    is cached until a value changes, and a program writes each Variables
+    object once however often it is added.
+    """
     # Any constructor kwargs become variables
-    # Attribute getter returns the varaible name
+    # Attribute getter returns a reference to the variable
     # Attribute setter sets variable value
-    # cmd_str method returns variable definition in scad syntax
+    # cmd_str method returns variable definitions in scad syntax
+
+    # Attributes of the object itself, all other attributes are variables
+    _attributes = frozenset(['comment', '_order', '_cache'])
+    # See base.SCAD_Prog
+    emit_once = True
+
     def __init__(self, comment='', **kwargs):
+        dict.__setattr__(self, '_order', [])    # names in order of definition
+        dict.__setattr__(self, '_cache', {})    # tab_level -> written block
         self.comment = comment
         if not comment:
             self.comment = "Named variables //\n"
-        dict.__init__(self, kwargs)
-        self._initialised = True
+        dict.__init__(self)
+        for name in sorted(kwargs):
+            self[name] = kwargs[name]
+
+    def __reduce__(self):
+        return (self.__class__, (self.comment,), None, None, iter(self.ordered_items()))
 
     def __getattr__(self, name):
-        """Return the openscad representation of the indicated variable."""
+        """Return a reference (expression.Var) to the indicated variable."""
         if name in self:
-            return name
+            return expression.Var(name)
         raise AttributeError(name)
 
     def __setattr__(self, name, value):
         """Change the value of the named variable."""
-        if not self.__dict__.has_key('_initialised'):  # this test allows attributes to be set in the __init__ method
-            return dict.__setattr__(self, name, value)
-        elif name in self: # any normal attributes are handled normally
+        if name in self._attributes:
             dict.__setattr__(self, name, value)
         else:
-            self.__setitem__(name, value)
+            self[name] = value
+
+    def __setitem__(self, name, value):
+        if not name in self:
+            self._order.append(name)
+        dict.__setitem__(self, name, value)
+        self._cache.clear()
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, name)
+        self._order.remove(name)
+        self._cache.clear()
+
+    def update(self, *args, **kwargs):
+        for other in args + (kwargs,):
+            if hasattr(other, 'keys'):
+                other = [(name, other[name]) for name in other.keys()]
+            for name, value in other:
+                self[name] = value
+
+    def setdefault(self, name, value=None):
+        if not name in self:
+            self[name] = value
+        return self[name]
+
+    def pop(self, name, *default):
+        if name in self or not default:
+            value = self[name]
+            del self[name]
+            return value
+        return default[0]
+
+    def popitem(self):
+        if not self._order:
+            raise KeyError('popitem(): variables are empty')
+        name = self._order[-1]
+        return name, self.pop(name)
+
+    def clear(self):
+        dict.clear(self)
+        del self._order[:]
+        self._cache.clear()
+
+    def dependencies(self, name):
+        """Names of the other variables the value of the named variable refers to."""
+        refs = set()
+        stack = [self[name]]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, expression.Expr):
+                refs |= value.variables()
+            elif isinstance(value, str):
+                refs.update(IDENTIFIER.findall(value))
+            elif isinstance(value, (list, tuple)):
+                stack.extend(value)
+        return set(ref for ref in refs if ref in self)
+
+    def ordered_names(self):
+        """
+        Names of the variables in order of definition, moved after the
+        variables they depend on. Raises ValueError for circular definitions.
+        """
+        index = dict((name, i) for i, name in enumerate(self._order))
+        num_deps = {}
+        users = dict((name, []) for name in self._order)
+        for name in self._order:
+            deps = self.dependencies(name)
+            num_deps[name] = len(deps)
+            for dep in deps:
+                users[dep].append(name)
+        ready = [(index[name], name) for name in self._order if num_deps[name] == 0]
+        heapq.heapify(ready)
+        names = []
+        while ready:
+            i, name = heapq.heappop(ready)
+            names.append(name)
+            for user in users[name]:
+                num_deps[user] -= 1
+                if num_deps[user] == 0:
+                    heapq.heappush(ready, (index[user], user))
+        if len(names) < len(self._order):
+            circular = [name for name in self._order if num_deps[name] > 0]
+            raise ValueError, 'circular variable definitions: {0}'.format(', '.join(circular))
+        return names
+
+    def ordered_items(self):
+        return [(name, self[name]) for name in self.ordered_names()]
 
     def cmd_str(self, tab_level=0):
+        try:
+            return self._cache[tab_level]
+        except KeyError:
+            pass
         tab_str = ' '*utility.TAB_WIDTH*tab_level
-        rtn_str = ''
-        for k,v in self.items():
-            rtn_str += '{0}{1} = {2};\n'.format(tab_str, k, utility.val_to_str(v))
-        return rtn_str + '\n'
+        str_list = []
+        for k, v in self.ordered_items():
+            str_list.append('{0}{1} = {2};\n'.format(tab_str, k, utility.val_to_str(v)))
+        rtn_str = ''.join(str_list) + '\n'
+        self._cache[tab_level] = rtn_str
+        return rtn_str
 
     def __str__(self, tab_level=0):
         tab_str = ' '*utility.TAB_WIDTH*tab_level
@@ -60,6 +176,27 @@ class Variables(dict):
             comment = tab_str + '// ' + self.comment + '\n'
         return '\n{0}{1}'.format(comment, self.cmd_str(tab_level=tab_level))
 
+# Libraries ------------------------------------------------------------------
+
+class Include(base.SCAD_Object):
+    """Include a scad library file, its modules, functions and variables."""
+
+    def __init__(self, filename, *args, **kwargs):
+        base.SCAD_Object.__init__(self, *args, **kwargs)
+        self.filename = filename
+
+    def cmd_str(self,tab_level=0):
+        return 'include <{0}>'.format(self.filename)
+
+class Use(base.SCAD_Object):
+    """Use the modules and functions of a scad library file."""
+
+    def __init__(self, filename, *args, **kwargs):
+        base.SCAD_Object.__init__(self, *args, **kwargs)
+        self.filename = filename
+
+    def cmd_str(self,tab_level=0):
+        return 'use <{0}>'.format(self.filename)
 
 # 3D primitives ---------------------------------------------------------------
 
@@ -83,6 +220,9 @@ class Sphere(base.SCAD_Object):
         base.SCAD_Object.__init__(self, center=center, *args, **kwargs)
         self.r = r
 
+    def feature_size(self):
+        return utility.as_number(self.r)
+
     def cmd_str(self,tab_level=0):
         facets = self.facets() # Retreve object facet information
         r_str = utility.val_to_str(self.r)
@@ -100,14 +240,20 @@ class Cylinder(base.SCAD_Object):
         # r2 is optional
         self.r2 = r2
 
+    def feature_size(self):
+        radii = [utility.as_number(r) for r in (self.r1, self.r2) if r is not None]
+        if None in radii:
+            return None
+        return max(radii)
+
     def cmd_str(self,tab_level=0):
         facets = self.facets() # Retreve object facet information
         center_str = self.center_str()
         h_str = utility.val_to_str(self.h)
         r1_str = utility.val_to_str(self.r1)
-        if self.r2:
+        if self.r2 is not None:
             r2_str = utility.val_to_str(self.r2)
-            return 'cylinder(h={0},r1={1},r2={2},center={3});'.format(h_str,
+            return 'cylinder(h={0},r1={1},r2={2},center={3}{4});'.format(h_str,
                                                                       r1_str,
                                                                       r2_str,
                                                                       center_str,
@@ -119,30 +265,33 @@ class Cylinder(base.SCAD_Object):
                                                              facets)
 
 class Polyhedron(base.SCAD_Object):
+    """
+    Polyhedron from a table of points and faces (lists of point indices).
+    Numeric points and faces are stored as contiguous float and integer arrays
+    and are written straight from the arrays. Face indices are checked
+    against the number of points.
+    """
 
     def __init__(self, points, faces, center=True, *args, **kwargs):
         base.SCAD_Object.__init__(self, center=center, *args, **kwargs)
-        self.points = points
-        self.faces = faces
+        self.points = utility.as_array(points, dtype=float)
+        self.faces = utility.as_array(faces, dtype=int)
+        utility.check_indices(self.faces, len(self.points), name='face index')
 
     def cmd_str(self,tab_level=0):
         facets = self.facets() # Retreve object facet information
         tab_str0 = ' '*utility.TAB_WIDTH*tab_level
         tab_str1 = ' '*utility.TAB_WIDTH*(tab_level+1)
-        rtn_str = 'polyhedron(\n'
-        rtn_str = '%s%spoints = [\n'%(rtn_str,tab_str1,)
-        for p in self.points:
-            p_str = utility.val_to_str(p,tab_level=tab_level+2)
-            rtn_str = '%s%s,\n'%(rtn_str,p_str)
-        rtn_str = '%s%s],\n'%(rtn_str,tab_str1,)
-        rtn_str = '%s%striangles = [\n'%(rtn_str,tab_str1,)
-        for p in self.faces:
-            p_str = utility.val_to_str(p,tab_level=tab_level+2)
-            rtn_str = '%s%s,\n'%(rtn_str,p_str)
-        rtn_str = '%s%s]\n'%(rtn_str,tab_str1,)
-        rtn_str += facets
-        rtn_str = '%s%s);\n'%(rtn_str,tab_str0)
-        return rtn_str
+        str_list = ['polyhedron(\n']
+        str_list.append('%spoints = [\n'%(tab_str1,))
+        str_list.append(utility.rows_to_str(self.points,tab_level=tab_level+2))
+        str_list.append('%s],\n'%(tab_str1,))
+        str_list.append('%striangles = [\n'%(tab_str1,))
+        str_list.append(utility.rows_to_str(self.faces,tab_level=tab_level+2))
+        str_list.append('%s]\n'%(tab_str1,))
+        str_list.append(facets)
+        str_list.append('%s);\n'%(tab_str0,))
+        return ''.join(str_list)
 
 class Import_STL(base.SCAD_Object):
 
@@ -173,6 +322,9 @@ class Circle(base.SCAD_Object):
         base.SCAD_Object.__init__(self, *args, **kwargs)
         self.r = r
 
+    def feature_size(self):
+        return utility.as_number(self.r)
+
     def cmd_str(self,tab_level=0):
         facets = self.facets() # Retreve object facet information
         r_str = utility.val_to_str(self.r)
@@ -194,30 +346,33 @@ class Square(base.SCAD_Object):
                                                         facets)
 
 class Polygon(base.SCAD_Object):
+    """
+    Polygon from a table of points and paths (lists of point indices).
+    Numeric points and paths are stored as contiguous float and integer arrays
+    and are written straight from the arrays. Path indices are checked
+    against the number of points.
+    """
 
     def __init__(self, points, paths,  *args, **kwargs):
         base.SCAD_Object.__init__(self, *args, **kwargs)
-        self.points = points
-        self.paths = paths
+        self.points = utility.as_array(points, dtype=float)
+        self.paths = utility.as_array(paths, dtype=int)
+        utility.check_indices(self.paths, len(self.points), name='path index')
 
     def cmd_str(self,tab_level=0):
         facets = self.facets() # Retreve object facet information
         tab_str0 = ' '*utility.TAB_WIDTH*tab_level
         tab_str1 = ' '*utility.TAB_WIDTH*(tab_level+1)
-        rtn_str = 'polygon(\n'
-        rtn_str = '%s%spoints = [\n'%(rtn_str,tab_str1,)
-        for p in self.points:
-            p_str = utility.val_to_str(p,tab_level=tab_level+2)
-            rtn_str = '%s%s,\n'%(rtn_str,p_str)
-        rtn_str = '%s%s],\n'%(rtn_str,tab_str1,)
-        rtn_str = '%s%spaths = [\n'%(rtn_str,tab_str1,)
-        for p in self.paths:
-            p_str = utility.val_to_str(p,tab_level=tab_level+2)
-            rtn_str = '%s%s,\n'%(rtn_str,p_str)
-        rtn_str = '%s%s]\n'%(rtn_str,tab_str1,)
-        rtn_str += facets
-        rtn_str = '%s%s);\n'%(rtn_str,tab_str0)
-        return rtn_str
+        str_list = ['polygon(\n']
+        str_list.append('%spoints = [\n'%(tab_str1,))
+        str_list.append(utility.rows_to_str(self.points,tab_level=tab_level+2))
+        str_list.append('%s],\n'%(tab_str1,))
+        str_list.append('%spaths = [\n'%(tab_str1,))
+        str_list.append(utility.rows_to_str(self.paths,tab_level=tab_level+2))
+        str_list.append('%s]\n'%(tab_str1,))
+        str_list.append(facets)
+        str_list.append('%s);\n'%(tab_str0,))
+        return ''.join(str_list)
 
 if __name__ == "__main__":
     v = Variables(foo=5)
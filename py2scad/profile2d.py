@@ -0,0 +1,280 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Flat 2D profiles of laser cut parts.
+
+A Profile is an outline polygon with polygonal holes and round holes, kept as
+true circles. The tabbed and slotted plates in highlevel build their profiles
+directly: tabs are walked into the outline edges and holes are separate loops,
+so no polygon booleans (or openscad projections) are needed as long as tabs do
+not overlap each other or the corners and holes lie inside the outline.
+
+Points are numpy arrays of shape (N,2), outlines are counter clockwise and
+holes clockwise.
+
+Kerf compensation is a miter offset of every loop: the outline grows and the
+holes and round holes shrink by half the kerf, so the parts come out of the
+cutter at their nominal size. Tabs get wider and notches narrower by the
+kerf, negative values leave clearance instead.
+"""
+import numpy
+from primitives import Polygon, Circle
+from transforms import Translate, Difference, Linear_Extrude
+
+# Number of segments in each rounded corner
+CORNER_SEGMENTS = 8
+
+# Longest miter, in multiples of the offset, before sharp corners are clipped
+MITER_LIMIT = 4.0
+
+def as_points(points):
+    """Returns points as a float array of shape (N,2)."""
+    return numpy.reshape(numpy.asarray(points, dtype=float), (-1,2))
+
+def signed_area(points):
+    """Signed area of a polygon, positive for counter clockwise polygons."""
+    x, y = points[:,0], points[:,1]
+    return 0.5*(numpy.dot(x, numpy.roll(y,-1)) - numpy.dot(numpy.roll(x,-1), y))
+
+def orient(points, ccw=True):
+    """Returns the polygon points in counter clockwise (or clockwise) order."""
+    points = as_points(points)
+    if (signed_area(points) > 0) != ccw:
+        return points[::-1].copy()
+    return points
+
+def offset_points(points, delta, miter_limit=MITER_LIMIT):
+    """
+    Returns the closed polygon points moved by delta to the right of the
+    direction of travel, outward for counter clockwise polygons and inward
+    for clockwise ones. Corners are mitered, the miter length is limited to
+    miter_limit*delta.
+    """
+    points = as_points(points)
+    # Drop repeated points, they have no edge direction
+    keep = numpy.any(points != numpy.roll(points, 1, axis=0), axis=1)
+    points = points[keep]
+    d = numpy.roll(points, -1, axis=0) - points
+    d /= numpy.hypot(d[:,0], d[:,1])[:,None]
+    n1 = numpy.column_stack((d[:,1], -d[:,0]))  # normal of the edge leaving each point
+    n0 = numpy.roll(n1, 1, axis=0)              # normal of the edge arriving
+    denom = numpy.maximum(1.0 + numpy.sum(n0*n1, axis=1), 2.0/miter_limit**2)
+    return points + delta*(n0 + n1)/denom[:,None]
+
+def rect_points(x, y, center=(0,0)):
+    """Counter clockwise corners of an x by y rectangle."""
+    cx, cy = center
+    return numpy.array([
+        [cx - 0.5*x, cy - 0.5*y],
+        [cx + 0.5*x, cy - 0.5*y],
+        [cx + 0.5*x, cy + 0.5*y],
+        [cx - 0.5*x, cy + 0.5*y],
+        ])
+
+def rounded_rect_points(x, y, radius, center=(0,0), segments=CORNER_SEGMENTS):
+    """Counter clockwise points of an x by y rectangle with rounded corners."""
+    radius = min(radius, 0.5*x, 0.5*y)
+    if radius <= 0:
+        return rect_points(x, y, center=center)
+    dx, dy = 0.5*x - radius, 0.5*y - radius
+    corners = numpy.array([[dx, -dy], [dx, dy], [-dx, dy], [-dx, -dy]])
+    start = numpy.array([-90.0, 0.0, 90.0, 180.0])
+    ang = numpy.radians(start[:,None] + numpy.linspace(0.0, 90.0, segments+1)[None,:])
+    points = corners[:,None,:] + radius*numpy.dstack((numpy.cos(ang), numpy.sin(ang)))
+    return points.reshape(-1,2) + numpy.asarray(center, dtype=float)
+
+def regular_polygon_points(r, num, center=(0,0)):
+    """Counter clockwise points of a regular polygon with circumradius r."""
+    ang = numpy.arange(num)*(2.0*numpy.pi/num)
+    return numpy.column_stack((r*numpy.cos(ang), r*numpy.sin(ang))) + numpy.asarray(center, dtype=float)
+
+def edge_points(p0, p1, tabs):
+    """
+    Returns the points of the edge from p0 to p1 (p1 excluded) with tabs. Each
+    tab is (center, width, depth, dir) where center is a point on the edge and
+    '+' tabs stick out of the outline (counter clockwise) by depth while '-'
+    tabs are notches of depth.
+    """
+    p0, p1 = numpy.asarray(p0, dtype=float), numpy.asarray(p1, dtype=float)
+    if not tabs:
+        return p0[None,:]
+    length = numpy.hypot(*(p1 - p0))
+    d = (p1 - p0)/length
+    n = numpy.array([d[1], -d[0]])  # outward normal
+    centers = as_points([tab[0] for tab in tabs])
+    width = numpy.array([tab[1] for tab in tabs], dtype=float)
+    depth = numpy.array([tab[2] for tab in tabs], dtype=float)
+    for tab in tabs:
+        if not tab[3] in ('+', '-'):
+            raise ValueError, "unknown tab direction, {0}, must be '+' or '-'".format(tab[3])
+    sign = numpy.array([1.0 if tab[3] == '+' else -1.0 for tab in tabs])
+    t = numpy.dot(centers - p0, d)
+    order = numpy.argsort(t)
+    t, width, offset = t[order], width[order], (sign*depth)[order]
+    ta, tb = t - 0.5*width, t + 0.5*width
+    # Four points per tab: edge, out (or in), out (or in), edge
+    pa = p0 + ta[:,None]*d
+    pb = p0 + tb[:,None]*d
+    tab_points = numpy.stack((pa, pa + offset[:,None]*n, pb + offset[:,None]*n, pb), axis=1)
+    return numpy.vstack((p0[None,:], tab_points.reshape(-1,2)))
+
+def tab_outline(corners, edge_tabs):
+    """
+    Returns the outline of the counter clockwise polygon corners with tabs,
+    edge_tabs[i] are the tabs of the edge from corner i to corner i+1.
+    """
+    corners = as_points(corners)
+    num = len(corners)
+    edges = [edge_points(corners[i], corners[(i+1)%num], edge_tabs[i]) for i in range(num)]
+    return numpy.vstack(edges)
+
+class Profile(object):
+    """
+    A flat part: an outline with polygonal holes and round holes.
+
+    outline = counter clockwise outline points, shape (N,2)
+    holes   = list of clockwise hole points
+    circles = round holes as an array of (x, y, radius) rows
+    """
+
+    def __init__(self, outline, holes=None, circles=None):
+        self.outline = orient(outline, ccw=True)
+        self.holes = []
+        self.circles = numpy.zeros((0,3))
+        for hole in holes or []:
+            self.add_hole(hole)
+        if circles is not None:
+            self.add_circles(circles)
+
+    def copy(self):
+        return Profile(self.outline.copy(), [hole.copy() for hole in self.holes], self.circles.copy())
+
+    def add_hole(self, points):
+        """Add a polygonal hole."""
+        self.holes.append(orient(points, ccw=False))
+
+    def add_circles(self, circles):
+        """Add round holes, given as (x, y, radius) rows."""
+        circles = numpy.reshape(numpy.asarray(circles, dtype=float), (-1,3))
+        self.circles = numpy.vstack((self.circles, circles))
+
+    def add_hole_dict(self, hole):
+        """
+        Add a hole given as a hole dictionary, see highlevel.hole_cutters.
+        Round holes are kept as circles.
+        """
+        hole_type = hole['type']
+        locations = as_points(hole['location'])
+        if hole_type == 'round':
+            radius = numpy.full((len(locations),1), 0.5*hole['size'])
+            self.add_circles(numpy.hstack((locations, radius)))
+            return
+        if hole_type == 'square':
+            sz_x, sz_y = hole['size']
+            points = rect_points(sz_x, sz_y)
+        elif hole_type == 'rounded_square':
+            sz_x, sz_y, radius = hole['size']
+            points = rounded_rect_points(sz_x, sz_y, radius)
+        elif hole_type == 'slot':
+            sz_x, sz_y = hole['size']
+            points = rounded_rect_points(sz_x, sz_y, 0.5*min(sz_x, sz_y))
+        elif hole_type == 'hexagon':
+            points = regular_polygon_points(0.5*hole['size']/numpy.cos(numpy.radians(30.0)), 6)
+        else:
+            raise ValueError, 'unkown hole type {0}'.format(hole_type)
+        for location in locations:
+            self.add_hole(points + location)
+
+    def transform(self, mat=None, offset=(0,0)):
+        """
+        Returns the profile transformed by the 2x2 matrix mat (a rotation or
+        mirror) followed by a translation by offset.
+        """
+        if mat is None:
+            mat = numpy.eye(2)
+        mat = numpy.asarray(mat, dtype=float)
+        offset = numpy.asarray(offset, dtype=float)
+        func = lambda points: numpy.dot(points, mat.T) + offset
+        circles = self.circles.copy()
+        circles[:,:2] = func(circles[:,:2])
+        circles[:,2] *= numpy.sqrt(abs(numpy.linalg.det(mat)))
+        return Profile(func(self.outline), [func(hole) for hole in self.holes], circles)
+
+    def translate(self, v):
+        return self.transform(offset=v[:2])
+
+    def rotate(self, a):
+        """Returns the profile rotated by a degrees about the origin."""
+        c, s = numpy.cos(numpy.radians(a)), numpy.sin(numpy.radians(a))
+        return self.transform([[c, -s], [s, c]])
+
+    def mirror(self, v):
+        """Returns the profile mirrored in the line through the origin normal to v."""
+        v = numpy.asarray(v[:2], dtype=float)
+        v = v/numpy.hypot(*v)
+        return self.transform(numpy.eye(2) - 2.0*numpy.outer(v, v))
+
+    def offset(self, delta, miter_limit=MITER_LIMIT):
+        """
+        Returns the profile with the material grown by delta: the outline
+        moves out and the holes shrink. Negative values shrink the material.
+        """
+        circles = self.circles.copy()
+        circles[:,2] -= delta
+        if numpy.any(circles[:,2] <= 0):
+            raise ValueError, 'offset of {0} closes a round hole'.format(delta)
+        outline = offset_points(self.outline, delta, miter_limit)
+        holes = [offset_points(hole, delta, miter_limit) for hole in self.holes]
+        return Profile(outline, holes, circles)
+
+    def kerf(self, kerf):
+        """
+        Returns the profile compensated for a cutter removing kerf wide
+        cuts, i.e. offset by half the kerf.
+        """
+        if kerf == 0:
+            return self.copy()
+        return self.offset(0.5*kerf)
+
+    def bounds(self):
+        """Returns (xmin, ymin, xmax, ymax) of the outline."""
+        xmin, ymin = self.outline.min(axis=0)
+        xmax, ymax = self.outline.max(axis=0)
+        return xmin, ymin, xmax, ymax
+
+    def area(self):
+        """Area of the outline less the holes."""
+        area = signed_area(self.outline)
+        area += sum(signed_area(hole) for hole in self.holes)
+        area -= numpy.pi*numpy.sum(self.circles[:,2]**2)
+        return area
+
+    def to_scad(self):
+        """Returns the profile as a 2D scad object."""
+        loops = [self.outline] + self.holes
+        paths = []
+        start = 0
+        for loop in loops:
+            paths.append(range(start, start + len(loop)))
+            start += len(loop)
+        shape = Polygon(numpy.vstack(loops), paths)
+        if len(self.circles) == 0:
+            return shape
+        cutters = [Translate(Circle(r=r), v=(x, y, 0)) for x, y, r in self.circles.tolist()]
+        return Difference([shape] + cutters)
+
+    def to_solid(self, thickness):
+        """Returns the profile extruded to thickness, centered in z."""
+        return Linear_Extrude(self.to_scad(), h=thickness)
@@ -0,0 +1,258 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Render time profiling. Attributes openscad render cost to the python objects,
+and the python code which created them.
+
+Usage:
+
+    base.record_sites()              # record where objects are created
+    enclosure.make()
+    prog = SCAD_Prog(fn=50)
+    prog.add(enclosure.get_assembly())
+
+    profiler = Render_Profiler(cache_file='profile_cache.json', max_depth=4)
+    profile_list = profiler.profile(prog)
+    print profiler.report(profile_list)
+
+Each profiled object is rendered on its own and reported by its node id, its
+child index path in the tree, e.g. '0.2.1'. To find the nodes of a report in
+the program, tag_nodes writes the ids as comments with the objects:
+
+    profiler.tag_nodes(prog, max_depth=4)
+    prog.write('tagged.scad')
+    profiler.clear_tags(prog)
+
+Render results are cached by the untagged program text, so unchanged subtrees
+are not re-rendered in later runs, even if their position in the tree moved.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import base
+import render
+import primitives
+import transforms
+
+_planar_types = (primitives.Circle, primitives.Square, primitives.Polygon,
+                 transforms.Projection)
+_extrude_types = (transforms.Linear_Extrude, transforms.Rotate_Extrude)
+
+def is_2d(obj):
+    """Returns True if obj is a 2D object, i.e. it renders to a dxf not an stl."""
+    if isinstance(obj, _planar_types):
+        return True
+    if isinstance(obj, _extrude_types) or not obj.is_cmp():
+        return False
+    children = [child for child in obj.obj if isinstance(child, base.SCAD_Object)]
+    return len(children) > 0 and all(is_2d(child) for child in children)
+
+def tag_nodes(prog, max_depth=None):
+    """
+    Set the node id of each object in the tree, up to max_depth, to its child
+    index path so that the id is written as a comment with the object. Objects
+    appearing more than once in the tree are tagged with all their paths.
+    """
+    paths = {}
+    objects = []
+    for obj, depth, path in base.iter_tree(prog):
+        if isinstance(obj, base.SCAD_Object):
+            if max_depth is None or depth <= max_depth:
+                if id(obj) not in paths:
+                    paths[id(obj)] = []
+                    objects.append(obj)
+                paths[id(obj)].append(path)
+    for obj in objects:
+        obj.node_id = ', '.join(paths[id(obj)])
+
+def clear_tags(prog):
+    """Remove the node ids set by tag_nodes."""
+    for obj, depth, path in base.iter_tree(prog):
+        if isinstance(obj, base.SCAD_Object):
+            obj.node_id = None
+
+def site_str(site):
+    """Format the innermost frame of a construction site as file:line (function)."""
+    if not site:
+        return ''
+    filename, line, func = site[0]
+    return '{0}:{1} ({2})'.format(os.path.basename(filename), line, func)
+
+class Node_Profile(object):
+    """
+    Render cost of a single object.
+
+    node_id   = child index path of the object
+    name      = class name of the object
+    site      = construction site of the object (if recorded)
+    depth     = depth of the object in the tree
+    time      = render time of the object and its children, less the openscad
+                start up time
+    self_time = render time less that of the profiled children
+    facets    = number of facets (stl) or entities (dxf) in the output
+    error     = openscad error output if the render failed
+    """
+
+    def __init__(self, node_id, name, site, depth, time, facets, error=''):
+        self.node_id = node_id
+        self.name = name
+        self.site = site
+        self.depth = depth
+        self.time = time
+        self.self_time = time
+        self.facets = facets
+        self.error = error
+
+class Render_Profiler(object):
+    """
+    Profiles the render cost of the objects in a program by rendering each
+    object on its own.
+
+    openscad   = openscad executable
+    cache_file = json file in which render results are cached between runs
+    max_depth  = maximum depth of the profiled objects (default all)
+    leaves     = profile primitives as well as compound objects
+    """
+
+    def __init__(self, openscad=None, cache_file=None, max_depth=None, leaves=False):
+        self.openscad = openscad
+        self.cache_file = cache_file
+        self.max_depth = max_depth
+        self.leaves = leaves
+        self.overhead = None
+        self.cache = {}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as fid:
+                self.cache = json.load(fid)
+
+    def save_cache(self):
+        if self.cache_file:
+            with open(self.cache_file, 'w') as fid:
+                json.dump(self.cache, fid, indent=1, sort_keys=True)
+
+    def render_text(self, text, suffix, workdir):
+        """Render program text, using the cache, returns (time, facets, error)."""
+        key = '{0}{1}'.format(hashlib.sha1(text).hexdigest(), suffix)
+        try:
+            entry = self.cache[key]
+        except KeyError:
+            outfile = os.path.join(workdir, 'node' + suffix)
+            if os.path.exists(outfile):
+                os.remove(outfile)
+            result = render.render(text, outfile, openscad=self.openscad)
+            facets = 0
+            error = ''
+            if result.ok() and os.path.exists(outfile):
+                facets = render.count_facets(outfile)
+            else:
+                error = result.stderr.strip()
+            entry = {'time': result.time, 'facets': facets, 'error': error}
+            self.cache[key] = entry
+        return entry['time'], entry['facets'], entry['error']
+
+    def get_overhead(self, workdir):
+        """Openscad start up time, measured by rendering a tiny program."""
+        if self.overhead is None:
+            text = 'cube(size=[1, 1, 1]);\n'
+            outfile = os.path.join(workdir, 'overhead.stl')
+            self.overhead = render.render(text, outfile, openscad=self.openscad).time
+        return self.overhead
+
+    def profile(self, prog):
+        """
+        Profile the objects in prog (a SCAD_Prog, object or list of objects).
+        Returns a list of Node_Profile sorted by self_time, most costly first.
+        """
+        # Render and key the cache on the untagged text, restoring any tags after
+        tags = [(obj, obj.node_id) for obj, depth, path in base.iter_tree(prog)
+                if isinstance(obj, base.SCAD_Object) and obj.node_id]
+        clear_tags(prog)
+        try:
+            return self._profile(prog)
+        finally:
+            for obj, node_id in tags:
+                obj.node_id = node_id
+
+    def _profile(self, prog):
+        # Global settings and definitions needed to render objects on their own
+        settings = {}
+        if isinstance(prog, base.SCAD_Prog):
+            settings = dict(fn=prog.fn, fa=prog.fa, fs=prog.fs, lod=prog.lod)
+        definitions = []
+        root_list = prog.objlist if isinstance(prog, base.SCAD_Prog) else prog
+        if type(root_list) != list:
+            root_list = [root_list]
+        for obj in root_list:
+            if isinstance(obj, (primitives.Variables, transforms.Assembly)):
+                definitions.append(obj)
+
+        workdir = tempfile.mkdtemp()
+        try:
+            overhead = self.get_overhead(workdir)
+            profile_dict = {}
+            for obj, depth, path in base.iter_tree(prog):
+                if not isinstance(obj, base.SCAD_Object):
+                    continue
+                if isinstance(obj, transforms.Assembly):
+                    continue
+                if '.' in path and self.in_assembly(root_list, path):
+                    continue
+                if self.max_depth is not None and depth > self.max_depth:
+                    continue
+                if not (obj.is_cmp() or self.leaves):
+                    continue
+                suffix = '.dxf' if is_2d(obj) else '.stl'
+                node_prog = base.SCAD_Prog(**settings)
+                node_prog.add(definitions + [obj])
+                text = str(node_prog)
+                t, facets, error = self.render_text(text, suffix, workdir)
+                profile_dict[path] = Node_Profile(path, obj.__class__.__name__, obj.site,
+                                                  depth, max(t - overhead, 0.0), facets, error)
+        finally:
+            shutil.rmtree(workdir)
+            self.save_cache()
+
+        # Remove the cost of the profiled children from each object
+        for path, node in profile_dict.iteritems():
+            parent = path
+            while '.' in parent:
+                parent = parent.rsplit('.', 1)[0]
+                if parent in profile_dict:
+                    profile_dict[parent].self_time -= node.time
+                    break
+        profile_list = profile_dict.values()
+        for node in profile_list:
+            node.self_time = max(node.self_time, 0.0)
+        profile_list.sort(key=lambda node: (-node.self_time, node.node_id))
+        return profile_list
+
+    def in_assembly(self, root_list, path):
+        """Returns True if path lies inside a module definition."""
+        root = root_list[int(path.split('.')[0])]
+        return isinstance(root, transforms.Assembly)
+
+    def report(self, profile_list, num=20):
+        """Returns a table of the num most costly objects."""
+        lines = ['{0:>9} {1:>9} {2:>8}  {3:<12} {4:<16} {5}'.format(
+                 'self (s)', 'total (s)', 'facets', 'node', 'class', 'site')]
+        for node in profile_list[:num]:
+            site = site_str(node.site)
+            if node.error:
+                site = '{0} [render failed]'.format(site)
+            lines.append('{0:9.3f} {1:9.3f} {2:8d}  {3:<12} {4:<16} {5}'.format(
+                         node.self_time, node.time, node.facets, node.node_id, node.name, site))
+        return '\n'.join(lines)
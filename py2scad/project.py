@@ -0,0 +1,218 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Multi-file projects with incremental rebuilds.
+
+A SCAD_Project collects the programs making up a product, the files each one
+depends on (imported stl and dxf files, included or used libraries, and the
+libraries those use in turn) and the outputs rendered from it. Writing the project only rewrites changed scad files,
+and stale_outputs returns the minimal, ordered, set of outputs which have to be
+re-rendered, in the manner of make.
+
+    project = SCAD_Project('build')
+    project.add('top.scad', top_prog, outputs=['top.stl'])
+    project.add('case.scad', case_prog)     # imports top.stl
+    project.add_library(library.share_assemblies([top_prog, case_prog], 'lib.scad'))
+    project.build()
+"""
+import os
+import re
+import base
+import primitives
+import transforms
+import render
+
+# Objects referring to other files through their filename attribute
+DEPENDENCY_TYPES = (primitives.Import_STL, primitives.Import, transforms.Linear_DXF_Extrude,
+                    primitives.Include, primitives.Use)
+
+# Use and include statements of scad files
+REFERENCE_RE = re.compile(r'^\s*(?:use|include)\s*<([^>]+)>', re.MULTILINE)
+
+def get_dependencies(prog):
+    """
+    Returns the sorted list of files (as named in the program) which prog, a
+    SCAD_Prog or object tree, depends on.
+    """
+    deps = set()
+    for obj, depth, path in base.iter_tree(prog):
+        if isinstance(obj, DEPENDENCY_TYPES):
+            deps.add(obj.filename)
+    return sorted(deps)
+
+def scan_dependencies(path):
+    """
+    Returns the files a scad file on disk uses or includes, as named in the
+    file. Other and missing files have no dependencies.
+    """
+    if not path.endswith('.scad') or not os.path.exists(path):
+        return []
+    with open(path) as fid:
+        return sorted(set(REFERENCE_RE.findall(fid.read())))
+
+class SCAD_Project(object):
+    """
+    A set of scad programs written to one directory.
+
+    directory = directory the programs are written to and rendered in, file
+                names in the programs are relative to it
+    """
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self.programs = []  # scad file names in the order they were added
+        self.progs = {}     # scad file name -> program
+        self.outputs = {}   # scad file name -> output file names
+        self.libraries = [] # library.SCAD_Library objects written with the programs
+
+    def add(self, filename, prog, outputs=None):
+        """
+        Add a program written to filename. outputs are the files rendered from
+        it, by default a single stl of the same name.
+        """
+        if filename in self.progs:
+            raise ValueError, 'program {0} already in project'.format(filename)
+        if outputs is None:
+            outputs = [os.path.splitext(filename)[0] + '.stl']
+        elif type(outputs) == str:
+            outputs = [outputs]
+        self.programs.append(filename)
+        self.progs[filename] = prog
+        self.outputs[filename] = list(outputs)
+
+    def add_library(self, library):
+        """Add a shared library, see library.share_assemblies."""
+        self.libraries.append(library)
+
+    def get_path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def get_direct_dependencies(self, filename):
+        """
+        Returns the files a program, library or other scad file of the project
+        refers to itself.
+        """
+        if filename in self.progs:
+            return get_dependencies(self.progs[filename])
+        for library in self.libraries:
+            if library.filename == filename:
+                return get_dependencies(library.assemblies)
+        # Names in a file are relative to its directory
+        dirname = os.path.dirname(filename)
+        return [os.path.normpath(os.path.join(dirname, dep))
+                for dep in scan_dependencies(self.get_path(filename))]
+
+    def get_dependencies(self, filename):
+        """
+        Returns the sorted list of files the program filename depends on,
+        directly or through the libraries it uses or includes.
+        """
+        found = set([filename])
+        pending = [filename]
+        while pending:
+            for dep in self.get_direct_dependencies(pending.pop()):
+                if dep not in found:
+                    found.add(dep)
+                    pending.append(dep)
+        found.remove(filename)
+        return sorted(found)
+
+    def get_producers(self):
+        """Returns a dictionary of output file name -> program producing it."""
+        producers = {}
+        for filename in self.programs:
+            for outfile in self.outputs[filename]:
+                producers[outfile] = filename
+        return producers
+
+    def write(self):
+        """
+        Write all programs, unchanged files are not rewritten. Returns the list
+        of files written.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        written = []
+        for library in self.libraries:
+            if library.write(self.get_path(library.filename)):
+                written.append(library.filename)
+        for filename in self.programs:
+            prog = self.progs[filename]
+            if not isinstance(prog, base.SCAD_Prog):
+                temp = base.SCAD_Prog()
+                temp.add(prog)
+                prog = temp
+            if prog.write(self.get_path(filename)):
+                written.append(filename)
+        return written
+
+    def stale_outputs(self):
+        """
+        Returns the list of (scad file, output file) to re-render, in build
+        order. An output is stale if it is missing, older than its scad file or
+        any dependency, or depends on another stale output.
+        """
+        producers = self.get_producers()
+        stale = {}      # scad file name -> True if its outputs are stale
+        visiting = set()
+        stale_list = []
+
+        def mtime(filename):
+            path = self.get_path(filename)
+            if os.path.exists(path):
+                return os.path.getmtime(path)
+            return None
+
+        def visit(filename):
+            if filename in stale:
+                return stale[filename]
+            if filename in visiting:
+                raise ValueError, 'circular dependency on {0}'.format(filename)
+            visiting.add(filename)
+            deps = self.get_dependencies(filename)
+            dep_stale = False
+            for dep in deps:
+                if dep in producers and visit(producers[dep]):
+                    dep_stale = True
+            visiting.remove(filename)
+            src_times = [mtime(x) for x in [filename] + deps]
+            src_time = max([t for t in src_times if t is not None] or [0])
+            is_stale = False
+            for outfile in self.outputs[filename]:
+                out_time = mtime(outfile)
+                if dep_stale or out_time is None or out_time < src_time:
+                    is_stale = True
+                    stale_list.append((filename, outfile))
+            stale[filename] = is_stale
+            return is_stale
+
+        for filename in self.programs:
+            visit(filename)
+        return stale_list
+
+    def build(self, openscad=None):
+        """
+        Write the project and render the stale outputs. Returns the list of
+        Render_Results, stops at the first failed render.
+        """
+        self.write()
+        results = []
+        for filename, outfile in self.stale_outputs():
+            result = render.render_file(self.get_path(filename), self.get_path(outfile),
+                                        openscad=openscad)
+            results.append(result)
+            if not result.ok():
+                break
+        return results
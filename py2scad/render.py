@@ -0,0 +1,510 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import math
+import time
+import Queue
+import shutil
+import struct
+import tempfile
+import threading
+import subprocess
+import base
+import stl_tools
+import utility
+import tree_stats
+
+# Openscad executable, may be overridden with the OPENSCAD environment variable
+OPENSCAD = os.environ.get('OPENSCAD', 'openscad')
+
+class Render_Result(object):
+    """
+    Result of an openscad run.
+
+    outfile    = the output file
+    returncode = the openscad exit status
+    time       = wall clock time of the run in seconds
+    stderr     = openscad's error output (its log)
+    timed_out  = True if openscad was killed after a timeout
+    """
+
+    def __init__(self, outfile, returncode, time, stderr='', timed_out=False):
+        self.outfile = outfile
+        self.returncode = returncode
+        self.time = time
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+    def ok(self):
+        return self.returncode == 0
+
+def scad_str(prog):
+    """Returns the scad program text for a SCAD_Prog, object or string."""
+    if type(prog) == str:
+        return prog
+    if type(prog) == list:
+        temp = base.SCAD_Prog()
+        temp.add(prog)
+        prog = temp
+    return '{0}'.format(prog)
+
+def get_command(scadfile, outfile, openscad=None, defines=None):
+    """
+    Returns the openscad command line (list of arguments) rendering scadfile
+    to outfile. defines is a dictionary of variable values passed with -D,
+    e.g. {'$t': 0.5}.
+    """
+    if openscad is None:
+        openscad = OPENSCAD
+    cmd = [openscad, '-o', outfile]
+    if defines:
+        for name in sorted(defines):
+            cmd.extend(['-D', '{0}={1}'.format(name, defines[name])])
+    cmd.append(scadfile)
+    return cmd
+
+def render(prog, outfile, openscad=None, defines=None, scadfile=None):
+    """
+    Render a program with openscad. The output type is given by the extension
+    of outfile (.stl, .dxf, etc).
+
+    Arguments:
+        prog     = SCAD_Prog, object, list of objects or scad program string
+        outfile  = output file name
+        openscad = openscad executable (default OPENSCAD)
+        defines  = dictionary of variables overridden on the command line
+        scadfile = file the program is written to. By default a temporary file
+            in the output directory, so that relative file names (imports,
+            etc.) are found, which is removed afterwards.
+
+    Returns a Render_Result.
+    """
+    remove = scadfile is None
+    if scadfile is None:
+        outdir = os.path.dirname(os.path.abspath(outfile))
+        fd, scadfile = tempfile.mkstemp(suffix='.scad', dir=outdir)
+        os.close(fd)
+    try:
+        with open(scadfile, 'w') as fid:
+            fid.write(scad_str(prog))
+        result = render_file(scadfile, outfile, openscad=openscad, defines=defines)
+    finally:
+        if remove and os.path.exists(scadfile):
+            os.remove(scadfile)
+    return result
+
+def render_file(scadfile, outfile, openscad=None, defines=None, timeout=None):
+    """Render an existing scad file to outfile, returns a Render_Result."""
+    cmd = get_command(scadfile, outfile, openscad=openscad, defines=defines)
+    return run_command(cmd, outfile, timeout=timeout)
+
+def run_command(cmd, outfile, timeout=None, started=None):
+    """
+    Run an openscad command line, returns a Render_Result. openscad is killed
+    after timeout seconds. started is called with the Popen object once the
+    process is running, e.g. to keep it for cancelling.
+    """
+    t0 = time.time()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if started is not None:
+        started(proc)
+    timed_out = []
+    timer = None
+    if timeout is not None:
+        def kill():
+            timed_out.append(True)
+            kill_process(proc)
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        if timer is not None:
+            timer.cancel()
+    elapsed = time.time() - t0
+    return Render_Result(outfile, proc.returncode, elapsed, stderr, timed_out=bool(timed_out))
+
+def kill_process(proc):
+    """Kill a running process, ignoring processes which already exited."""
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+# Render backends --------------------------------------------------------------
+
+class Render_Backend(object):
+    """
+    Base class of render backends. A backend renders a list of jobs, each a
+    (prog, outfile) tuple, and returns a Render_Result per job.
+    """
+
+    def __init__(self, openscad=None):
+        self.openscad = openscad
+
+    def render(self, prog, outfile, defines=None):
+        return self.render_many([(prog, outfile)], defines=defines)[0]
+
+    def render_many(self, jobs, defines=None):
+        raise NotImplementedError
+
+class Subprocess_Backend(Render_Backend):
+    """Renders each program with its own openscad process."""
+
+    def render_many(self, jobs, defines=None):
+        return [render(prog, outfile, openscad=self.openscad, defines=defines)
+                for prog, outfile in jobs]
+
+class Batch_Backend(Render_Backend):
+    """
+    Renders many small parts with one openscad process, saving its start up
+    time for each part. Each program becomes a module, the modules are placed
+    on a grid of spacing pitch and rendered to one stl, which is split back
+    into the parts by grid cell. The batch is written to a temporary
+    directory.
+
+    Only object trees whose bounds (tree_stats.get_bounds) lie within pitch/2
+    of their origin are batched. Others (scad text, trees of unknown or
+    larger size, non stl outputs, programs using libraries) are rendered
+    separately, as are the parts of a batch which fails or can not be read,
+    so errors are reported per part. A batched part found outside its grid
+    cell raises a ValueError.
+
+    openscad  = openscad executable (default OPENSCAD)
+    pitch     = grid spacing
+    max_batch = maximum number of parts per openscad run
+    """
+
+    def __init__(self, openscad=None, pitch=1000.0, max_batch=64):
+        Render_Backend.__init__(self, openscad=openscad)
+        self.pitch = pitch
+        self.max_batch = max_batch
+        self.fallback = Subprocess_Backend(openscad=openscad)
+
+    def can_batch(self, prog, text, outfile):
+        if os.path.splitext(outfile)[1].lower() != '.stl':
+            return False
+        if not self.fits(prog):
+            return False
+        for line in text.splitlines():
+            if line.strip().startswith(('use <', 'include <')):
+                return False
+        return True
+
+    def fits(self, prog):
+        """True if the bounds of prog are known and lie within its grid cell."""
+        bounds = tree_stats.get_bounds(prog)
+        if bounds is None:
+            return False
+        half = 0.5*self.pitch
+        return all(abs(val) < half for val in bounds[0][:2] + bounds[1][:2])
+
+    def get_offsets(self, num):
+        """Returns the (x, y) grid position of each of num parts."""
+        cols = int(math.ceil(math.sqrt(num)))
+        return [((i % cols)*self.pitch, (i//cols)*self.pitch) for i in range(num)]
+
+    def batch_str(self, text_list):
+        """Returns the program rendering the programs in text_list side by side."""
+        str_list = []
+        for i, (text, offset) in enumerate(zip(text_list, self.get_offsets(len(text_list)))):
+            str_list.append('module py2scad_part_{0}() {{\n{1}\n}}\n'.format(i, text))
+            str_list.append('translate(v={0}) py2scad_part_{1}();\n\n'.format(
+                            utility.val_to_str([offset[0], offset[1], 0]), i))
+        return ''.join(str_list)
+
+    def render_many(self, jobs, defines=None):
+        results = [None]*len(jobs)
+        batch = []
+        for i, (prog, outfile) in enumerate(jobs):
+            text = scad_str(prog)
+            if self.can_batch(prog, text, outfile):
+                batch.append((i, text, outfile))
+            else:
+                results[i] = self.fallback.render(text, outfile, defines=defines)
+        for start in range(0, len(batch), self.max_batch):
+            chunk = batch[start:start+self.max_batch]
+            chunk_results = self.render_batch([(text, outfile) for i, text, outfile in chunk],
+                                              defines=defines)
+            for (i, text, outfile), result in zip(chunk, chunk_results):
+                results[i] = result
+        return results
+
+    def render_batch(self, jobs, defines=None):
+        """Render a list of (text, outfile) in one openscad run."""
+        tmpdir = tempfile.mkdtemp()
+        batchfile = os.path.join(tmpdir, 'batch.stl')
+        try:
+            result = render(self.batch_str([text for text, outfile in jobs]), batchfile,
+                            openscad=self.openscad, defines=defines)
+            part_facets = None
+            if result.ok():
+                part_facets = self.split(batchfile, len(jobs))
+        finally:
+            shutil.rmtree(tmpdir)
+        if part_facets is None:
+            return self.fallback.render_many(jobs, defines=defines)
+        results = []
+        for (text, outfile), facet_list in zip(jobs, part_facets):
+            stl_tools.write_stl(outfile, facet_list)
+            results.append(Render_Result(outfile, 0, result.time/len(jobs), result.stderr))
+        return results
+
+    def split(self, filename, num):
+        """
+        Split the facets of a batch stl by grid cell, shifting each part back
+        to the origin. Returns None if the stl can not be read, raises a
+        ValueError if a facet is not within a grid cell.
+        """
+        try:
+            facet_list = stl_tools.read_stl(filename)
+        except (AssertionError, IndexError, ValueError):
+            return None
+        offsets = self.get_offsets(num)
+        cols = int(math.ceil(math.sqrt(num)))
+        half = 0.5*self.pitch
+        part_facets = [[] for i in range(num)]
+        for facet in facet_list:
+            x = sum(vertex[0] for vertex in facet.vertices)/3.0
+            y = sum(vertex[1] for vertex in facet.vertices)/3.0
+            col = int(round(x/self.pitch))
+            row = int(round(y/self.pitch))
+            i = row*cols + col
+            if col < 0 or col >= cols or row < 0 or i >= num:
+                raise ValueError, 'batch facet at ({0}, {1}) is outside the grid'.format(x, y)
+            x0, y0 = offsets[i]
+            for vertex in facet.vertices:
+                if abs(vertex[0] - x0) >= half or abs(vertex[1] - y0) >= half:
+                    raise ValueError, 'batch part {0} overflows its grid cell'.format(i)
+            part_facets[i].append(facet)
+        return [stl_tools.shift_facet_list(facets, (-offset[0], -offset[1], 0))
+                for facets, offset in zip(part_facets, offsets)]
+
+# Render pool ------------------------------------------------------------------
+
+class Render_Job(object):
+    """
+    A render submitted to a Render_Pool. The state is one of 'pending',
+    'running', 'done' or 'cancelled', result is the Render_Result once done.
+    """
+
+    def __init__(self, text, outfile, defines=None, timeout=None, owns_outfile=False):
+        self.text = text
+        self.outfile = outfile
+        self.defines = defines
+        self.timeout = timeout
+        self.owns_outfile = owns_outfile
+        self.state = 'pending'
+        self.result = None
+        self._proc = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def cancel(self):
+        """
+        Cancel the job, killing openscad if it is running. Returns False if
+        the job already finished.
+        """
+        with self._lock:
+            if self.state in ('done', 'cancelled'):
+                return False
+            running = self.state == 'running'
+            self.state = 'cancelled'
+            if running and self._proc is not None:
+                kill_process(self._proc)
+        if not running:
+            self._finished.set()
+        return True
+
+    def cancelled(self):
+        return self.state == 'cancelled'
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to finish, returns the Render_Result or None if the
+        job was cancelled or did not finish within timeout seconds.
+        """
+        self._finished.wait(timeout)
+        return self.result
+
+    def stream(self, chunk_size=65536):
+        """
+        Wait for the job and yield the output file in chunks of bytes. Output
+        files created by the pool are removed once streamed.
+        """
+        result = self.wait()
+        try:
+            if result is None or not result.ok():
+                return
+            with open(self.outfile, 'rb') as fid:
+                while True:
+                    data = fid.read(chunk_size)
+                    if not data:
+                        break
+                    yield data
+        finally:
+            if self.owns_outfile and os.path.exists(self.outfile):
+                os.remove(self.outfile)
+
+    def _started(self, proc):
+        with self._lock:
+            self._proc = proc
+            if self.state == 'cancelled':
+                kill_process(proc)
+
+class Render_Pool(object):
+    """
+    A bounded pool of openscad renders run from worker threads, so that many
+    callers (e.g. the requests of a web service) share a limited number of
+    openscad processes.
+
+    max_workers = maximum number of concurrent openscad processes
+    openscad    = openscad executable (default OPENSCAD)
+    timeout     = default timeout of each render in seconds
+    workdir     = directory for scad and output files, by default a temporary
+                  directory removed by close. Relative file names in the
+                  programs (imports, etc.) are relative to it.
+
+        with Render_Pool(max_workers=4, timeout=60) as pool:
+            job = pool.submit(prog)
+            for data in job.stream():
+                response.write(data)
+    """
+
+    def __init__(self, max_workers=4, openscad=None, timeout=None, workdir=None):
+        self.openscad = openscad
+        self.timeout = timeout
+        self.owns_workdir = workdir is None
+        if workdir is None:
+            workdir = tempfile.mkdtemp(prefix='py2scad_render_')
+        self.workdir = workdir
+        self.queue = Queue.Queue()
+        self.closed = False
+        self.running = set()    # jobs being rendered
+        self._lock = threading.Lock()
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, prog, outfile=None, ext='.stl', defines=None, timeout=None):
+        """
+        Queue a render of prog, a SCAD_Prog, objects or program string, and
+        return its Render_Job. By default the output is a file in the work
+        directory of type ext, removed once streamed.
+        """
+        if self.closed:
+            raise RuntimeError('render pool is closed')
+        owns_outfile = outfile is None
+        if outfile is None:
+            fd, outfile = tempfile.mkstemp(suffix=ext, dir=self.workdir)
+            os.close(fd)
+            os.remove(outfile)
+        if timeout is None:
+            timeout = self.timeout
+        job = Render_Job(scad_str(prog), outfile, defines=defines, timeout=timeout,
+                         owns_outfile=owns_outfile)
+        self.queue.put(job)
+        return job
+
+    def close(self, cancel=False):
+        """
+        Stop the workers once the queued jobs are done, or cancel all jobs.
+        Removes the work directory if the pool created it.
+        """
+        self.closed = True
+        if cancel:
+            while True:
+                try:
+                    self.queue.get_nowait().cancel()
+                except Queue.Empty:
+                    break
+            with self._lock:
+                running = list(self.running)
+            for job in running:
+                job.cancel()
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with job._lock:
+                if job.state != 'pending':
+                    continue
+                job.state = 'running'
+            with self._lock:
+                self.running.add(job)
+            scadfile = None
+            result = None
+            try:
+                fd, scadfile = tempfile.mkstemp(suffix='.scad', dir=self.workdir)
+                with os.fdopen(fd, 'w') as fid:
+                    fid.write(job.text)
+                cmd = get_command(scadfile, job.outfile, openscad=self.openscad,
+                                  defines=job.defines)
+                result = run_command(cmd, job.outfile, timeout=job.timeout,
+                                     started=job._started)
+            except Exception, err:
+                # Any failure fails the job, never the worker
+                result = Render_Result(job.outfile, None, 0.0, str(err))
+            finally:
+                try:
+                    if scadfile is not None and os.path.exists(scadfile):
+                        os.remove(scadfile)
+                except OSError:
+                    pass
+                with self._lock:
+                    self.running.discard(job)
+                with job._lock:
+                    if job.state == 'running':
+                        job.state = 'done'
+                        job.result = result
+                job._finished.set()
+
+def count_facets(filename):
+    """
+    Returns the number of facets in an stl file (ascii or binary), or the
+    number of entities in a dxf file.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    with open(filename, 'rb') as fid:
+        data = fid.read()
+    if ext == '.dxf':
+        entities = ('LINE', 'LWPOLYLINE', 'POLYLINE', 'CIRCLE', 'ARC')
+        return len([line for line in data.splitlines() if line.strip() in entities])
+    if data[:5] == 'solid' and 'facet' in data[:1024]:
+        return data.count('facet normal')
+    if len(data) >= 84:
+        return struct.unpack('<I', data[80:84])[0]
+    return 0
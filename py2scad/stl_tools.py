@@ -32,6 +32,10 @@ Author: William Dickson
 ------------------------------------------------------------------------
 """
 import sys, string, math, copy
+try:
+    import numpy
+except ImportError:
+    numpy = None
 #try:
 #    import cgkit.cgtypes as cgtypes # cgkit 2
 #except ImportError, err:
@@ -176,6 +180,43 @@ def get_vertex_dict(facet_list):
                 cnt+=1
     return vertex_dict
 
+def get_indexed_mesh(facet_list, decimals=None):
+    """
+    Weld the facets into an indexed triangle mesh. Returns (points, faces)
+    where points is an (N,3) array of the unique vertices, in order of first
+    occurance, and faces is an (M,3) array of vertex indices. Faces are
+    ordered counter-clockwise when viewed from outside, as given by the
+    facet normals. If decimals is given the vertices are rounded to that many
+    decimals first so nearly coincident vertices are merged. Faces which
+    collapse after welding are dropped. Requires numpy.
+    """
+    vertices = numpy.array([facet.vertices for facet in facet_list], dtype=float)
+    normals = numpy.array([facet.ow_normal for facet in facet_list], dtype=float)
+    vertices = vertices.reshape(-1,3)
+    if decimals is not None:
+        vertices = numpy.round(vertices, decimals)
+
+    # Unique vertices in order of first occurance
+    points, index, inverse = numpy.unique(vertices, axis=0, return_index=True,
+                                          return_inverse=True)
+    order = numpy.argsort(index)
+    rank = numpy.empty(len(order), dtype=int)
+    rank[order] = numpy.arange(len(order))
+    points = points[order]
+    faces = rank[inverse].reshape(-1,3)
+
+    # Orient faces counter-clockwise w.r.t. the outward normals
+    v0 = points[faces[:,1]] - points[faces[:,0]]
+    v1 = points[faces[:,2]] - points[faces[:,0]]
+    test = (numpy.cross(v0, v1)*normals).sum(axis=1)
+    flip = test < 0
+    faces[flip] = faces[flip][:,::-1]
+
+    # Drop degenerate faces
+    ok = (faces[:,0] != faces[:,1]) & (faces[:,1] != faces[:,2]) & (faces[:,2] != faces[:,0])
+    faces = numpy.ascontiguousarray(faces[ok])
+    return points, faces
+
 def get_edge_dict(facet_list, vertex_dict):
     """
     Get list of unique edges (in terms of the vertex indices. Assigns a
@@ -0,0 +1,209 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Parameter sweeps.
+
+Generate the variants of a part over a grid of parameters in a process pool.
+Each variant's program is written to its own scad file, variants with the same
+program text as an earlier one are reported as duplicates and are neither
+written nor rendered. Results are yielded as they finish.
+
+    def build(params):
+        enclosure = Basic_Enclosure(params)
+        enclosure.make()
+        prog = SCAD_Prog(fn=50)
+        prog.add(enclosure.get_assembly())
+        return prog
+
+    grid = {'wall_thickness': [3.0, 4.0], 'lid_radius': [4.0, 6.0, 8.0]}
+    for result in sweep(build, grid, base_params=params, render_ext='.stl'):
+        print result.name, result.params, result.duplicate_of
+
+The builder is called with a dictionary of parameters and returns a SCAD_Prog
+or objects. It must be picklable (a module level function) to run in a pool.
+"""
+import os
+import hashlib
+import itertools
+import traceback
+import multiprocessing
+import base
+import render
+import utility
+
+class Sweep_Result(object):
+    """
+    Result of one variant of a sweep.
+
+    index        = position of the variant in the grid
+    name         = file name stem of the variant
+    params       = parameters the variant was built with
+    params_hash  = hash of the parameters, see utility.params_hash
+    scadfile     = scad file written, None for duplicates and errors
+    digest       = content hash of the program text
+    duplicate_of = name of the earlier variant with the same program, or None
+    render       = render.Render_Result, or None if not rendered
+    error        = traceback of an exception raised by the builder, or None
+    """
+
+    def __init__(self, index, name, params):
+        self.index = index
+        self.name = name
+        self.params = params
+        self.params_hash = utility.params_hash(params)
+        self.scadfile = None
+        self.digest = None
+        self.duplicate_of = None
+        self.render = None
+        self.error = None
+
+    def ok(self):
+        if self.error is not None:
+            return False
+        return self.render is None or self.render.ok()
+
+def expand_grid(grid, base_params=None):
+    """
+    Returns the list of parameter dictionaries for all combinations of the
+    values in grid, a dictionary of name -> list of values. Values which are
+    not lists are held constant. base_params are common to all variants.
+    """
+    names = sorted(grid)
+    values = []
+    for name in names:
+        val = grid[name]
+        if type(val) != list:
+            val = [val]
+        values.append(val)
+    param_list = []
+    for combination in itertools.product(*values):
+        params = dict(base_params) if base_params else {}
+        params.update(zip(names, combination))
+        param_list.append(params)
+    return param_list
+
+def _build_variant(args):
+    """Pool worker, builds a variant returning (index, program text, error)."""
+    builder, index, params = args
+    try:
+        return index, render.scad_str(builder(params)), None
+    except Exception:
+        return index, None, traceback.format_exc()
+
+def _render_variant(args):
+    """Pool worker, renders a variant's scad file returning (index, render, error)."""
+    index, scadfile, outfile, openscad = args
+    try:
+        return index, render.render_file(scadfile, outfile, openscad=openscad), None
+    except Exception:
+        return index, None, traceback.format_exc()
+
+def sweep(builder, grid, base_params=None, directory='.', name='variant_{index:04d}',
+          processes=None, render_ext=None, openscad=None):
+    """
+    Build, and optionally render, the variants of builder over the parameter
+    grid, yielding a Sweep_Result per variant as it finishes.
+
+    Arguments:
+        builder     = callable taking a parameter dictionary, returning a
+                      SCAD_Prog or objects
+        grid        = dictionary of parameter name -> list of values
+        base_params = parameters common to all variants
+        directory   = directory the files are written to
+        name        = format string of the file name stem, given the index
+                      and parameters of the variant, or a callable taking
+                      (index, params)
+        processes   = pool size, default the number of cpus. With 0 the
+                      variants are built and rendered in this process.
+        render_ext  = output extension (e.g. '.stl') to render the variants
+        openscad    = openscad executable for rendering
+    """
+    param_list = expand_grid(grid, base_params=base_params)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    results = {}
+    for index, params in enumerate(param_list):
+        if callable(name):
+            stem = name(index, params)
+        else:
+            stem = name.format(index=index, **params)
+        results[index] = Sweep_Result(index, stem, params)
+    tasks = [(builder, index, params) for index, params in enumerate(param_list)]
+
+    seen = {}       # digest -> name of the first variant
+
+    def built(index, text, error):
+        """Handle a finished build, returns the render task or None if done."""
+        result = results[index]
+        if error is not None:
+            result.error = error
+            return None
+        result.digest = hashlib.sha1(text).hexdigest()
+        if result.digest in seen:
+            result.duplicate_of = seen[result.digest]
+            return None
+        seen[result.digest] = result.name
+        result.scadfile = os.path.join(directory, result.name + '.scad')
+        base.write_if_changed(result.scadfile, base.get_header_str(result.scadfile) + text)
+        if render_ext is None:
+            return None
+        outfile = os.path.join(directory, result.name + render_ext)
+        return (index, result.scadfile, outfile, openscad)
+
+    def rendered(index, render_result, error):
+        result = results[index]
+        result.render = render_result
+        result.error = error
+
+    if processes == 0:
+        for task in tasks:
+            index = task[1]
+            render_task = built(*_build_variant(task))
+            if render_task is not None:
+                rendered(*_render_variant(render_task))
+            yield results.pop(index)
+        return
+
+    # Builds and renders share the pool, the finished tasks are collected by
+    # polling so that results are yielded in the order they complete. Tasks
+    # which fail in the pool, e.g. a builder which can not be pickled, give
+    # error results.
+    pool = multiprocessing.Pool(processes)
+    try:
+        pending = {}    # async result -> (worker, index)
+        for task in tasks:
+            pending[pool.apply_async(_build_variant, (task,))] = (_build_variant, task[1])
+        while pending:
+            done = [async_result for async_result in pending if async_result.ready()]
+            if not done:
+                next(iter(pending)).wait(0.05)
+                continue
+            for async_result in done:
+                worker, index = pending.pop(async_result)
+                try:
+                    value = async_result.get()
+                except Exception:
+                    value = (index, None, traceback.format_exc())
+                if worker is _build_variant:
+                    render_task = built(*value)
+                    if render_task is not None:
+                        pending[pool.apply_async(_render_variant, (render_task,))] = (_render_variant, index)
+                        continue
+                else:
+                    rendered(*value)
+                yield results.pop(index)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,152 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+from py2scad import animation
+from py2scad.base import SCAD_Prog
+from py2scad.primitives import Cube
+from py2scad.transforms import AnimRotate, AnimTranslate, Translate
+from py2scad.utility import val_to_str, add_expr, neg_expr
+from render_test import make_fake_openscad
+
+class Test_Keyframes(unittest.TestCase):
+    """Test keyframes and their lookup tables."""
+
+    def test_scalar(self):
+        """Verify scalar keyframes are a single lookup and interpolate."""
+        kf = animation.Keyframes([(1.0, 0.0), (0.0, 0.0), (0.5, 90.0)])
+        self.assertEqual(str(kf), 'lookup($t, [[0.00000, 0.00000], [0.50000, 90.00000], [1.00000, 0.00000]])')
+        self.assertAlmostEqual(kf(0.25), 45.0)
+        self.assertAlmostEqual(kf(2.0), 0.0)
+
+    def test_vector(self):
+        """Verify vector keyframes are a lookup per component."""
+        kf = animation.Keyframes([(0.0, [0,0,0]), (1.0, [0,0,20])])
+        self.assertEqual(str(kf).count('lookup($t'), 3)
+        self.assertTrue(str(kf).startswith('[lookup'))
+        self.assertEqual(kf(0.5), (0.0, 0.0, 10.0))
+
+    def test_bad_keyframes(self):
+        """Verify missing and mismatched keyframes are rejected."""
+        self.assertRaises(ValueError, animation.Keyframes, [])
+        self.assertRaises(ValueError, animation.Keyframes, [(0.0, [0,0]), (1.0, [0,0,1])])
+
+    def test_transforms(self):
+        """Verify keyframes drive the animated transforms."""
+        swing = animation.Keyframes([(0.0, 0.0), (1.0, 90.0)])
+        slide = animation.Keyframes([(0.0, [0,0,0]), (1.0, [0,0,20])])
+        obj = AnimTranslate(AnimRotate(Cube(size=[1,1,1]), a=swing, v=[1,0,0]), v=slide)
+        output = str(obj)
+        self.assertTrue(output.startswith('translate(v=[lookup($t'), output)
+        self.assertTrue('rotate(a=lookup($t, [[0.00000, 0.00000], [1.00000, 90.00000]]),v=[1, 0, 0])' in output)
+        self.assertEqual(animation.get_keyframes([obj, 'x();']), [slide, swing])
+
+    def test_expression(self):
+        """Verify keyframes are formatted and combined as expressions."""
+        kf = animation.Keyframes([(0.0, 0.0), (1.0, 10.0)])
+        lookup = 'lookup($t, [[0.00000, 0.00000], [1.00000, 10.00000]])'
+        self.assertEqual(val_to_str([0,0,kf]), '[0.00000, 0.00000, {0}]'.format(lookup))
+        self.assertEqual(str(Translate(Cube(size=[1,1,1]), v=[0,0,kf])).split('\n')[0],
+                         'translate(v=[0.00000, 0.00000, {0}]) {{'.format(lookup))
+        offset = neg_expr(add_expr(kf, 5))
+        self.assertEqual(str(offset), '-({0} + 5.00000)'.format(lookup))
+        self.assertEqual(offset.evaluate({'$t': 0.5}), -10.0)
+        self.assertRaises(ValueError, kf.evaluate, {})
+        obj = Translate(Cube(size=[1,1,1]), v=[0,0,offset])
+        self.assertEqual(animation.get_keyframes(obj), [kf])
+
+class Test_Export_Frames(unittest.TestCase):
+    """Test exporting animation frames with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        fake = make_fake_openscad(self.tmpdir)
+        self.log = os.path.join(self.tmpdir, 'runs.log')
+        self.openscad = os.path.join(self.tmpdir, 'logged_openscad')
+        with open(self.openscad, 'w') as fid:
+            fid.write('#!/bin/sh\necho "$@" >> "{0}"\nexec "{1}" "$@"\n'.format(self.log, fake))
+        os.chmod(self.openscad, os.stat(self.openscad).st_mode | stat.S_IEXEC)
+        self.outdir = os.path.join(self.tmpdir, 'frames')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def num_runs(self):
+        if not os.path.exists(self.log):
+            return 0
+        with open(self.log) as fid:
+            num = len(fid.readlines())
+        os.remove(self.log)
+        return num
+
+    def export(self, prog):
+        return animation.export_frames(prog, 4, self.outdir, ext='.stl',
+                                       openscad=self.openscad, max_workers=2)
+
+    def make_prog(self, end=10.0):
+        # Held for the first three frames, then moving
+        slide = animation.Keyframes([(0.0, [0,0,0]), (0.5, [0,0,0]), (1.0, [0,0,2*end])])
+        prog = SCAD_Prog()
+        prog.add(AnimTranslate(Cube(size=[1,1,1]), v=slide))
+        return prog
+
+    def test_export(self):
+        """Verify held frames are copied and unchanged frames are cached."""
+        frames = self.export(self.make_prog())
+        self.assertEqual([frame.t for frame in frames], [0.0, 0.25, 0.5, 0.75])
+        self.assertEqual([frame.source for frame in frames], ['render', 'copy', 'copy', 'render'])
+        self.assertTrue(all(frame.ok() for frame in frames))
+        self.assertEqual(self.num_runs(), 2)
+        names = sorted(name for name in os.listdir(self.outdir) if not name.startswith('.'))
+        self.assertEqual(names, ['frame_{0:04d}.stl'.format(i) for i in range(4)])
+        # Nothing changed
+        frames = self.export(self.make_prog())
+        self.assertEqual([frame.source for frame in frames], ['cache']*4)
+        self.assertEqual(self.num_runs(), 0)
+        # Only the last frame changed
+        frames = self.export(self.make_prog(end=20.0))
+        self.assertEqual([frame.source for frame in frames], ['cache']*3 + ['render'])
+        self.assertEqual(self.num_runs(), 1)
+
+    def test_expression_keyframes(self):
+        """Verify keyframes inside expressions are found so held frames are copied."""
+        slide = animation.Keyframes([(0.0, 0.0), (0.5, 0.0), (1.0, 10.0)])
+        prog = SCAD_Prog()
+        prog.add(Translate(Cube(size=[1,1,1]), v=[0,0,neg_expr(add_expr(slide, 5))]))
+        frames = self.export(prog)
+        self.assertEqual([frame.source for frame in frames], ['render', 'copy', 'copy', 'render'])
+        self.assertEqual(self.num_runs(), 2)
+
+    def test_free_t(self):
+        """Verify programs using $t directly render every frame."""
+        prog = SCAD_Prog()
+        prog.add(AnimRotate(Cube(size=[1,1,1]), a='360*$t', v=[0,0,1]))
+        frames = self.export(prog)
+        self.assertEqual([frame.source for frame in frames], ['render']*4)
+        self.assertEqual(self.num_runs(), 4)
+
+    def test_defines(self):
+        """Verify $t is passed on the command line."""
+        self.export(self.make_prog())
+        with open(self.log) as fid:
+            text = fid.read()
+        self.assertTrue('-D $t=0.0 ' in text and '-D $t=0.75 ' in text, text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,10 +13,11 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import unittest, sys, re
+import unittest, sys, re, math, threading
 from py2scad.base import *
 from py2scad.transforms import Translate
 from py2scad.primitives import Cube, Cylinder
+from py2scad import lod
 
 class Test_SCAD_Prog(unittest.TestCase):
     """Test the program object."""
@@ -49,6 +50,64 @@ class Test_SCAD_Prog(unittest.TestCase):
                       "Missing entity definition!")
         # Maybe this could use regex to match: command, paren, args, paren, semicolon?
 
+    def test_global_facets(self):
+        """Verify fractional global facet settings are not truncated."""
+        prog = SCAD_Prog(fn=20, fa=0.5, fs=0.25)
+        output = str(prog)
+        self.assertTrue('$fn = 20;' in output, "Bad $fn: {0}".format(output))
+        self.assertTrue('$fa = 0.50000;' in output, "Bad $fa: {0}".format(output))
+        self.assertTrue('$fs = 0.25000;' in output, "Bad $fs: {0}".format(output))
+
+    def test_lod(self):
+        """Verify the level of detail policy sets facets from feature size."""
+        small = Cylinder(h=5, r1=1.5, r2=1.5)
+        large = Cylinder(h=5, r1=50)
+        hexagon = Cylinder(h=5, r1=1, fn=6)
+        self.prog.add([small, large, hexagon])
+        self.prog.lod = lod.PREVIEW
+        preview = str(self.prog)
+        self.prog.lod = lod.FINAL
+        final = str(self.prog)
+        fns = lambda text: [int(x) for x in re.findall(r'\$fn=(\d+)', text)]
+        self.assertEqual(fns(preview)[2], 6, "Explicit $fn was overridden!")
+        self.assertEqual(fns(final)[2], 6, "Explicit $fn was overridden!")
+        self.assertTrue(fns(preview)[0] < fns(final)[0] < fns(final)[1],
+                        "Unexpected facets: {0} {1}".format(fns(preview), fns(final)))
+        self.assertTrue(max(fns(preview)) <= lod.PREVIEW.max_fn, "Preview facets not clamped!")
+        self.assertEqual(str(large), 'cylinder(h=5.00000,r=50.00000,center=true);',
+                         "Policy applied outside of program output!")
+
+    def test_lod_threads(self):
+        """Verify the policy of a program being written does not leak into other threads."""
+        started = threading.Event()
+        resume = threading.Event()
+        class Blocker(SCAD_Object):
+            def cmd_str(self, tab_level=0):
+                started.set()
+                resume.wait(5)
+                return ''
+        prog = SCAD_Prog(lod=lod.FINAL)
+        prog.add(Blocker())
+        writer = threading.Thread(target=str, args=(prog,))
+        writer.start()
+        try:
+            started.wait(5)
+            self.assertEqual(str(Cylinder(h=5, r1=50)), 'cylinder(h=5.00000,r=50.00000,center=true);',
+                             "Policy leaked into another thread!")
+        finally:
+            resume.set()
+            writer.join()
+
+    def test_lod_tolerance(self):
+        """Verify fragments keep the facet deviation within tolerance."""
+        policy = lod.LOD_Policy(tolerance=0.01, min_fn=3, max_fn=1000)
+        for r in (0.5, 3.0, 20.0):
+            fn = policy.get_fn(r)
+            deviation = r*(1 - math.cos(math.pi/fn))
+            self.assertTrue(deviation <= 0.01, "r={0} fn={1}".format(r, fn))
+            deviation = r*(1 - math.cos(math.pi/(fn - 1)))
+            self.assertTrue(deviation > 0.01, "Too many fragments, r={0} fn={1}".format(r, fn))
+
 
 class Test_SCAD_Object(unittest.TestCase):
     """Test the object base class."""
@@ -0,0 +1,344 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Benchmarks for code generation, the stl mesh tools and the highlevel builders.
+
+Each benchmark is run in a separate process with the part cache disabled,
+the best of several timings is recorded along with the peak memory increase
+over the memory in use before the timed runs. The peak is measured by
+resetting the high water mark of the process, which needs linux; elsewhere
+peak_kb is None. The results are saved as json so that they can be compared
+between commits.
+
+Usage:
+
+    python benchmark.py -o results.json           # run all benchmarks
+    python benchmark.py -k grid_box -o gb.json    # only names containing grid_box
+    python benchmark.py --compare old.json new.json
+"""
+import sys
+import os
+import json
+import time
+import timeit
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+try:
+    import resource
+except ImportError:
+    resource = None
+import numpy
+from py2scad import *
+from py2scad import stl_tools
+from py2scad import cache
+
+# Benchmark registry ---------------------------------------------------------
+
+BENCHMARKS = []
+
+def benchmark(name, **params):
+    """
+    Decorator registering a benchmark. The decorated function is called with
+    params and a work directory, it does any set up and returns the function
+    to be timed.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup, params))
+        return setup
+    return register
+
+def make_tree(depth, breadth):
+    """Create a synthetic tree of unions, translates and primitives."""
+    if depth == 0:
+        return Cube(size=[1,2,3])
+    child_list = []
+    for i in range(breadth):
+        child = make_tree(depth-1, breadth)
+        child_list.append(Translate(child, v=[i,0,0]))
+    return Union(child_list)
+
+def make_facet_list(num):
+    """Create a closed mesh with about num triangles as a list of facets."""
+    n = int(numpy.sqrt(0.5*num))
+    box = grid_box(10, 10, 1, n, n)
+    points = box.points.tolist()
+    facet_list = []
+    for face in box.faces[:,::-1].tolist():
+        vertices = [tuple(points[i]) for i in face]
+        facet_list.append(stl_tools.stl_facet(vertices, (0.0,0.0,0.0)))
+    return facet_list
+
+def enclosure_params():
+    """Parameters for a typical enclosure, see examples/basic_enclosure.py"""
+    x, y, z = 8*INCH2MM, 5.15*INCH2MM, 1.5*INCH2MM
+    hole_list = []
+    for hole_x in (-4.5, 4.5):
+        for hole_y in (-2, 0, 2):
+            hole = {
+                    'panel'     : 'bottom',
+                    'type'      : 'round',
+                    'location'  : (hole_x*INCH2MM, hole_y*INCH2MM),
+                    'size'      : 0.257*INCH2MM,
+                    }
+            hole_list.append(hole)
+    params = {
+            'inner_dimensions'        : (x,y,z),
+            'wall_thickness'          : (1.0/8.0)*INCH2MM,
+            'lid_radius'              : 0.25*INCH2MM,
+            'top_x_overhang'          : 0.2*INCH2MM,
+            'top_y_overhang'          : 0.2*INCH2MM,
+            'bottom_x_overhang'       : 0.75*INCH2MM,
+            'bottom_y_overhang'       : 0.2*INCH2MM,
+            'lid2front_tabs'          : (0.2,0.5,0.8),
+            'lid2side_tabs'           : (0.25, 0.75),
+            'side2side_tabs'          : (0.5,),
+            'lid2front_tab_width'     : 0.75*INCH2MM,
+            'lid2side_tab_width'      : 0.75*INCH2MM,
+            'side2side_tab_width'     : 0.5*INCH2MM,
+            'standoff_diameter'       : 0.25*INCH2MM,
+            'standoff_offset'         : 0.05*INCH2MM,
+            'standoff_hole_diameter'  : 0.116*INCH2MM,
+            'hole_list'               : hole_list,
+            }
+    return params
+
+# Code generation ------------------------------------------------------------
+
+for depth, breadth in ((3,4), (4,4), (5,4), (6,4), (100,1), (400,1)):
+    @benchmark('prog_str_d{0}_b{1}'.format(depth, breadth), depth=depth, breadth=breadth)
+    def prog_str(workdir, depth, breadth):
+        prog = SCAD_Prog(fn=20)
+        prog.add(make_tree(depth, breadth))
+        return lambda : str(prog)
+
+# Mesh tools -----------------------------------------------------------------
+
+for num in (10000, 50000):
+
+    @benchmark('write_stl_{0}'.format(num), num=num)
+    def write_stl(workdir, num):
+        facet_list = make_facet_list(num)
+        filename = os.path.join(workdir, 'mesh.stl')
+        return lambda : stl_tools.write_stl(filename, facet_list)
+
+    @benchmark('read_stl_{0}'.format(num), num=num)
+    def read_stl(workdir, num):
+        filename = os.path.join(workdir, 'mesh.stl')
+        stl_tools.write_stl(filename, make_facet_list(num))
+        return lambda : stl_tools.read_stl(filename)
+
+    @benchmark('rotate_facet_list_{0}'.format(num), num=num)
+    def rotate_facet_list(workdir, num):
+        facet_list = make_facet_list(num)
+        return lambda : stl_tools.rotate_facet_list(facet_list, (0,0,1), 0.5)
+
+    @benchmark('get_vertex_dict_{0}'.format(num), num=num)
+    def get_vertex_dict(workdir, num):
+        facet_list = make_facet_list(num)
+        return lambda : stl_tools.get_vertex_dict(facet_list)
+
+# Highlevel builders ---------------------------------------------------------
+
+for num in (100, 300):
+    @benchmark('grid_box_{0}'.format(num), num=num)
+    def grid_box_bench(workdir, num):
+        top_func = lambda x, y: 0.1*numpy.sin(x)*numpy.cos(y)
+        return lambda : str(grid_box(10, 10, 1, num, num, top_func=top_func))
+
+@benchmark('enclosure_make')
+def enclosure_make(workdir):
+    params = enclosure_params()
+    def run():
+        enclosure = Basic_Enclosure(params)
+        enclosure.make()
+        # The panels are built lazily
+        for name in enclosure.PANEL_NAMES:
+            getattr(enclosure, name)
+        return enclosure
+    return run
+
+@benchmark('enclosure_assembly_str')
+def enclosure_assembly(workdir):
+    params = enclosure_params()
+    def run():
+        enclosure = Basic_Enclosure(params)
+        enclosure.make()
+        prog = SCAD_Prog(fn=50)
+        prog.add(enclosure.get_assembly(explode=(5,5,5)))
+        return str(prog)
+    return run
+
+@benchmark('enclosure_projection_str')
+def enclosure_projection(workdir):
+    params = enclosure_params()
+    def run():
+        enclosure = Basic_Enclosure(params)
+        enclosure.make()
+        prog = SCAD_Prog(fn=50)
+        prog.add(enclosure.get_projection())
+        return str(prog)
+    return run
+
+# Running --------------------------------------------------------------------
+
+def proc_status_kb(field):
+    """Returns a memory field, e.g. VmRSS, of /proc/self/status in kB."""
+    with open('/proc/self/status') as fid:
+        for line in fid:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise IOError, 'no {0} in /proc/self/status'.format(field)
+
+def reset_peak_memory():
+    """
+    Reset the peak resident memory of this process to the current, returns
+    the current resident memory in kB or None if the peak can not be reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as fid:
+            fid.write('5')
+        return proc_status_kb('VmRSS')
+    except (IOError, ValueError):
+        return None
+
+def peak_memory_kb():
+    """Returns the peak resident memory of this process since the last reset in kB."""
+    try:
+        return proc_status_kb('VmHWM')
+    except (IOError, ValueError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024  # bytes on osx
+    return peak
+
+def run_benchmark(setup, params, repeat, queue):
+    """Run a single benchmark, in a child process, and put the result on queue."""
+    workdir = tempfile.mkdtemp()
+    # Time the builders, not cache hits
+    cache.set_part_cache(None)
+    try:
+        func = setup(workdir, **params)
+        mem_start = reset_peak_memory()
+        times = []
+        for i in range(repeat):
+            t0 = timeit.default_timer()
+            func()
+            times.append(timeit.default_timer() - t0)
+        peak_kb = None
+        if mem_start is not None:
+            peak_kb = peak_memory_kb() - mem_start
+        result = {
+                'time'      : min(times),
+                'times'     : times,
+                'peak_kb'   : peak_kb,
+                'params'    : params,
+                }
+    except Exception, err:
+        result = {'error': repr(err), 'params': params}
+    finally:
+        shutil.rmtree(workdir)
+    queue.put(result)
+
+def get_meta():
+    """Information identifying the environment and commit of a run."""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    meta = {
+            'python'   : platform.python_version(),
+            'platform' : platform.platform(),
+            'numpy'    : numpy.__version__,
+            'commit'   : commit,
+            'date'     : time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+    return meta
+
+def run_all(name_filter='', repeat=3, verbose=True):
+    """Run all benchmarks whose name contains name_filter."""
+    results = {}
+    for name, setup, params in BENCHMARKS:
+        if not name_filter in name:
+            continue
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run_benchmark,
+                                       args=(setup, params, repeat, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        results[name] = result
+        if verbose:
+            if 'error' in result:
+                print '{0:<32} error: {1}'.format(name, result['error'])
+            else:
+                peak = result['peak_kb']
+                peak = '-' if peak is None else str(peak)
+                print '{0:<32} {1:10.4f} s {2:>10} kB'.format(name, result['time'], peak)
+    return {'meta': get_meta(), 'results': results}
+
+def compare(old, new, threshold=0.1):
+    """
+    Compare two sets of results, printing the time ratio (new/old) for each
+    benchmark. Returns the names of benchmarks slower by more than threshold.
+    """
+    regressions = []
+    print '{0:<32} {1:>10} {2:>10} {3:>8}'.format('name', 'old (s)', 'new (s)', 'ratio')
+    for name in sorted(new['results']):
+        new_result = new['results'][name]
+        old_result = old['results'].get(name, {})
+        if not ('time' in new_result and 'time' in old_result):
+            continue
+        ratio = new_result['time']/max(old_result['time'], 1.0e-9)
+        flag = ''
+        if ratio > 1.0 + threshold:
+            flag = ' <--'
+            regressions.append(name)
+        print '{0:<32} {1:10.4f} {2:10.4f} {3:8.2f}{4}'.format(name, old_result['time'],
+                                                              new_result['time'], ratio, flag)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='py2scad benchmarks')
+    parser.add_argument('-o', '--output', help='json file for the results')
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks containing this string')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timing repeats per benchmark')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slow down reported as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as fid:
+            old = json.load(fid)
+        with open(args.compare[1]) as fid:
+            new = json.load(fid)
+        regressions = compare(old, new, threshold=args.threshold)
+        return 1 if regressions else 0
+
+    results = run_all(name_filter=args.filter, repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as fid:
+            json.dump(results, fid, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from py2scad import cache
+from py2scad.highlevel import Plate_W_Tabs, RT_Triangle_W_Tabs, Basic_Enclosure, rounded_box
+from py2scad.expression import Var
+from profile2d_test import enclosure_params
+
+def plate_params(x=40):
+    return {
+            'size' : (x, 20, 3),
+            'xz+'  : [(0.5, 10, 3, '+')],
+            'xz-'  : [],
+            'yz+'  : [(0.5, 6, 3, '-')],
+            'yz-'  : [],
+            }
+
+class Test_Part_Cache(unittest.TestCase):
+    """Test the part cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lru(self):
+        """Verify the least recently used parts are evicted."""
+        part_cache = cache.Part_Cache(max_size=2)
+        for name in ('a', 'b'):
+            part_cache.get_part('part', {'name': name}, lambda: [name])
+        part_cache.get_part('part', {'name': 'a'}, list)
+        part_cache.get_part('part', {'name': 'c'}, lambda: ['c'])
+        self.assertEqual(len(part_cache), 2)
+        self.assertEqual((part_cache.hits, part_cache.misses), (1, 3))
+        self.assertEqual(part_cache.get_part('part', {'name': 'a'}, list), ['a'])
+        self.assertEqual(part_cache.get_part('part', {'name': 'b'}, list), [])
+
+    def test_source_key(self):
+        """Verify keys depend on the py2scad sources."""
+        part_cache = cache.Part_Cache()
+        key = part_cache.key('plate', {'size': 1})
+        saved = cache._source_hash
+        try:
+            cache._source_hash = 'other version'
+            self.assertNotEqual(part_cache.key('plate', {'size': 1}), key)
+        finally:
+            cache._source_hash = saved
+
+    def test_keys(self):
+        """Verify equal parameters give equal keys whatever their types."""
+        part_cache = cache.Part_Cache()
+        key = part_cache.key('plate', {'size': (1, 2, 3), 'tabs': numpy.array([0.5])})
+        self.assertEqual(key, part_cache.key('plate', {'tabs': [0.5], 'size': [1.0, 2.0, 3.0]}))
+        self.assertNotEqual(key, part_cache.key('box', {'size': (1, 2, 3), 'tabs': [0.5]}))
+        key = cache.memory_key({'size': (1, 2, 3), 'tabs': numpy.array([0.5]), 'x': Var('x')})
+        self.assertEqual(key, cache.memory_key({'x': Var('x'), 'tabs': [0.5], 'size': [1.0, 2.0, 3.0]}))
+        self.assertNotEqual(key, cache.memory_key({'x': 'x', 'tabs': [0.5], 'size': [1.0, 2.0, 3.0]}))
+
+    def test_disk(self):
+        """Verify parts persist in the cache directory."""
+        part_cache = cache.Part_Cache(directory=self.tmpdir)
+        plate = part_cache.get_part('plate', plate_params(), Plate_W_Tabs(plate_params()).make)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+        other = cache.Part_Cache(directory=self.tmpdir)
+        loaded = other.get_part('plate', plate_params(), list)
+        self.assertEqual(str(loaded), str(plate))
+        self.assertEqual(other.hits, 1)
+        # Corrupt pickles are rebuilt
+        filename = os.path.join(self.tmpdir, os.listdir(self.tmpdir)[0])
+        with open(filename, 'wb') as fid:
+            fid.write('junk')
+        self.assertEqual(cache.Part_Cache(directory=self.tmpdir).get_part('plate', plate_params(), list), [])
+        other.clear(disk=True)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+class Test_Cached_Builders(unittest.TestCase):
+    """Test the builders reuse parts through the cache."""
+
+    def setUp(self):
+        self.saved = cache.get_part_cache()
+        cache.set_part_cache(cache.Part_Cache())
+
+    def tearDown(self):
+        cache.set_part_cache(self.saved)
+
+    def test_off_by_default(self):
+        """Verify caching is opt in."""
+        cache.set_part_cache(self.saved)
+        self.assertEqual(cache.get_part_cache(), None)
+
+    def test_plates(self):
+        """Verify plates with the same parameters come from the cache."""
+        part_cache = cache.get_part_cache()
+        plate = Plate_W_Tabs(plate_params()).make()
+        self.assertEqual(str(Plate_W_Tabs(plate_params()).make()), str(plate))
+        Plate_W_Tabs(plate_params(x=50)).make()
+        params = {'size': (30, 40, 3), 'xz': [(0.5, 6, 3, '+')], 'yz': [], 'hz': []}
+        triangle = RT_Triangle_W_Tabs(params).make()
+        self.assertEqual(str(RT_Triangle_W_Tabs(dict(params)).make()), str(triangle))
+        self.assertEqual((part_cache.hits, part_cache.misses), (2, 3))
+
+    def test_shells(self):
+        """Verify callers own the top node of a part and share its subtree."""
+        plate = Plate_W_Tabs(plate_params()).make()
+        plate.mod = '%'
+        other = Plate_W_Tabs(plate_params()).make()
+        self.assertFalse(other is plate)
+        self.assertEqual(other.mod, '')
+        self.assertTrue(other.obj[0] is plate.obj[0])
+        other.obj.append(rounded_box(1, 1, 1, 0.1))
+        self.assertEqual(len(Plate_W_Tabs(plate_params()).make().obj), len(plate.obj))
+
+    def test_rounded_box(self):
+        """Verify rounded boxes are keyed by all of their arguments."""
+        part_cache = cache.get_part_cache()
+        rounded_box(10, 8, 2, 1, round_z=False, hull=True)
+        rounded_box(10.0, 8, 2, radius=1, round_z=False, hull=True)
+        self.assertEqual((part_cache.hits, part_cache.misses), (1, 1))
+        rounded_box(10, 8, 2, 1, round_z=False)
+        self.assertEqual(part_cache.misses, 2)
+        rounded_box(Var('x'), 8, 2, 1)
+        rounded_box(Var('x'), 8, 2, 1)
+        self.assertEqual(part_cache.hits, 2)
+        self.assertTrue('y - 2.00000' in str(rounded_box(Var('y'), 8, 2, 1)))
+
+    def test_enclosure(self):
+        """Verify enclosures share plates through the cache."""
+        for i in range(2):
+            enclosure = Basic_Enclosure(enclosure_params())
+            enclosure.make()
+            enclosure.front, enclosure.left
+        self.assertEqual(cache.get_part_cache().hits, 2)
+        self.assertEqual(cache.get_part_cache().misses, 2)
+
+    def test_disabled(self):
+        """Verify parts are rebuilt with caching disabled."""
+        cache.set_part_cache(None)
+        Plate_W_Tabs(plate_params()).make()
+        self.assertEqual(cache.get_part_cache(), None)
+
+if __name__ == '__main__':
+    unittest.main()
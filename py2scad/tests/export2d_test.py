@@ -0,0 +1,154 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+import StringIO
+from xml.dom import minidom
+import numpy
+from py2scad import export2d
+from py2scad import profile2d
+from py2scad import render
+from py2scad.primitives import Square, Circle, Polygon, Cube
+from py2scad.transforms import Translate, Rotate, Mirror, Difference, Union, PointArray
+from py2scad.highlevel import Basic_Enclosure
+from profile2d_test import enclosure_params
+
+class Test_Geometry(unittest.TestCase):
+    """Test conversion of scad trees to flat geometry."""
+
+    def test_transforms(self):
+        """Verify 2D transforms are applied."""
+        obj = Translate(Rotate(Square([10,20]), a=90, v=[0,0,1]), v=[5,0,0])
+        geometry = export2d.get_geometry(obj)
+        numpy.testing.assert_allclose(geometry.bounds(), (-5, -5, 15, 5), atol=1e-9)
+
+    def test_flip(self):
+        """Verify rotations about x flip the part over."""
+        obj = Rotate(Square([10,20], center=False), a=180, v=[1,0,0])
+        numpy.testing.assert_allclose(export2d.get_geometry(obj).bounds(), (0, -20, 10, 0), atol=1e-9)
+        obj = Mirror(Translate(Circle(r=2), v=[3,0,0]), v=[1,0,0])
+        self.assertEqual(export2d.get_geometry(obj).circles, [(-3.0, 0.0, 2.0)])
+
+    def test_holes(self):
+        """Verify differences, polygons with paths and arrays."""
+        points = [(0,0), (10,0), (10,10), (0,10), (2,2), (4,2), (4,4)]
+        obj = Difference([Polygon(points, [[0,1,2,3], [4,5,6]]),
+                          PointArray(Circle(r=1), [(6,6), (8,8)])])
+        geometry = export2d.get_geometry(obj)
+        self.assertEqual(len(geometry.paths), 2)
+        self.assertEqual(len(geometry.circles), 2)
+
+    def test_union(self):
+        """Verify union members must not overlap."""
+        disjoint = Union([Square([2,2]), Translate(Circle(r=1), v=[5,0,0])])
+        self.assertEqual(len(list(export2d.iter_shapes(disjoint))), 2)
+        overlapping = Union([Square([2,2]), Translate(Circle(r=1), v=[1.5,0,0])])
+        self.assertRaises(ValueError, export2d.get_geometry, overlapping)
+        inside = Union([Square([10,10]), Circle(r=1)])
+        self.assertRaises(ValueError, export2d.get_geometry, inside)
+        touching = Union([Square([2,2], center=False), Square([2,2], center=False)])
+        self.assertRaises(ValueError, export2d.get_geometry, Translate(touching, v=[1,0,0]))
+        # Children of transforms are an implicit union
+        self.assertRaises(ValueError, export2d.get_geometry, Translate([Square([10,10]), Circle(r=1)], v=[1,0,0]))
+        # Separate parts are not checked
+        self.assertEqual(len(export2d.get_geometry([Square([10,10]), Circle(r=1)]).paths), 1)
+
+    def test_difference(self):
+        """Verify difference cutters must lie inside the outline and not overlap."""
+        points = [(0,0), (10,0), (10,10), (0,10), (2,2), (4,2), (4,4)]
+        outline = Polygon(points, [[0,1,2,3], [4,5,6]])
+        self.assertRaises(ValueError, export2d.get_geometry,
+                          Difference([outline, Translate(Circle(r=1), v=[9.5,5,0])]))
+        self.assertRaises(ValueError, export2d.get_geometry,
+                          Difference([outline, Translate(Circle(r=1), v=[3,3,0])]))
+        self.assertRaises(ValueError, export2d.get_geometry,
+                          Difference([outline, Translate(Square([4,4]), v=[3,3,0])]))
+        self.assertRaises(ValueError, export2d.get_geometry,
+                          Difference([outline, Translate(Circle(r=1), v=[7,7,0]),
+                                      Translate(Circle(r=1), v=[7.5,7,0])]))
+        self.assertRaises(ValueError, export2d.get_geometry,
+                          Difference([Square([2,2]), Translate(Square([2,2]), v=[5,0,0])]))
+        inside = Difference([outline, Translate(Circle(r=1), v=[7,7,0]), Translate(Square([1,1]), v=[7,3,0])])
+        geometry = export2d.get_geometry(inside)
+        self.assertEqual((len(geometry.paths), len(geometry.circles)), (3, 1))
+
+    def test_contains_warnings(self):
+        """Verify regions with horizontal edges are checked without warnings."""
+        region = export2d._Region([('path', profile2d.rect_points(10, 10))])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertTrue(region.contains_point((1.0, 0.0)))
+            self.assertFalse(region.contains_point((1.0, -6.0)))
+
+    def test_not_flat(self):
+        """Verify 3D objects and rotations out of the plane are rejected."""
+        self.assertRaises(ValueError, export2d.get_geometry, Cube())
+        self.assertRaises(ValueError, export2d.get_geometry, Rotate(Square(), a=90, v=[1,0,0]))
+
+class Test_Writers(unittest.TestCase):
+    """Test the DXF and SVG writers."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.profile = profile2d.Profile(profile2d.rect_points(10, 6))
+        self.profile.add_hole(profile2d.rect_points(2, 2))
+        self.profile.add_circles([(3, 0, 1)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_dxf(self):
+        """Verify paths are polylines and circles are true circles."""
+        filename = os.path.join(self.tmpdir, 'part.dxf')
+        export2d.write_dxf(filename, self.profile, layer='cut')
+        with open(filename) as fid:
+            lines = [line.strip() for line in fid.readlines()]
+        self.assertEqual(lines.count('POLYLINE'), 2)
+        self.assertEqual(lines.count('VERTEX'), 8)
+        self.assertEqual(lines.count('CIRCLE'), 1)
+        self.assertEqual(lines[lines.index('CIRCLE') + 8], '1.000000')
+        self.assertEqual(lines[-1], 'EOF')
+        self.assertEqual(render.count_facets(filename), 3)
+
+    def test_svg(self):
+        """Verify the svg paths and circles."""
+        output = StringIO.StringIO()
+        export2d.write_svg(output, [self.profile, Translate(Circle(r=2), v=[20,0,0])])
+        doc = minidom.parseString(output.getvalue())
+        self.assertEqual(len(doc.getElementsByTagName('path')), 2)
+        circles = doc.getElementsByTagName('circle')
+        self.assertEqual(len(circles), 2)
+        self.assertEqual(circles[1].getAttribute('cx'), '20.000000')
+        svg = doc.getElementsByTagName('svg')[0]
+        self.assertEqual(svg.getAttribute('viewBox'), '0 0 29.000000 8.000000')
+
+    def test_failed_write(self):
+        """Verify a dxf file which could not be completed is removed."""
+        filename = os.path.join(self.tmpdir, 'part.dxf')
+        self.assertRaises(ValueError, export2d.write_dxf, filename, [self.profile, Cube()])
+        self.assertFalse(os.path.exists(filename))
+
+    def test_enclosure(self):
+        """Verify enclosure profiles are written."""
+        enclosure = Basic_Enclosure(enclosure_params())
+        enclosure.make()
+        filename = os.path.join(self.tmpdir, 'enclosure.dxf')
+        export2d.write_dxf(filename, enclosure.get_profiles().values())
+        # 6 outlines, 20 tab slots, 1 square hole, 8 standoff and 2 round holes
+        self.assertEqual(render.count_facets(filename), 6 + 20 + 1 + 8 + 2)
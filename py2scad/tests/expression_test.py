@@ -0,0 +1,133 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import unittest
+import numpy
+from py2scad import utility
+from py2scad.expression import Var, BinOp, Call
+from py2scad.primitives import Variables, Cube
+from py2scad.highlevel import rounded_box, hole_cutters, Basic_Enclosure
+from profile2d_test import enclosure_params
+
+class Test_Expressions(unittest.TestCase):
+    """Test building and writing expressions."""
+
+    def setUp(self):
+        self.width = Var('width')
+        self.height = Var('height')
+
+    def test_precedence(self):
+        """Verify parentheses are only written where needed."""
+        w, h = self.width, self.height
+        self.assertEqual(str(2*w - 1), '2.00000 * width - 1.00000')
+        self.assertEqual(str((w + h)/2), '(width + height) / 2.00000')
+        self.assertEqual(str(w - (h - 1)), 'width - (height - 1.00000)')
+        self.assertEqual(str(w/(h*2)), 'width / (height * 2.00000)')
+        self.assertEqual(str(-(w + h)), '-(width + height)')
+        self.assertEqual(str(w*-2), 'width * (-2.00000)')
+        self.assertEqual(str(Call('sqrt', w*w + 1)), 'sqrt(width * width + 1.00000)')
+
+    def test_identities(self):
+        """Verify operations with no effect are dropped."""
+        w = self.width
+        self.assertTrue(w + 0 is w and 1*w is w and w/1 is w)
+        self.assertEqual(str(0 - w), '-width')
+        self.assertEqual(str(-1*w), '-width')
+
+    def test_numpy_scalars(self):
+        """Verify numpy scalars combine with expressions."""
+        self.assertEqual(str(numpy.float64(0.5)*self.width), '0.50000 * width')
+        self.assertRaises(TypeError, lambda: numpy.arange(3)*self.width)
+
+    def test_strings(self):
+        """Verify variable references still work as strings."""
+        w = self.width
+        self.assertEqual('2+' + w, '2+width')
+        self.assertEqual(w + '/2', 'width/2')
+        self.assertEqual('({0}/2)-{1}'.format(w, self.height), '(width/2)-height')
+        self.assertEqual(w, 'width')
+        self.assertEqual(str(w*'$t'), 'width * ($t)')
+
+    def test_compare(self):
+        """Verify expressions can not be ordered in python."""
+        for expr in (self.width, self.width + 1, -self.width, Call('sqrt', self.width)):
+            self.assertRaises(TypeError, lambda : expr < 1)
+            self.assertRaises(TypeError, lambda : expr <= 1)
+            self.assertRaises(TypeError, lambda : expr > 1)
+            self.assertRaises(TypeError, lambda : expr >= 1)
+            self.assertRaises(TypeError, lambda : 1 < expr)
+        self.assertRaises(TypeError, lambda : self.width < self.height)
+        self.assertRaises(TypeError, max, self.width, 1.0)
+        self.assertTrue(self.width == 'width')
+
+    def test_evaluate(self):
+        """Verify numeric evaluation, including variables defined by expressions."""
+        w, h = self.width, self.height
+        env = {'width': 4.0, 'height': w/2}
+        self.assertAlmostEqual((w*h - 1).evaluate(env), 7.0)
+        self.assertAlmostEqual(Call('cos', w*15).evaluate(env), 0.5)
+        self.assertEqual((w + h).variables(), set(['width', 'height']))
+        self.assertRaises(ValueError, (w + Var('depth')).evaluate, env)
+
+    def test_val_to_str(self):
+        """Verify val_to_str writes expressions and vectors of them."""
+        self.assertEqual(utility.val_to_str(self.width*2), 'width * 2.00000')
+        self.assertEqual(utility.val_to_str([self.width, 1, 'a']), '[width, 1.00000, a]')
+        self.assertEqual(utility.as_number(self.width), None)
+        self.assertEqual(str(utility.add_expr(self.width, 2.0, -2.0)), 'width')
+        self.assertEqual(utility.add_expr(self.width, '$t'), 'width + ($t)')
+
+class Test_Symbolic_Builders(unittest.TestCase):
+    """Test the builders with symbolic dimensions."""
+
+    def test_variables(self):
+        """Verify Variables attributes are expression references."""
+        v = Variables(width=50.0, height=25.0)
+        output = str(Cube(size=[v.width, v.height, 2*v.height]))
+        self.assertEqual(output, 'cube(size=[width, height, 2.00000 * height], center=true);')
+
+    def test_rounded_box(self):
+        """Verify a rounded box with symbolic sizes."""
+        output = str(rounded_box(Var('x'), Var('y'), 3, 1, round_z=False, hull=True))
+        self.assertTrue('translate(v=[0.50000 * (x - 2.00000), 0.50000 * (y - 2.00000), 0.00000])' in output, output)
+
+    def test_hole_locations(self):
+        """Verify symbolic hole locations."""
+        hole = {'type': 'round', 'size': 2.0, 'location': (Var('x'), 5.0)}
+        output = str(hole_cutters(hole, 3.0)[0])
+        self.assertTrue(output.startswith('translate(v=[x, 5.00000, 0.00000])'), output)
+        hole['location'] = [(Var('x'), 5.0), (Var('y'), 5.0)]
+        self.assertEqual(len(hole_cutters(hole, 3.0)), 1)
+        hole['location'] = []
+        self.assertEqual(hole_cutters(hole, 3.0), [])
+        hole['location'] = Var('x')
+        self.assertRaises(ValueError, hole_cutters, hole, 3.0)
+        hole['location'] = [Var('x')]
+        self.assertRaises(ValueError, hole_cutters, hole, 3.0)
+
+    def test_enclosure(self):
+        """Verify an enclosure with symbolic dimensions."""
+        params = enclosure_params()
+        params['inner_dimensions'] = (Var('inner_x'), Var('inner_y'), Var('inner_z'))
+        params['wall_thickness'] = Var('wall')
+        enclosure = Basic_Enclosure(params)
+        enclosure.make()
+        output = '\n'.join(str(part) for part in enclosure.get_assembly())
+        self.assertTrue('cylinder(h=inner_z,r1=3.00000,r2=3.00000,center=true);' in output)
+        self.assertTrue('translate(v=[0.00000, 0.00000, 0.50000 * inner_z + 0.50000 * wall])' in output)
+        self.assertFalse('nan' in output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Stand in for the openscad executable used to test rendering without openscad.
+
+Accepts "-o outfile [-D name=value ...] scadfile". Writes an ascii stl with
+twelve facets per cube in the program, or a dxf with four lines per square.
+Programs calling modules as "translate(v=[x, y, z]) name();" get the facets
+of the cubes in each module body placed at x, y (as batched renders do).
+Lines of the form "// fake_openscad: sleep=0.5" or "// fake_openscad: fail"
+in the program make it sleep before writing or exit with an error, and
+"// fake_openscad: offset=60" moves the facets of a module along x.
+"""
+import re
+import sys
+import time
+
+def main(argv):
+    outfile = argv[argv.index('-o') + 1]
+    scadfile = argv[-1]
+    with open(scadfile) as fid:
+        text = fid.read()
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('// fake_openscad:'):
+            option = line.split(':', 1)[1].strip()
+            if option == 'fail':
+                sys.stderr.write('ERROR: fake failure\n')
+                return 1
+            if option.startswith('sleep='):
+                time.sleep(float(option.split('=')[1]))
+    with open(outfile, 'w') as fid:
+        if outfile.endswith('.dxf'):
+            for i in range(4*text.count('square(')):
+                fid.write('  0\nLINE\n')
+            fid.write('  0\nEOF\n')
+        else:
+            modules = dict(re.findall(r'module (\w+)\(\) \{(.*?)\n\}', text, re.DOTALL))
+            calls = re.findall(r'translate\(v=\[([^\]]*)\]\) (\w+)\(\);', text)
+            calls = [(pos, name) for pos, name in calls if name in modules]
+            if not calls:
+                calls = [('0, 0, 0', None)]
+            fid.write('solid fake\n')
+            for pos, name in calls:
+                x, y = [float(val) for val in pos.split(',')[:2]]
+                body = modules[name] if name else text
+                offset = re.search(r'// fake_openscad: offset=(\S+)', body)
+                if offset:
+                    x += float(offset.group(1))
+                for i in range(12*body.count('cube(')):
+                    fid.write(' facet normal 0 0 1\n  outer loop\n')
+                    for j in range(3):
+                        fid.write('   vertex {0} {1} 0\n'.format(x + 0.1*i, y + 0.1*j))
+                    fid.write('  endloop\n endfacet\n')
+            fid.write('endsolid fake\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,241 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import unittest
+import math
+import numpy
+from py2scad.primitives import Cube
+from py2scad.highlevel import rounded_box, cut_holes, plate_w_holes, grid_box
+from py2scad.highlevel import stl_to_polyhedron
+from py2scad.highlevel import Basic_Enclosure, Right_Angle_Bracket
+from py2scad.animation import Keyframes
+from stl_tools_test import tetrahedron
+from profile2d_test import enclosure_params
+
+class Test_Rounded_Box(unittest.TestCase):
+    """Test the rounded box generator."""
+
+    def test_hull_spheres(self):
+        """Verify fully rounded hull box uses eight corner spheres."""
+        output = str(rounded_box(10, 8, 6, 1, hull=True))
+        self.assertTrue(output.startswith('hull()'),
+                        "Hull box is not a hull: {0}".format(output))
+        self.assertEqual(output.count('sphere'), 8,
+                         "Expected eight corner spheres!")
+        self.assertEqual(output.count('cylinder'), 0,
+                         "Unexpected cylinders in hull box!")
+
+    def test_hull_cylinders(self):
+        """Verify two axis rounded hull box uses four corner cylinders."""
+        for kwargs in ({'round_z': False}, {'round_y': False}, {'round_x': False}):
+            output = str(rounded_box(10, 8, 6, 1, hull=True, **kwargs))
+            self.assertEqual(output.count('cylinder'), 4,
+                             "Expected four corner cylinders for {0}".format(kwargs))
+            self.assertEqual(output.count('sphere'), 0,
+                             "Unexpected spheres for {0}".format(kwargs))
+
+    def test_hull_corner_positions(self):
+        """Verify corner cylinders are placed at the rounded corners."""
+        output = str(rounded_box(10, 8, 6, 1, round_z=False, hull=True))
+        self.assertTrue('[4.00000, 3.00000, 0.00000]' in output,
+                        "Corner cylinder misplaced: {0}".format(output))
+        self.assertTrue('h=6.00000' in output,
+                        "Corner cylinder has wrong height: {0}".format(output))
+
+class Test_Explode(unittest.TestCase):
+    """Test symbolic explode vectors of the assemblies."""
+
+    def test_enclosure(self):
+        """Verify explode expressions are written into the enclosure assembly."""
+        enclosure = Basic_Enclosure(enclosure_params())
+        enclosure.make()
+        output = '\n'.join(str(part) for part in enclosure.get_assembly(explode=(5,0,'20*$t')))
+        self.assertTrue('translate(v=[0.00000, 0.00000, 16.50000 + (20*$t)])' in output, output)
+        self.assertTrue('translate(v=[0.00000, 0.00000, -(16.50000 + (20*$t))])' in output, output)
+        self.assertTrue('translate(v=[-56.50000, 0.00000, 0.00000])' in output, output)
+        self.assertFalse('$t' in str(enclosure.get_assembly(explode=(5,5,5))[0]))
+
+    def test_bracket_keyframes(self):
+        """Verify keyframe explode vectors are written as lookups."""
+        tabs = [(0.5, 10.0, 5.0)]
+        support = {'depth': 50.0, 'height': 60.0, 'thickness': 5.0, 'face_tabs': tabs, 'base_tabs': tabs}
+        params = {
+                'base_width'     : 100.0,
+                'base_depth'     : 80.0,
+                'base_thickness' : 5.0,
+                'face_width'     : 100.0,
+                'face_height'    : 90.0,
+                'face_thickness' : 5.0,
+                'base2face_tabs' : tabs,
+                'base_tab_dir'   : '+',
+                'supports'       : [{'pos': 20.0, 'params': support}],
+                }
+        bracket = Right_Angle_Bracket(params)
+        bracket.make()
+        explode = Keyframes([(0.0, [0,0,0]), (1.0, [0,10,10])])
+        output = '\n'.join(str(part) for part in bracket.get_assembly(explode=explode))
+        self.assertEqual(output.count('lookup($t'), 3, output)
+        self.assertTrue('lookup($t, [[0.00000, 0.00000], [1.00000, 10.00000]]) + ' in output, output)
+
+class Test_Lazy_Enclosure(unittest.TestCase):
+    """Test the lazily built enclosure panels."""
+
+    def setUp(self):
+        self.enclosure = Basic_Enclosure(enclosure_params())
+        self.enclosure.make()
+
+    def test_lazy(self):
+        """Verify panels are only built when used, and only once."""
+        self.assertEqual(self.enclosure.built_panels(), [])
+        options = dict(('show_' + name, False) for name in Basic_Enclosure.PANEL_NAMES)
+        options['show_top'] = True
+        self.enclosure.get_assembly(**options)
+        self.assertEqual(self.enclosure.built_panels(), ['top'])
+        self.assertTrue(self.enclosure.top is self.enclosure.top)
+        self.enclosure.get_projection(exclude_list=['front', 'back', 'left', 'right'])
+        self.assertEqual(self.enclosure.built_panels(), ['top', 'bottom'])
+        self.assertRaises(AttributeError, getattr, self.enclosure, 'lid')
+
+    def test_shared_plates(self):
+        """Verify each pair of side panels is built once, without the part cache."""
+        enclosure = self.enclosure
+        self.assertEqual(str(enclosure.back), str(enclosure.front.obj[0]))
+        self.assertFalse(enclosure.front.obj[0] is enclosure.back)
+        self.assertTrue(enclosure.front.obj[0].obj[0] is enclosure.back.obj[0])
+        self.assertFalse(enclosure.left is enclosure.right)
+        self.assertTrue(enclosure.left.obj[0] is enclosure.right.obj[0])
+
+    def test_pending_holes(self):
+        """Verify all holes of a panel are cut with one difference when it is built."""
+        bottom = str(self.enclosure.bottom)
+        self.assertEqual(bottom.count('difference()'), 1, bottom)
+        # 4 corner cylinders, 10 tab slots, 4 standoff holes and a loop over
+        # the two holes of the hole list
+        self.assertEqual(bottom.count('cube('), 10)
+        self.assertEqual(bottom.count('cylinder('), 4 + 4 + 1)
+
+    def test_holes_after_build(self):
+        """Verify holes added to built panels are cut, and kept for rebuilding."""
+        front = self.enclosure.front
+        hole = {'panel': 'front', 'type': 'round', 'location': (10,5), 'size': 2.0}
+        self.enclosure.add_holes([hole])
+        self.assertFalse(self.enclosure.front is front)
+        self.assertEqual(str(self.enclosure.front).count('difference()'), 2)
+        self.enclosure.reset('front')
+        self.assertEqual(self.enclosure.built_panels(), [])
+        output = str(self.enclosure.front)
+        self.assertEqual(output.count('difference()'), 1, output)
+        self.assertEqual(output.count('cylinder('), 1)
+
+class Test_Holes(unittest.TestCase):
+    """Test the batched hole cutting."""
+
+    class Panels(object):
+        pass
+
+    def setUp(self):
+        self.panels = self.Panels()
+        self.panels.top = Cube(size=[10,10,1])
+        self.panels.bottom = Cube(size=[10,10,1])
+
+    def test_single_difference(self):
+        """Verify each panel gets a single difference for all of its holes."""
+        hole_list = [
+                {'panel': 'top', 'type': 'round', 'location': (0,0), 'size': 1},
+                {'panel': 'bottom', 'type': 'square', 'location': (1,1), 'size': (1,2)},
+                {'panel': 'top', 'type': 'slot', 'location': (2,2), 'size': (3,1)},
+                {'panel': 'top', 'type': 'hexagon', 'location': (-2,2), 'size': 1},
+                ]
+        cut_holes(self.panels, hole_list, 2.0)
+        top = str(self.panels.top)
+        self.assertEqual(top.count('difference()'), 1,
+                         "Expected one difference: {0}".format(top))
+        self.assertEqual(top.count('union()'), 1,
+                         "Expected cutters in one union: {0}".format(top))
+        self.assertTrue('$fn=6' in top, "Missing hexagon cutter: {0}".format(top))
+        bottom = str(self.panels.bottom)
+        self.assertEqual(bottom.count('difference()'), 1,
+                         "Expected one difference: {0}".format(bottom))
+
+    def test_location_array(self):
+        """Verify an array of locations creates one cutter per position."""
+        x, y = numpy.meshgrid(numpy.arange(4), numpy.arange(3))
+        locations = numpy.column_stack([x.ravel(), y.ravel()])
+        hole_list = [{'panel': 'top', 'type': 'round', 'location': locations, 'size': 0.5}]
+        cut_holes(self.panels, hole_list, 2.0)
+        top = str(self.panels.top)
+        self.assertEqual(top.count('cylinder'), 1,
+                         "Expected a single looped cutter: {0}".format(top))
+        self.assertTrue('for (p = [' in top,
+                        "Expected a loop over the locations: {0}".format(top))
+
+    def test_unknown_type(self):
+        """Verify unknown hole types are rejected."""
+        hole_list = [{'panel': 'top', 'type': 'star', 'location': (0,0), 'size': 1}]
+        self.assertRaises(ValueError, cut_holes, self.panels, hole_list, 2.0)
+
+    def test_plate_w_holes(self):
+        """Verify plate holes are cut with a single difference."""
+        holes = [(0,0,1), (1,1,1), (2,2,0.5)]
+        output = str(plate_w_holes(10, 10, 1, holes))
+        self.assertEqual(output.count('difference()'), 1,
+                         "Expected one difference: {0}".format(output))
+        self.assertEqual(output.count('cylinder'), 2,
+                         "Expected a cutter per hole diameter: {0}".format(output))
+
+class Test_Grid_Box(unittest.TestCase):
+    """Test the grid box polyhedron."""
+
+    def test_sizes(self):
+        """Verify point and face counts of the grid box."""
+        box = grid_box(10, 8, 2, 5, 4)
+        self.assertEqual(box.points.shape, (2*6*5, 3))
+        # two triangles per cell on top and bottom, and per edge on the sides
+        self.assertEqual(box.faces.shape, (2*2*5*4 + 2*2*5 + 2*2*4, 3))
+        self.assertTrue(box.faces.min() == 0 and box.faces.max() == 2*6*5-1,
+                        "Face indices out of range!")
+
+    def test_closed(self):
+        """Verify every edge of the grid box is shared by exactly two faces."""
+        box = grid_box(10, 8, 2, 5, 4)
+        edges = {}
+        for face in box.faces.tolist():
+            for k in range(3):
+                edge = tuple(sorted((face[k], face[(k+1)%3])))
+                edges[edge] = edges.get(edge, 0) + 1
+        self.assertEqual(set(edges.values()), set([2]),
+                         "Grid box surface is not closed!")
+
+    def test_top_func(self):
+        """Verify array aware and point wise functions give the same surface."""
+        box0 = grid_box(10, 8, 2, 5, 4, top_func=lambda x, y: numpy.sin(x)*y)
+        box1 = grid_box(10, 8, 2, 5, 4, top_func=lambda x, y: math.sin(x)*y)
+        self.assertTrue(numpy.allclose(box0.points, box1.points),
+                        "Surface depends on how top_func is evaluated!")
+
+class Test_STL_Polyhedron(unittest.TestCase):
+    """Test conversion of stl facets to a polyhedron."""
+
+    def test_facets(self):
+        """Verify facets become a welded polyhedron with clockwise faces."""
+        poly = stl_to_polyhedron(tetrahedron())
+        self.assertEqual(poly.points.shape, (4,3))
+        self.assertEqual(poly.faces.shape, (4,3))
+        # first facet is counter-clockwise, [0,1,2] in welded order
+        self.assertEqual(poly.faces[0].tolist(), [2,1,0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from py2scad import library
+from py2scad import project
+from py2scad.base import SCAD_Prog
+from py2scad.primitives import Cube, Cylinder, Include, Use
+from py2scad.transforms import Assembly, Translate, Union
+
+def make_bolt():
+    return Assembly(Cylinder(h='length', r1=1.5), name='bolt', parameters=['length'])
+
+class Test_Library(unittest.TestCase):
+    """Test sharing assemblies between programs through a library."""
+
+    def setUp(self):
+        self.bolt = make_bolt()
+        self.spacer = Assembly(Cube(size=[2,2,2]), name='spacer')
+        self.progs = []
+        for i in range(3):
+            prog = SCAD_Prog()
+            prog.add([self.bolt, Translate(self.bolt(10+i), v=[i,0,0])])
+            self.progs.append(prog)
+        # The spacer is only used by one program
+        self.progs[0].add([self.spacer, self.spacer()])
+
+    def test_include_use(self):
+        """Verify include and use statements."""
+        self.assertEqual(str(Include('lib.scad')), 'include <lib.scad>')
+        self.assertEqual(str(Use('lib.scad')), 'use <lib.scad>')
+
+    def test_module_call(self):
+        """Verify module calls remember their assembly."""
+        call = self.bolt(5)
+        self.assertEqual(call, 'bolt(5.00000);')
+        self.assertTrue(call.assembly is self.bolt)
+
+    def test_share(self):
+        """Verify shared assemblies move to the library."""
+        lib = library.share_assemblies(self.progs, 'lib.scad')
+        self.assertEqual(lib.get_names(), ['bolt'])
+        for i, prog in enumerate(self.progs):
+            output = str(prog)
+            self.assertTrue(output.startswith('use <lib.scad>'),
+                            "Missing use statement: {0}".format(output))
+            self.assertFalse('module bolt' in output, "Module still defined: {0}".format(output))
+            self.assertTrue('bolt({0:0.5f});'.format(10+i) in output, "Missing call: {0}".format(output))
+        self.assertTrue('module spacer' in str(self.progs[0]), "Unshared module removed!")
+        self.assertEqual(str(lib).count('module bolt'), 1)
+
+    def test_share_equal_definitions(self):
+        """Verify equal assemblies from different constructions are shared."""
+        prog = SCAD_Prog()
+        bolt = make_bolt()
+        prog.add([bolt, bolt(3)])
+        lib = library.share_assemblies(self.progs[1:] + [prog], 'lib.scad', min_progs=3)
+        self.assertEqual(lib.get_names(), ['bolt'])
+        self.assertTrue('module bolt' not in str(prog))
+
+    def test_conflicting_definitions(self):
+        """Verify different assemblies of the same name are not shared."""
+        prog = SCAD_Prog()
+        bolt = Assembly(Cube(), name='bolt', parameters=['length'])
+        prog.add([bolt, bolt(3)])
+        lib = library.share_assemblies([self.progs[1], prog], 'lib.scad')
+        self.assertEqual(lib.get_names(), [])
+        self.assertTrue('module bolt' in str(prog))
+
+    def test_project(self):
+        """Verify project writes the library and tracks it as a dependency."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            proj = project.SCAD_Project(tmpdir)
+            for i, prog in enumerate(self.progs):
+                proj.add('part{0}.scad'.format(i), prog)
+            proj.add_library(library.share_assemblies(self.progs, 'lib.scad'))
+            self.assertTrue('lib.scad' in proj.write())
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'lib.scad')))
+            self.assertEqual(proj.get_dependencies('part1.scad'), ['lib.scad'])
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,121 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import random
+import time
+import unittest
+from py2scad import nesting
+from py2scad import profile2d
+from py2scad.primitives import Square
+from py2scad.highlevel import Basic_Enclosure
+from profile2d_test import enclosure_params
+
+def overlaps(a, b, spacing=0.0):
+    return (a.x < b.x + b.width + spacing - 1.0e-9 and b.x < a.x + a.width + spacing - 1.0e-9 and
+            a.y < b.y + b.height + spacing - 1.0e-9 and b.y < a.y + a.height + spacing - 1.0e-9)
+
+class Test_Nest(unittest.TestCase):
+    """Tests of the skyline packing."""
+
+    def check_layout(self, sizes, sheet_size, placements, spacing=0.0, margin=0.0):
+        self.assertEqual(len(placements), len(sizes))
+        for i, p in enumerate(placements):
+            self.assertEqual(p.index, i)
+            self.assertEqual(sorted((p.width, p.height)), sorted(sizes[i]))
+            self.assertTrue(p.x >= margin - 1.0e-9 and p.y >= margin - 1.0e-9)
+            self.assertTrue(p.x + p.width <= sheet_size[0] - margin + 1.0e-9)
+            self.assertTrue(p.y + p.height <= sheet_size[1] - margin + 1.0e-9)
+        for i, a in enumerate(placements):
+            for b in placements[i+1:]:
+                if a.sheet == b.sheet:
+                    self.assertFalse(overlaps(a, b, spacing), (a, b))
+
+    def test_exact_fit(self):
+        """Four quarter sheets fill one sheet exactly."""
+        sizes = [(5, 5)]*4
+        placements = nesting.nest(sizes, (10, 10))
+        self.check_layout(sizes, (10, 10), placements)
+        self.assertEqual(set(p.sheet for p in placements), set([0]))
+
+    def test_rotation(self):
+        """A part only fits the sheet when rotated."""
+        placements = nesting.nest([(4, 10)], (10, 4))
+        self.assertTrue(placements[0].rotated)
+        self.assertRaises(ValueError, nesting.nest, [(4, 10)], (10, 4), rotate=False)
+
+    def test_multiple_sheets(self):
+        """Parts overflow onto new sheets."""
+        sizes = [(6, 6)]*3
+        placements = nesting.nest(sizes, (10, 10))
+        self.check_layout(sizes, (10, 10), placements)
+        self.assertEqual(sorted(p.sheet for p in placements), [0, 1, 2])
+
+    def test_spacing_margin(self):
+        """Spacing and margin are respected."""
+        rng = random.Random(1)
+        sizes = [(rng.uniform(5, 40), rng.uniform(5, 40)) for i in range(40)]
+        placements = nesting.nest(sizes, (100, 100), spacing=2.0, margin=3.0)
+        self.check_layout(sizes, (100, 100), placements, spacing=2.0, margin=3.0)
+
+    def test_many_parts(self):
+        """Hundreds of parts are packed quickly and reasonably densely."""
+        rng = random.Random(0)
+        sizes = [(rng.uniform(10, 80), rng.uniform(10, 80)) for i in range(500)]
+        t0 = time.time()
+        placements = nesting.nest(sizes, (600, 400), spacing=1.0)
+        self.assertTrue(time.time() - t0 < 10.0)
+        self.check_layout(sizes, (600, 400), placements, spacing=1.0)
+        num_sheets = max(p.sheet for p in placements) + 1
+        area = sum(w*h for w, h in sizes)
+        self.assertTrue(area/(num_sheets*600*400.0) > 0.6)
+
+class Test_Nest_Profiles(unittest.TestCase):
+    """Tests of nesting profiles and scad objects."""
+
+    def test_enclosure_profiles(self):
+        """The panels of an enclosure are nested within the sheet."""
+        enclosure = Basic_Enclosure(enclosure_params())
+        enclosure.make()
+        profiles = enclosure.get_profiles(layout=False).values()
+        sheets = nesting.nest_profiles(profiles, (200, 200), spacing=2.0)
+        self.assertEqual(sum(len(sheet) for sheet in sheets), len(profiles))
+        area = sum(p.area() for p in profiles)
+        self.assertAlmostEqual(sum(p.area() for sheet in sheets for p in sheet), area, 4)
+        for sheet in sheets:
+            for p in sheet:
+                xmin, ymin, xmax, ymax = p.bounds()
+                self.assertTrue(xmin >= -1.0e-9 and ymin >= -1.0e-9)
+                self.assertTrue(xmax <= 200 + 1.0e-9 and ymax <= 200 + 1.0e-9)
+
+    def test_rotated_profile(self):
+        """A rotated profile is moved back to its placement."""
+        profile = profile2d.Profile(profile2d.rect_points(4, 10))
+        sheets = nesting.nest_profiles([profile], (10, 4))
+        xmin, ymin, xmax, ymax = sheets[0][0].bounds()
+        self.assertAlmostEqual(xmin, 0.0)
+        self.assertAlmostEqual(ymin, 0.0)
+        self.assertAlmostEqual(xmax, 10.0)
+        self.assertAlmostEqual(ymax, 4.0)
+
+    def test_objects(self):
+        """Scad objects are rotated and translated into place."""
+        square = Square(size=[4, 10], center=True)
+        sheets = nesting.nest_objects([square], [(-2, -5, 2, 5)], (10, 4))
+        text = str(sheets[0][0])
+        self.assertTrue(text.startswith('translate(v=[5.00000, 2.00000, 0.00000])'), text)
+        self.assertTrue('rotate(a=90.00000' in text, text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import time
+import pickle
+import unittest
+import numpy
+from py2scad.base import SCAD_Prog
+from py2scad.expression import Var
+from py2scad.primitives import Polyhedron, Polygon, Variables
+
+class Test_Polyhedron(unittest.TestCase):
+    """Test the polyhedron primitive."""
+
+    def setUp(self):
+        self.points = [[0,0,0], [1,0,0], [0,1,0], [0,0,1]]
+        self.faces = [[0,1,2], [0,3,1], [0,2,3], [1,3,2]]
+
+    def test_arrays(self):
+        """Verify points and faces are stored as typed arrays."""
+        poly = Polyhedron(self.points, self.faces)
+        self.assertEqual(poly.points.dtype, numpy.float64)
+        self.assertEqual(poly.faces.dtype.kind, 'i')
+        self.assertTrue(poly.points.flags['C_CONTIGUOUS'])
+
+    def test_output(self):
+        """Verify points and faces are written from the arrays."""
+        output = str(Polyhedron(self.points, self.faces))
+        self.assertTrue('[1.00000, 0.00000, 0.00000],' in output,
+                        "Missing point: {0}".format(output))
+        self.assertTrue('[0, 3, 1],' in output,
+                        "Missing face: {0}".format(output))
+        self.assertEqual(output.count('['), output.count(']'),
+                         "Non-matching square brackets!")
+
+    def test_bad_index(self):
+        """Verify out of range face indices are rejected."""
+        faces = self.faces + [[0,1,4]]
+        self.assertRaises(ValueError, Polyhedron, self.points, faces)
+        faces = self.faces + [[0,-1,2]]
+        self.assertRaises(ValueError, Polyhedron, self.points, faces)
+
+
+class Test_Polygon(unittest.TestCase):
+    """Test the polygon primitive."""
+
+    def test_ragged_paths(self):
+        """Verify paths of different lengths are accepted and checked."""
+        points = [[0,0], [1,0], [0,1], [1,1]]
+        poly = Polygon(points, [[0,1,2], [1,3]])
+        self.assertEqual(str(poly).count('paths'), 1)
+        self.assertRaises(ValueError, Polygon, points, [[0,1,2], [1,4]])
+
+    def test_expression_points(self):
+        """Verify points containing expressions are kept as given."""
+        points = [[0,0], ['width',0], [0,'height']]
+        output = str(Polygon(points, [[0,1,2]]))
+        self.assertTrue('[width, 0.00000]' in output,
+                        "Expression point missing: {0}".format(output))
+
+
+class Test_Variables(unittest.TestCase):
+    """Test the ordered variable declarations."""
+
+    def lines(self, variables):
+        return [line for line in variables.cmd_str().splitlines() if line]
+
+    def test_order(self):
+        """Verify variables are written in definition order after their dependencies."""
+        v = Variables()
+        v.wall = 2.0
+        v.outer = Var('inner') + 2*Var('wall')
+        v.inner = 50.0
+        v.half = 'outer/2'
+        v.size = [Var('outer'), 10.0, 0]
+        self.assertEqual(self.lines(v), [
+            'wall = 2.00000;',
+            'inner = 50.00000;',
+            'outer = inner + 2.00000 * wall;',
+            'half = outer/2;',
+            'size = [outer, 10.00000, 0.00000];',
+            ])
+
+    def test_attributes(self):
+        """Verify attribute access and assignment of variables."""
+        v = Variables(width=50.0)
+        self.assertEqual(v.width, Var('width'))
+        v.width = 60.0
+        self.assertEqual(v['width'], 60.0)
+        self.assertFalse('width' in v.__dict__)
+        self.assertRaises(AttributeError, getattr, v, 'height')
+        self.assertEqual(v.comment, 'Named variables //\n')
+
+    def test_circular(self):
+        """Verify circular definitions are rejected."""
+        v = Variables(a=Var('b') + 1, b='2*a')
+        self.assertRaises(ValueError, v.cmd_str)
+
+    def test_cache(self):
+        """Verify the written block is cached until a value changes."""
+        v = Variables(a=1.0)
+        first = v.cmd_str()
+        self.assertTrue(v.cmd_str() is first)
+        v['a'] = 2.0
+        self.assertEqual(v.cmd_str(), 'a = 2.00000;\n\n')
+        v.update([('b', 3.0)])
+        del v['a']
+        self.assertEqual(v.cmd_str(), 'b = 3.00000;\n\n')
+        self.assertEqual(v.pop('b'), 3.0)
+        self.assertEqual(v.cmd_str(), '\n')
+
+    def test_pickle(self):
+        """Verify pickled variables keep their order."""
+        v = Variables(comment='dims')
+        v.b = 1.0
+        v.a = Var('b')*2
+        copy = pickle.loads(pickle.dumps(v, 2))
+        self.assertEqual(copy.cmd_str(), v.cmd_str())
+        self.assertEqual(copy.comment, 'dims')
+
+    def test_emit_once(self):
+        """Verify a program writes a variables block once."""
+        v = Variables(width=50.0)
+        prog = SCAD_Prog()
+        prog.add([v, v])
+        self.assertEqual(str(prog).count('width = 50.00000;'), 1)
+
+    def test_many(self):
+        """Verify thousands of chained variables are ordered quickly."""
+        v = Variables()
+        num = 5000
+        for i in reversed(range(num)):
+            v['p{0}'.format(i)] = Var('p{0}'.format(i-1)) + 1 if i else 0.0
+        t0 = time.time()
+        lines = self.lines(v)
+        self.assertTrue(time.time() - t0 < 5.0)
+        self.assertEqual(lines[0], 'p0 = 0.00000;')
+        self.assertEqual(lines[-1], 'p4999 = p4998 + 1.00000;')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import math
+import unittest
+import numpy
+from py2scad import profile2d
+from py2scad.highlevel import Plate_W_Tabs, Plate_W_Slots, RT_Triangle_W_Tabs, Basic_Enclosure
+
+def enclosure_params():
+    """A small enclosure with holes in the bottom and front."""
+    hole_list = [
+            {'panel': 'bottom', 'type': 'round', 'location': [(-20,0), (20,0)], 'size': 3.0},
+            {'panel': 'front', 'type': 'square', 'location': (0,0), 'size': (10,5)},
+            ]
+    return {
+            'inner_dimensions'        : (100.0, 60.0, 30.0),
+            'wall_thickness'          : 3.0,
+            'lid_radius'              : 5.0,
+            'top_x_overhang'          : 4.0,
+            'top_y_overhang'          : 4.0,
+            'bottom_x_overhang'       : 15.0,
+            'bottom_y_overhang'       : 4.0,
+            'lid2front_tabs'          : (0.2,0.5,0.8),
+            'lid2side_tabs'           : (0.25, 0.75),
+            'side2side_tabs'          : (0.5,),
+            'lid2front_tab_width'     : 10.0,
+            'lid2side_tab_width'      : 10.0,
+            'side2side_tab_width'     : 8.0,
+            'standoff_diameter'       : 6.0,
+            'standoff_offset'         : 1.0,
+            'standoff_hole_diameter'  : 3.0,
+            'hole_list'               : hole_list,
+            }
+
+class Test_Profile(unittest.TestCase):
+    """Test the flat profile object."""
+
+    def setUp(self):
+        self.profile = profile2d.Profile(profile2d.rect_points(10, 6)[::-1])
+        self.profile.add_hole(profile2d.rect_points(2, 2))
+        self.profile.add_circles([(3, 0, 1)])
+
+    def test_orientation(self):
+        """Verify outlines are counter clockwise and holes clockwise."""
+        self.assertTrue(profile2d.signed_area(self.profile.outline) > 0)
+        self.assertTrue(profile2d.signed_area(self.profile.holes[0]) < 0)
+
+    def test_area(self):
+        """Verify the area less the holes."""
+        self.assertAlmostEqual(self.profile.area(), 60 - 4 - math.pi)
+
+    def test_transform(self):
+        """Verify mirrored and rotated profiles keep their orientation and area."""
+        for profile in (self.profile.mirror((1,0)), self.profile.rotate(30).translate((5,5))):
+            self.assertAlmostEqual(profile.area(), self.profile.area())
+            self.assertTrue(profile2d.signed_area(profile.outline) > 0)
+        self.assertAlmostEqual(self.profile.mirror((1,0)).circles[0,0], -3)
+
+    def test_offset(self):
+        """Verify offsets grow the outline and shrink the holes."""
+        profile = self.profile.offset(0.5)
+        self.assertEqual(profile.bounds(), (-5.5, -3.5, 5.5, 3.5))
+        self.assertAlmostEqual(profile.area(), 77 - 1 - 0.25*math.pi)
+        self.assertAlmostEqual(profile.circles[0,2], 0.5)
+        self.assertTrue(profile2d.signed_area(profile.holes[0]) < 0)
+        self.assertAlmostEqual(self.profile.offset(0.5).offset(-0.5).area(), self.profile.area())
+        self.assertRaises(ValueError, self.profile.offset, 1.0)
+
+    def test_miter_limit(self):
+        """Verify sharp corners are clipped."""
+        points = profile2d.offset_points([(0,0), (100,0), (0,1)], 1.0, miter_limit=4.0)
+        dist = numpy.hypot(*(points - [(0,0), (100,0), (0,1)]).T)
+        self.assertTrue(dist.max() <= 4.0 + 1.0e-9)
+
+    def test_rounded_rect(self):
+        """Verify rounded rectangle area."""
+        points = profile2d.rounded_rect_points(10, 6, 2, segments=200)
+        self.assertAlmostEqual(profile2d.signed_area(points), 60 - (4 - math.pi)*4, places=3)
+
+    def test_to_scad(self):
+        """Verify profiles are written as a polygon with holes less circles."""
+        output = str(self.profile.to_scad())
+        self.assertTrue(output.startswith('difference()'), output)
+        self.assertEqual(output.count('polygon('), 1)
+        self.assertEqual(output.count('circle('), 1)
+        self.assertTrue('paths' in output)
+
+class Test_Plate_Profiles(unittest.TestCase):
+    """Test the flat profiles of the laser cut plates."""
+
+    def test_tabbed_plate(self):
+        """Verify tabs are walked into the outline."""
+        params = {
+                'size' : (40, 20, 3),
+                'xz+'  : [(0.5, 10, 3, '+')],
+                'xz-'  : [(0.25, 4, 3, '+'), (0.75, 4, 3, '+')],
+                'yz+'  : [(0.5, 6, 3, '-')],
+                'yz-'  : [],
+                }
+        profile = Plate_W_Tabs(params).get_profile()
+        self.assertAlmostEqual(profile.area(), 800 + 30 + 12 + 12 - 18)
+        self.assertEqual(len(profile.outline), 4 + 4*4)
+        xmin, ymin, xmax, ymax = profile.bounds()
+        self.assertEqual((xmin, ymin, xmax, ymax), (-20, -13, 20, 13))
+
+    def test_tabbed_plate_kerf(self):
+        """Verify kerf compensation widens tabs and narrows notches."""
+        params = {
+                'size' : (40, 20, 3),
+                'xz+'  : [(0.5, 10, 3, '+')],
+                'xz-'  : [],
+                'yz+'  : [(0.5, 6, 3, '-')],
+                'yz-'  : [],
+                }
+        profile = Plate_W_Tabs(params).get_profile(kerf=0.2)
+        self.assertEqual(len(profile.outline), 4 + 2*4)
+        tab = profile.outline[profile.outline[:,1] > 10.2]
+        self.assertAlmostEqual(tab[:,0].max() - tab[:,0].min(), 10.2)
+        notch = profile.outline[profile.outline[:,0] < 19.9]
+        notch = notch[numpy.abs(notch[:,1]) < 5]
+        self.assertAlmostEqual(notch[:,1].max() - notch[:,1].min(), 5.8)
+        self.assertAlmostEqual(profile.area(), 40.2*20.2 + 10.2*3 - 5.8*3)
+
+    def test_bad_tab(self):
+        """Verify unknown tab directions are rejected."""
+        params = {'size': (40, 20, 3), 'xz+': [(0.5, 10, 3, '?')], 'xz-': [], 'yz+': [], 'yz-': []}
+        self.assertRaises(ValueError, Plate_W_Tabs(params).get_profile)
+
+    def test_slotted_plate(self):
+        """Verify slots are holes."""
+        params = {'size': (40, 20, 3), 'radius': 2.0, 'slots': [((0,0), (10,3)), ((10,5), (2,2))]}
+        profile = Plate_W_Slots(params).get_profile()
+        self.assertEqual(len(profile.holes), 2)
+        self.assertTrue(abs(profile.area() - (800 - (4 - math.pi)*4 - 34)) < 0.2)
+
+    def test_triangle(self):
+        """Verify tabs on the hypotenuse of a triangle."""
+        params = {
+                'size' : (30, 40, 3),
+                'xz'   : [(0.5, 6, 3, '+')],
+                'yz'   : [(0.5, 6, 3, '-')],
+                'hz'   : [(0.5, 10, 3, '+')],
+                }
+        profile = RT_Triangle_W_Tabs(params).get_profile()
+        self.assertAlmostEqual(profile.area(), 600 + 18 - 18 + 30)
+        # The hypotenuse tab sticks out normal to the hypotenuse at its middle
+        dist = numpy.dot(profile.outline, [40/50.0, 30/50.0]) - 24.0
+        self.assertAlmostEqual(dist.max(), 3.0)
+
+class Test_Enclosure_Profiles(unittest.TestCase):
+    """Test the flat profiles of the basic enclosure."""
+
+    def setUp(self):
+        self.enclosure = Basic_Enclosure(enclosure_params())
+        self.enclosure.make()
+
+    def test_panels(self):
+        """Verify panels and their holes."""
+        profiles = self.enclosure.get_profiles(layout=False)
+        self.assertEqual(sorted(profiles), ['back', 'bottom', 'front', 'left', 'right', 'top'])
+        # 10 tab slots, 4 standoff holes and 2 extra holes in the bottom
+        self.assertEqual(len(profiles['bottom'].holes), 10)
+        self.assertEqual(len(profiles['bottom'].circles), 6)
+        self.assertEqual(len(profiles['top'].circles), 4)
+        self.assertEqual(len(profiles['front'].holes), 1)
+        self.assertEqual(len(profiles['back'].holes), 0)
+        xmin, ymin, xmax, ymax = profiles['front'].bounds()
+        self.assertAlmostEqual(ymax - ymin, 30 + 2*3)
+
+    def test_kerf(self):
+        """Verify kerf compensation of all panels."""
+        profiles = self.enclosure.get_profiles(layout=False)
+        compensated = self.enclosure.get_profiles(layout=False, kerf=0.2)
+        for name, profile in profiles.items():
+            self.assertEqual(len(compensated[name].holes), len(profile.holes))
+            xmin, ymin, xmax, ymax = profile.bounds()
+            bounds = (xmin - 0.1, ymin - 0.1, xmax + 0.1, ymax + 0.1)
+            for a, b in zip(compensated[name].bounds(), bounds):
+                self.assertAlmostEqual(a, b)
+        self.assertAlmostEqual(compensated['bottom'].circles[-1,2], 1.4)
+
+    def test_layout(self):
+        """Verify the laid out panels do not overlap."""
+        profiles = self.enclosure.get_profiles(exclude_list=['top'])
+        self.assertFalse('top' in profiles)
+        boxes = [profile.bounds() for profile in profiles.values()]
+        for i, a in enumerate(boxes):
+            for b in boxes[i+1:]:
+                overlap = a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+                self.assertFalse(overlap, "Panels overlap: {0} {1}".format(a, b))
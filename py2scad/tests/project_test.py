@@ -0,0 +1,119 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from py2scad import project
+from py2scad.base import SCAD_Prog
+from py2scad.primitives import Cube, Import_STL, Use
+from py2scad.transforms import Union
+from render_test import make_fake_openscad
+
+class Test_Project(unittest.TestCase):
+    """Test incremental project builds with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.openscad = make_fake_openscad(self.tmpdir)
+        self.project = project.SCAD_Project(os.path.join(self.tmpdir, 'build'))
+        self.case = SCAD_Prog()
+        self.case.add(Union([Import_STL('top.stl'), Cube(size=[1,2,3])]))
+        self.top = SCAD_Prog()
+        self.top.add(Cube(size=[1,1,1]))
+        # Added out of build order on purpose
+        self.project.add('case.scad', self.case)
+        self.project.add('top.scad', self.top)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def age(self, filename, seconds=10):
+        """Move the modification time of a project file into the past."""
+        path = self.project.get_path(filename)
+        t = os.path.getmtime(path) - seconds
+        os.utime(path, (t, t))
+
+    def age_all(self):
+        """Move all project files into the past, keeping their order."""
+        for filename in os.listdir(self.project.directory):
+            self.age(filename)
+
+    def test_dependencies(self):
+        """Verify imported files are found."""
+        self.assertEqual(self.project.get_dependencies('case.scad'), ['top.stl'])
+        self.assertEqual(self.project.get_dependencies('top.scad'), [])
+
+    def write_file(self, filename, text):
+        with open(self.project.get_path(filename), 'w') as fid:
+            fid.write(text)
+
+    def test_library_chain(self):
+        """Verify libraries used by libraries are dependencies."""
+        self.top.add(Use('lib/a.scad'))
+        self.project.write()
+        os.mkdir(self.project.get_path('lib'))
+        self.write_file('lib/a.scad', 'use <b.scad>\n')
+        self.write_file('lib/b.scad', 'include <a.scad>\nmodule b() {}\n')
+        self.assertEqual(self.project.get_dependencies('top.scad'), ['lib/a.scad', 'lib/b.scad'])
+        self.project.build(openscad=self.openscad)
+        self.assertEqual(self.project.stale_outputs(), [])
+        # Changing the second level library re-renders both
+        self.age_all()
+        for filename in ('a.scad', 'b.scad'):
+            self.age(os.path.join('lib', filename))
+        self.write_file('lib/b.scad', 'module b() { cube(); }\n')
+        self.assertEqual(self.project.stale_outputs(),
+                         [('top.scad', 'top.stl'), ('case.scad', 'case.stl')])
+
+    def test_unchanged_not_written(self):
+        """Verify unchanged programs are not rewritten."""
+        self.assertEqual(sorted(self.project.write()), ['case.scad', 'top.scad'])
+        self.age('top.scad')
+        mtime = os.path.getmtime(self.project.get_path('top.scad'))
+        self.assertEqual(self.project.write(), [], "Unchanged files rewritten!")
+        self.assertEqual(os.path.getmtime(self.project.get_path('top.scad')), mtime)
+        self.top.add(Cube())
+        self.assertEqual(self.project.write(), ['top.scad'])
+
+    def test_build(self):
+        """Verify only stale outputs are rendered, in dependency order."""
+        self.project.write()
+        self.assertEqual(self.project.stale_outputs(),
+                         [('top.scad', 'top.stl'), ('case.scad', 'case.stl')])
+        results = self.project.build(openscad=self.openscad)
+        self.assertTrue(all(result.ok() for result in results))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.project.stale_outputs(), [], "Outputs stale after build!")
+        # Changing the case only re-renders the case
+        self.age_all()
+        self.case.add(Cube())
+        self.project.write()
+        self.assertEqual(self.project.stale_outputs(), [('case.scad', 'case.stl')])
+        self.project.build(openscad=self.openscad)
+        # Changing the top re-renders both
+        self.age_all()
+        self.top.add(Cube())
+        self.project.write()
+        self.assertEqual(self.project.stale_outputs(),
+                         [('top.scad', 'top.stl'), ('case.scad', 'case.stl')])
+
+    def test_circular(self):
+        """Verify circular dependencies are rejected."""
+        self.top.add(Import_STL('case.stl'))
+        self.project.write()
+        self.assertRaises(ValueError, self.project.stale_outputs)
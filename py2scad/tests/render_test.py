@@ -0,0 +1,326 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import sys
+import stat
+import time
+import shutil
+import tempfile
+import unittest
+from py2scad import base
+from py2scad import render
+from py2scad import profiler
+from py2scad import stl_tools
+from py2scad.base import SCAD_Prog
+from py2scad.lod import LOD_Policy
+from py2scad.primitives import Cube, Square, Cylinder
+from py2scad.transforms import Translate, Union, Difference, Projection
+
+def make_fake_openscad(dirname):
+    """Create an executable wrapping fake_openscad.py, returns its path."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_openscad.py')
+    exe = os.path.join(dirname, 'openscad')
+    with open(exe, 'w') as fid:
+        fid.write('#!/bin/sh\nexec "{0}" "{1}" "$@"\n'.format(sys.executable, script))
+    os.chmod(exe, os.stat(exe).st_mode | stat.S_IEXEC)
+    return exe
+
+class Test_Render(unittest.TestCase):
+    """Test rendering with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.openscad = make_fake_openscad(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_render(self):
+        """Verify a program is rendered and its facets counted."""
+        outfile = os.path.join(self.tmpdir, 'part.stl')
+        result = render.render([Cube(), Cube()], outfile, openscad=self.openscad)
+        self.assertTrue(result.ok(), result.stderr)
+        self.assertEqual(render.count_facets(outfile), 24)
+        self.assertEqual(os.listdir(self.tmpdir).count('part.stl'), 1)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 2, "Temporary scad file left behind!")
+
+    def test_failure(self):
+        """Verify failed renders are reported."""
+        outfile = os.path.join(self.tmpdir, 'part.stl')
+        result = render.render('// fake_openscad: fail\n', outfile, openscad=self.openscad)
+        self.assertFalse(result.ok())
+        self.assertTrue('fake failure' in result.stderr)
+
+    def test_defines(self):
+        """Verify command line variable definitions."""
+        cmd = render.get_command('a.scad', 'a.stl', openscad='scad', defines={'$t': 0.5})
+        self.assertEqual(cmd, ['scad', '-o', 'a.stl', '-D', '$t=0.5', 'a.scad'])
+
+
+class Test_Backends(unittest.TestCase):
+    """Test the render backends with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.openscad = make_fake_openscad(self.tmpdir)
+        self.jobs = []
+        for i in range(5):
+            outfile = os.path.join(self.tmpdir, 'part{0}.stl'.format(i))
+            self.jobs.append(([Cube()]*(i+1), outfile))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_results(self, results):
+        self.assertEqual(len(results), len(self.jobs))
+        for i, result in enumerate(results):
+            self.assertTrue(result.ok(), result.stderr)
+            self.assertEqual(render.count_facets(self.jobs[i][1]), 12*(i+1))
+
+    def test_subprocess(self):
+        """Verify each program rendered separately."""
+        backend = render.Subprocess_Backend(openscad=self.openscad)
+        self.check_results(backend.render_many(self.jobs))
+
+    def logged_openscad(self):
+        """Returns an openscad logging its runs and the log file."""
+        log = os.path.join(self.tmpdir, 'runs.log')
+        openscad = os.path.join(self.tmpdir, 'logged_openscad')
+        with open(openscad, 'w') as fid:
+            fid.write('#!/bin/sh\necho run >> "{0}"\nexec "{1}" "$@"\n'.format(log, self.openscad))
+        os.chmod(openscad, os.stat(openscad).st_mode | stat.S_IEXEC)
+        return openscad, log
+
+    def count_runs(self, log):
+        with open(log) as fid:
+            return len(fid.readlines())
+
+    def test_batch(self):
+        """Verify batched parts are split back to their own files."""
+        openscad, log = self.logged_openscad()
+        backend = render.Batch_Backend(openscad=openscad, pitch=100.0, max_batch=3)
+        self.check_results(backend.render_many(self.jobs))
+        self.assertEqual(self.count_runs(log), 2, "Parts not rendered in two batches!")
+        for filename in (log, openscad):
+            os.remove(filename)
+        facet_list = stl_tools.read_stl(self.jobs[4][1])
+        xmax = max(vertex[0] for facet in facet_list for vertex in facet.vertices)
+        self.assertTrue(xmax < 50.0, "Part not shifted back to its origin!")
+        self.assertEqual(len(os.listdir(self.tmpdir)), 6, "Temporary files left behind!")
+
+    def test_batch_fallback(self):
+        """Verify a failing batch is rendered part by part."""
+        self.jobs.append((Cube(comment='fake_openscad: fail'), os.path.join(self.tmpdir, 'bad.stl')))
+        backend = render.Batch_Backend(openscad=self.openscad, pitch=100.0)
+        results = backend.render_many(self.jobs)
+        self.assertFalse(results.pop().ok())
+        self.jobs.pop()
+        self.check_results(results)
+
+    def test_batch_bounds(self):
+        """Verify parts too large or of unknown size are not batched."""
+        openscad, log = self.logged_openscad()
+        self.jobs.append((Cube(size=120.0), os.path.join(self.tmpdir, 'large.stl')))
+        self.jobs.append(('cube();', os.path.join(self.tmpdir, 'text.stl')))
+        backend = render.Batch_Backend(openscad=openscad, pitch=100.0)
+        results = backend.render_many(self.jobs)
+        for i in range(2):
+            self.assertTrue(results.pop().ok())
+            self.assertEqual(render.count_facets(self.jobs.pop()[1]), 12)
+        self.check_results(results)
+        self.assertEqual(self.count_runs(log), 3, "Large and text parts batched!")
+
+    def test_batch_overflow(self):
+        """Verify a batched part outside its grid cell raises an error."""
+        backend = render.Batch_Backend(openscad=self.openscad, pitch=100.0)
+        self.jobs.append((Cube(comment='fake_openscad: offset=60'),
+                          os.path.join(self.tmpdir, 'moved.stl')))
+        self.assertRaises(ValueError, backend.render_many, self.jobs)
+
+    def test_batch_dirs(self):
+        """Verify the batch file is not written to the output directories."""
+        for i, (prog, outfile) in enumerate(self.jobs):
+            outdir = os.path.join(self.tmpdir, 'dir{0}'.format(i % 2))
+            if not os.path.exists(outdir):
+                os.mkdir(outdir)
+            self.jobs[i] = (prog, os.path.join(outdir, os.path.basename(outfile)))
+        backend = render.Batch_Backend(openscad=self.openscad, pitch=100.0)
+        self.check_results(backend.render_many(self.jobs))
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, 'dir0'))), 3)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, 'dir1'))), 2)
+
+    def test_batch_str(self):
+        """Verify the parts are placed as modules on a grid."""
+        backend = render.Batch_Backend(pitch=10.0)
+        output = backend.batch_str(['cube();']*4)
+        self.assertTrue('module py2scad_part_3() {' in output)
+        self.assertTrue('translate(v=[10.00000, 10.00000, 0.00000]) py2scad_part_3();' in output,
+                        output)
+
+
+class Test_Render_Pool(unittest.TestCase):
+    """Test the bounded render pool with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.openscad = make_fake_openscad(self.tmpdir)
+        self.pool = render.Render_Pool(max_workers=2, openscad=self.openscad)
+
+    def tearDown(self):
+        self.pool.close(cancel=True)
+        shutil.rmtree(self.tmpdir)
+
+    def wait_running(self, job):
+        t0 = time.time()
+        while job.state == 'pending' and time.time() - t0 < 5:
+            time.sleep(0.01)
+
+    def test_stream(self):
+        """Verify output is streamed and temporary files are removed."""
+        job = self.pool.submit([Cube(), Cube()])
+        data = ''.join(job.stream(chunk_size=100))
+        self.assertTrue(data.startswith('solid'))
+        self.assertEqual(data.count('facet normal'), 24)
+        self.assertTrue(job.wait().ok())
+        self.assertFalse(os.path.exists(job.outfile), "Streamed output not removed!")
+
+    def test_job_error(self):
+        """Verify errors preparing a render fail the job, not the worker."""
+        jobs = [self.pool.submit('cube();', defines=[('bad', 1)]) for i in range(2)]
+        for job in jobs:
+            result = job.wait(timeout=5)
+            self.assertTrue(job.done(), "Failed job never finished!")
+            self.assertFalse(result.ok())
+        self.assertEqual([name for name in os.listdir(self.pool.workdir) if name.endswith('.scad')], [])
+        jobs = [self.pool.submit('cube();') for i in range(2)]
+        self.assertTrue(all(job.wait(timeout=5).ok() for job in jobs), "Workers lost!")
+
+    def test_bounded(self):
+        """Verify no more than max_workers renders run at once."""
+        t0 = time.time()
+        jobs = [self.pool.submit('// fake_openscad: sleep=0.2\ncube();') for i in range(6)]
+        results = [job.wait() for job in jobs]
+        elapsed = time.time() - t0
+        self.assertTrue(all(result.ok() for result in results))
+        self.assertTrue(elapsed > 0.55, "Renders not bounded: {0:0.2f}s".format(elapsed))
+
+    def test_timeout(self):
+        """Verify renders are killed after their timeout."""
+        job = self.pool.submit('// fake_openscad: sleep=10\ncube();', timeout=0.2)
+        result = job.wait(5)
+        self.assertTrue(result is not None, "Render not killed!")
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok())
+        self.assertEqual(list(job.stream()), [])
+
+    def test_cancel(self):
+        """Verify running and pending renders are cancelled."""
+        jobs = [self.pool.submit('// fake_openscad: sleep=10\ncube();') for i in range(3)]
+        self.wait_running(jobs[0])
+        t0 = time.time()
+        for job in jobs:
+            self.assertTrue(job.cancel())
+        for job in jobs:
+            self.assertEqual(job.wait(5), None)
+            self.assertTrue(job.cancelled())
+        self.assertTrue(time.time() - t0 < 5, "Running render not killed!")
+        self.assertFalse(jobs[0].cancel(), "Cancelled job cancelled again!")
+
+
+class Test_Profiler(unittest.TestCase):
+    """Test the render profiler with a fake openscad."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.openscad = make_fake_openscad(self.tmpdir)
+        base.record_sites()
+        slow = Union([Cube(comment='fake_openscad: sleep=0.2'), Cube()])
+        fast = Translate(Cube(), v=[1,0,0])
+        self.prog = SCAD_Prog(fn=10)
+        self.prog.add(Difference([slow, fast]))
+        self.prog.add(Projection(Square()))
+        base.record_sites(False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile(self):
+        """Verify costs are attributed to the slow subtree."""
+        cache_file = os.path.join(self.tmpdir, 'cache.json')
+        prof = profiler.Render_Profiler(openscad=self.openscad, cache_file=cache_file)
+        profile_list = prof.profile(self.prog)
+        self.assertEqual(sorted(node.node_id for node in profile_list),
+                         ['0', '0.0', '0.1', '1'])
+        self.assertEqual(profile_list[0].node_id, '0.0',
+                         "Slow node not ranked first:\n{0}".format(prof.report(profile_list)))
+        self.assertEqual(profile_list[0].facets, 24)
+        self.assertTrue(profile_list[0].site[0][0].endswith('render_test.py'),
+                        "Bad construction site: {0}".format(profile_list[0].site))
+        planar = [node for node in profile_list if node.node_id == '1'][0]
+        self.assertEqual(planar.facets, 4, "2D node not rendered to dxf!")
+        self.assertFalse('// node' in str(self.prog), "Node id tags left behind!")
+        self.assertTrue(os.path.exists(cache_file))
+
+    def test_tags(self):
+        """Verify node ids are written as comments and shared objects get all paths."""
+        shared = Cube()
+        prog = SCAD_Prog()
+        prog.add([Union([shared]), Translate(shared, v=[1,0,0])])
+        profiler.tag_nodes(prog)
+        self.assertTrue('// node 0.0, 1.0' in str(prog), str(prog))
+        profiler.clear_tags(prog)
+        self.assertFalse('// node' in str(prog))
+
+    def record_texts(self, prog):
+        prof = profiler.Render_Profiler(openscad=self.openscad)
+        texts = []
+        def render_text(text, suffix, workdir):
+            texts.append(text)
+            return 0.0, 0, ''
+        prof.render_text = render_text
+        prof.overhead = 0.0
+        prof.profile(prog)
+        return texts
+
+    def test_untagged(self):
+        """Verify tags are not rendered, so the cache survives moving subtrees."""
+        profiler.tag_nodes(self.prog)
+        texts = self.record_texts(self.prog)
+        self.assertFalse(any('// node' in text for text in texts))
+        self.assertTrue('// node 0.0' in str(self.prog), "Node id tags not restored!")
+        self.prog.objlist.insert(0, Cube())
+        self.assertTrue(set(texts) <= set(self.record_texts(self.prog)))
+
+    def test_lod(self):
+        """Verify objects are profiled with the level of detail policy of the program."""
+        prog = SCAD_Prog(lod=LOD_Policy())
+        prog.add(Union([Cylinder(h=1, r1=10, r2=10)]))
+        texts = self.record_texts(prog)
+        self.assertTrue('$fn=' in texts[0], texts[0])
+
+    def test_cache(self):
+        """Verify cached results are not re-rendered."""
+        cache_file = os.path.join(self.tmpdir, 'cache.json')
+        profiler.Render_Profiler(openscad=self.openscad, cache_file=cache_file).profile(self.prog)
+        prof = profiler.Render_Profiler(openscad='missing-openscad', cache_file=cache_file)
+        prof.overhead = 0.0
+        profile_list = prof.profile(self.prog)
+        self.assertEqual(len(profile_list), 4)
+        self.assertFalse(any(node.error for node in profile_list))
+
+
+if __name__ == "__main__":
+    unittest.main()
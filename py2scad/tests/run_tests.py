@@ -15,9 +15,50 @@ limitations under the License.
 """
 import unittest
 import base_test
+import primitives_test
+import transforms_test
+import highlevel_test
+import stl_tools_test
+import render_test
+import tree_stats_test
+import project_test
+import library_test
+import sweep_test
+import profile2d_test
+import export2d_test
+import nesting_test
+import animation_test
+import expression_test
+import cache_test
 
 # Assemble test suites
 prog_suite = unittest.TestLoader().loadTestsFromModule(base_test)
-all_tests = unittest.TestSuite([prog_suite])
+primitives_suite = unittest.TestLoader().loadTestsFromModule(primitives_test)
+transforms_suite = unittest.TestLoader().loadTestsFromModule(transforms_test)
+highlevel_suite = unittest.TestLoader().loadTestsFromModule(highlevel_test)
+stl_tools_suite = unittest.TestLoader().loadTestsFromModule(stl_tools_test)
+render_suite = unittest.TestLoader().loadTestsFromModule(render_test)
+tree_stats_suite = unittest.TestLoader().loadTestsFromModule(tree_stats_test)
+project_suite = unittest.TestLoader().loadTestsFromModule(project_test)
+library_suite = unittest.TestLoader().loadTestsFromModule(library_test)
+sweep_suite = unittest.TestLoader().loadTestsFromModule(sweep_test)
+profile2d_suite = unittest.TestLoader().loadTestsFromModule(profile2d_test)
+export2d_suite = unittest.TestLoader().loadTestsFromModule(export2d_test)
+nesting_suite = unittest.TestLoader().loadTestsFromModule(nesting_test)
+animation_suite = unittest.TestLoader().loadTestsFromModule(animation_test)
+expression_suite = unittest.TestLoader().loadTestsFromModule(expression_test)
+cache_suite = unittest.TestLoader().loadTestsFromModule(cache_test)
+all_tests = unittest.TestSuite([prog_suite, primitives_suite, transforms_suite, highlevel_suite,
+                             stl_tools_suite, render_suite,
+                             tree_stats_suite,
+                             project_suite,
+                             library_suite,
+                             sweep_suite,
+                             profile2d_suite,
+                             export2d_suite,
+                             nesting_suite,
+                             animation_suite,
+                             expression_suite,
+                             cache_suite])
 # Run tests
 unittest.TextTestRunner(verbosity=2).run(all_tests)
@@ -0,0 +1,64 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import unittest
+from py2scad import stl_tools
+
+def tetrahedron():
+    """Returns the facets of a unit tetrahedron."""
+    points = [(0,0,0), (1,0,0), (0,1,0), (0,0,1)]
+    triangles = [(0,2,1), (0,1,3), (0,3,2), (1,2,3)]
+    facet_list = []
+    for tri in triangles:
+        v = [points[i] for i in tri]
+        v0 = stl_tools.vect_sub(v[1], v[0])
+        v1 = stl_tools.vect_sub(v[2], v[0])
+        normal = stl_tools.vect2unit(stl_tools.cross_prod(v0, v1))
+        facet_list.append(stl_tools.stl_facet(v, normal))
+    return facet_list
+
+class Test_Indexed_Mesh(unittest.TestCase):
+    """Test welding of facets into an indexed mesh."""
+
+    def test_weld(self):
+        """Verify shared vertices are merged."""
+        points, faces = stl_tools.get_indexed_mesh(tetrahedron())
+        self.assertEqual(points.shape, (4,3))
+        self.assertEqual(faces.shape, (4,3))
+        self.assertEqual(points[0].tolist(), [0,0,0],
+                         "Vertices not in order of first occurance!")
+
+    def test_orientation(self):
+        """Verify faces are reordered to match the facet normals."""
+        facet_list = tetrahedron()
+        facet_list[0].vertices.reverse()
+        points, faces = stl_tools.get_indexed_mesh(facet_list)
+        for facet, face in zip(facet_list, faces.tolist()):
+            p0, p1, p2 = [points[i].tolist() for i in face]
+            normal = stl_tools.cross_prod(stl_tools.vect_sub(p1, p0),
+                                          stl_tools.vect_sub(p2, p0))
+            self.assertTrue(stl_tools.dot_prod(normal, facet.ow_normal) > 0,
+                            "Face {0} is not counter-clockwise!".format(face))
+
+    def test_degenerate(self):
+        """Verify faces collapsed by welding are dropped."""
+        facet_list = tetrahedron()
+        sliver = stl_tools.stl_facet([(0,0,0), (1,0,0), (1,0,1e-9)], (0,1,0))
+        points, faces = stl_tools.get_indexed_mesh(facet_list + [sliver], decimals=5)
+        self.assertEqual(len(faces), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
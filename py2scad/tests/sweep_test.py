@@ -0,0 +1,117 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from py2scad import sweep
+from py2scad import utility
+from py2scad.base import SCAD_Prog
+from py2scad.primitives import Cube
+from render_test import make_fake_openscad
+
+def build_block(params):
+    """Sweep builder, a block of the given size (module level for pickling)."""
+    if params['size'] < 0:
+        raise ValueError, 'negative size'
+    comment = ''
+    if params.get('slow'):
+        comment = 'fake_openscad: sleep=1.0'
+    prog = SCAD_Prog()
+    prog.add(Cube(size=[params['size'], params['width'], 1], comment=comment))
+    return prog
+
+class Test_Sweep(unittest.TestCase):
+    """Test parameter sweeps."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # 2 and 2.0 give identical programs
+        self.grid = {'size': [1, 2, 2.0], 'width': [3, 4]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_sweep(self, builder=build_block, **kwargs):
+        results = list(sweep.sweep(builder, self.grid, directory=self.tmpdir, **kwargs))
+        return sorted(results, key=lambda result: result.index)
+
+    def test_expand_grid(self):
+        """Verify grid expansion with constant and base parameters."""
+        param_list = sweep.expand_grid({'a': [1, 2], 'b': [3, 4], 'c': 5}, base_params={'d': 6})
+        self.assertEqual(len(param_list), 4)
+        self.assertEqual(param_list[0], {'a': 1, 'b': 3, 'c': 5, 'd': 6})
+
+    def test_params_hash(self):
+        """Verify equal parameters have equal hashes."""
+        self.assertEqual(utility.params_hash({'a': (1, 2), 'b': 2}),
+                         utility.params_hash({'b': 2.0, 'a': [1.0, 2.0]}))
+        self.assertNotEqual(utility.params_hash({'a': 1}), utility.params_hash({'a': 2}))
+
+    def check_results(self, results):
+        self.assertEqual(len(results), 6)
+        duplicates = [result for result in results if result.duplicate_of]
+        self.assertEqual(len(duplicates), 2, "Expected two duplicate variants!")
+        for result in duplicates:
+            self.assertEqual(result.scadfile, None)
+        written = sorted(name for name in os.listdir(self.tmpdir) if name.endswith('.scad'))
+        self.assertEqual(len(written), 4)
+
+    def test_serial(self):
+        """Verify a sweep in this process."""
+        self.check_results(self.run_sweep(processes=0))
+
+    def test_pool(self):
+        """Verify a sweep in a process pool."""
+        self.check_results(self.run_sweep(processes=2))
+
+    def test_render(self):
+        """Verify unique variants are rendered."""
+        openscad = make_fake_openscad(self.tmpdir)
+        results = self.run_sweep(processes=2, render_ext='.stl', openscad=openscad)
+        rendered = [result for result in results if result.render is not None]
+        self.assertEqual(len(rendered), 4)
+        self.assertTrue(all(result.ok() for result in results))
+        for result in rendered:
+            self.assertTrue(os.path.exists(result.render.outfile))
+
+    def test_completion_order(self):
+        """Verify renders are yielded as they finish, not in submission order."""
+        openscad = make_fake_openscad(self.tmpdir)
+        grid = {'size': [1, 2, 3], 'width': 1, 'slow': [True, False]}
+        # One more process than slow renders leaves a worker for the fast ones
+        results = list(sweep.sweep(build_block, grid, directory=self.tmpdir, processes=4,
+                                   render_ext='.stl', openscad=openscad))
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result.ok() for result in results))
+        slow = [i for i, result in enumerate(results) if result.params['slow']]
+        self.assertEqual(slow, [3, 4, 5], "Slow renders not yielded last!")
+
+    def test_unpicklable_builder(self):
+        """Verify a builder which can not be sent to the pool gives error results."""
+        results = self.run_sweep(processes=2, builder=lambda params: Cube())
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result.error and not result.ok() for result in results))
+
+    def test_errors(self):
+        """Verify builder errors are reported without stopping the sweep."""
+        self.grid['size'] = [-1, 1]
+        results = self.run_sweep(processes=2)
+        self.assertEqual(len(results), 4)
+        errors = [result for result in results if result.error]
+        self.assertEqual(len(errors), 2)
+        self.assertTrue('negative size' in errors[0].error)
+        self.assertFalse(errors[0].ok())
@@ -0,0 +1,102 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import unittest
+from py2scad.transforms import Hull, Minkowski
+from py2scad.transforms import LinearArray, GridArray, PolarArray, PointArray, Pattern_Array
+from py2scad.primitives import Cube, Sphere
+
+class Test_CSG(unittest.TestCase):
+    """Test the csg operation objects."""
+
+    def test_hull(self):
+        """Verify hull wraps its children."""
+        output = str(Hull([Cube(), Sphere()]))
+        self.assertTrue(output.startswith('hull()'),
+                        "Missing hull command: {0}".format(output))
+        self.assertTrue('cube' in output and 'sphere' in output,
+                        "Missing hull children: {0}".format(output))
+
+    def test_minkowski(self):
+        """Verify minkowski wraps its children."""
+        output = str(Minkowski([Cube(), Sphere()]))
+        self.assertTrue(output.startswith('minkowski()'),
+                        "Missing minkowski command: {0}".format(output))
+        self.assertEqual(output.count('{'), output.count('}'),
+                         "Non-matching braces!")
+
+class Test_Arrays(unittest.TestCase):
+    """Test the array and pattern objects."""
+
+    def setUp(self):
+        self.cube = Cube(size=[1,1,1])
+
+    def test_grid_loop(self):
+        """Verify grid arrays are emitted as loops."""
+        grid = GridArray(self.cube, n=(100,100), v=(2,2), center=True)
+        output = str(grid)
+        self.assertEqual(grid.num_instances(), 10000)
+        self.assertTrue(output.startswith('for (i = [0:99]) for (j = [0:99])'),
+                        "Grid not emitted as a loop: {0}".format(output))
+        self.assertEqual(output.count('cube'), 1,
+                         "Loop body emitted more than once!")
+        self.assertEqual(len(output.split('\n')), 3,
+                         "Unexpected loop output: {0}".format(output))
+
+    def test_linear_positions(self):
+        """Verify centered linear array positions."""
+        arr = LinearArray(self.cube, n=3, v=[2,0,0], center=True)
+        self.assertEqual(arr.positions().tolist(),
+                         [[-2,0,0], [0,0,0], [2,0,0]])
+
+    def test_polar_positions(self):
+        """Verify polar array positions lie on the circle."""
+        arr = PolarArray(self.cube, n=4, r=2)
+        points = arr.positions()
+        self.assertEqual(len(points), 4)
+        for x, y, z in points.tolist():
+            self.assertAlmostEqual(x**2 + y**2, 4.0)
+        self.assertTrue('rotate(a=[0, 0, i*90.00000])' in str(arr),
+                        "Bad polar loop: {0}".format(arr))
+
+    def test_inline(self):
+        """Verify inline arrays are emitted as a union of copies."""
+        arr = GridArray(self.cube, n=(2,3), v=(1,1), inline=True)
+        output = str(arr)
+        self.assertTrue(output.startswith('union()'),
+                        "Inline array is not a union: {0}".format(output))
+        self.assertEqual(output.count('cube'), 6,
+                         "Expected a copy per grid point!")
+
+    def test_abstract_base(self):
+        """Verify the base array can not be instantiated."""
+        self.assertRaises(TypeError, Pattern_Array, self.cube)
+
+    def test_empty_arrays(self):
+        """Verify arrays without copies are rejected."""
+        self.assertRaises(ValueError, LinearArray, self.cube, n=0)
+        self.assertRaises(ValueError, GridArray, self.cube, n=(3,0), v=(1,1))
+        self.assertRaises(ValueError, PolarArray, self.cube, n=0)
+        self.assertRaises(ValueError, PointArray, self.cube, [])
+
+    def test_point_array(self):
+        """Verify point arrays loop over the given points."""
+        output = str(PointArray(self.cube, [[0,0],[1,2]]))
+        self.assertTrue('[[0.00000, 0.00000], [1.00000, 2.00000]]' in output,
+                        "Missing points vector: {0}".format(output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import unittest
+from py2scad import tree_stats
+from py2scad import lod
+from py2scad.base import SCAD_Prog
+from py2scad.primitives import Cube, Sphere, Cylinder, Circle
+from py2scad.transforms import Translate, Rotate, Union, Difference, Linear_Extrude, GridArray
+
+class Test_Fragments(unittest.TestCase):
+    """Test the openscad fragment formula."""
+
+    def test_defaults(self):
+        """Verify fragments with the default $fa and $fs."""
+        self.assertEqual(tree_stats.get_fragments(1.0), 5)
+        self.assertEqual(tree_stats.get_fragments(10.0), 30)
+
+    def test_fn(self):
+        """Verify $fn overrides $fa and $fs with a minimum of 3."""
+        self.assertEqual(tree_stats.get_fragments(10.0, fn=50), 50)
+        self.assertEqual(tree_stats.get_fragments(10.0, fn=2), 3)
+
+    def test_fs(self):
+        """Verify $fs limits the fragments of small circles."""
+        self.assertEqual(tree_stats.get_fragments(1.0, fa=1, fs=0.1), 63)
+
+class Test_Tree_Stats(unittest.TestCase):
+    """Test the tree statistics pass."""
+
+    def setUp(self):
+        self.prog = SCAD_Prog(fn=20)
+        part = Difference([Cube(size=[10,10,10]), Cylinder(h=12, r1=2)])
+        self.prog.add(Translate(Union([part, Sphere(r=3)]), v=[1,0,0]))
+
+    def test_counts(self):
+        """Verify node counts, depth and boolean operations."""
+        stats = tree_stats.get_stats(self.prog)
+        self.assertEqual(stats.num_nodes, 6)
+        self.assertEqual(stats.node_counts['Cube'], 1)
+        self.assertEqual(stats.max_depth, 3)
+        self.assertEqual(stats.num_booleans, 2)
+
+    def test_facets(self):
+        """Verify facet estimates use the program $fn."""
+        stats = tree_stats.get_stats(self.prog)
+        cylinder = 2*20 + 2*18
+        sphere = 2*20*9 + 2*18
+        self.assertEqual(stats.facets, 12 + cylinder + sphere)
+
+    def test_object_settings(self):
+        """Verify object facet settings take precedence."""
+        stats = tree_stats.get_stats(Sphere(r=3, fn=4))
+        self.assertEqual(stats.facets, 2*4*1 + 2*2)
+
+    def test_lod(self):
+        """Verify facet estimates follow the level of detail policy."""
+        self.prog.lod = lod.LOD_Policy(tolerance=0.1, min_fn=3, max_fn=8)
+        stats = tree_stats.get_stats(self.prog)
+        cylinder = 2*8 + 2*6
+        sphere = 2*8*3 + 2*6
+        self.assertEqual(stats.facets, 12 + cylinder + sphere)
+
+    def test_arrays(self):
+        """Verify array facets are multiplied by the instance count."""
+        grid = GridArray(Cube(size=[1,1,1]), n=(10,10), v=(2,2))
+        self.assertEqual(tree_stats.get_stats(grid).facets, 1200)
+
+    def test_extrude(self):
+        """Verify extrusions of 2D objects."""
+        obj = Linear_Extrude(Circle(r=1, fn=10), h=1)
+        self.assertEqual(tree_stats.get_stats(obj).facets, 2*10 + 2*8)
+
+    def test_unresolved(self):
+        """Verify sizes given as expressions are reported unresolved."""
+        stats = tree_stats.get_stats(Sphere(r='radius'))
+        self.assertEqual(stats.unresolved, 1)
+        self.assertEqual(stats.facets, 0)
+
+    def test_bounds(self):
+        """Verify bounding boxes of trees and unknown sizes."""
+        self.assertEqual(tree_stats.get_bounds(self.prog), ((-4.0, -5.0, -5.0), (6.0, 5.0, 5.0)))
+        grid = GridArray(Cube(size=[1,1,1], center=False), n=(10,10), v=(2,2))
+        self.assertEqual(tree_stats.get_bounds(grid), ((0, 0, 0), (19, 19, 1)))
+        lower, upper = tree_stats.get_bounds(Rotate(Cube(size=[2,4,6]), v=[0,0,90]))
+        for a, b in zip(lower + upper, (-2, -1, -3, 2, 1, 3)):
+            self.assertAlmostEqual(a, b)
+        extrude = Linear_Extrude(Circle(r=1), h=2, center=False)
+        self.assertEqual(tree_stats.get_bounds(extrude), ((-1, -1, 0), (1, 1, 2)))
+        self.assertEqual(tree_stats.get_bounds(Sphere(r='radius')), None)
+        self.assertEqual(tree_stats.get_bounds('cube();'), None)
+
+    def test_budget(self):
+        """Verify programs over budget are rejected."""
+        stats = tree_stats.check_budget(self.prog, max_facets=1000)
+        self.assertTrue(stats.facets < 1000)
+        self.assertRaises(tree_stats.Budget_Error, tree_stats.check_budget,
+                          self.prog, max_facets=100)
+        self.assertRaises(tree_stats.Budget_Error, tree_stats.check_budget,
+                          self.prog, max_booleans=1)
@@ -13,6 +13,10 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import base
 import utility
 
@@ -37,8 +41,17 @@ class Assembly(base.SCAD_CMP_Object):
             mod = ''
         if len(args) > len(self.args):
             raise TypeError("{0}() takes exactly {1} argument(s) ({2} given)".format(self.name, len(self.args), len(args)))
-        return "{0}{1}({2});".format(mod, self.name,
+        call_str = "{0}{1}({2});".format(mod, self.name,
                 ', '.join(utility.val_to_str(arg) for arg in args))
+        return Module_Call(call_str, self)
+
+class Module_Call(str):
+    """A module call string which remembers the Assembly it calls."""
+
+    def __new__(cls, call_str, assembly):
+        rtn_val = str.__new__(cls, call_str)
+        rtn_val.assembly = assembly
+        return rtn_val
 
 # 3D transformations ---------------------------------------------------------
 
@@ -152,6 +165,222 @@ class Intersection(base.SCAD_CMP_Object):
     def cmd_str(self,tab_level=0):
         return 'intersection()'
 
+class Hull(base.SCAD_CMP_Object):
+    """Convex hull of contained objects."""
+
+    def cmd_str(self,tab_level=0):
+        return 'hull()'
+
+class Minkowski(base.SCAD_CMP_Object):
+    """Minkowski sum of contained objects."""
+
+    def cmd_str(self,tab_level=0):
+        return 'minkowski()'
+
+# Arrays and patterns --------------------------------------------------------
+
+def _linear_expr(start, step, var):
+    """Returns the openscad expression for start + var*step."""
+    if step == 0:
+        return '{0:0.5f}'.format(start)
+    term = '{0}*{1:0.5f}'.format(var, step)
+    if start == 0:
+        return term
+    return '{0:0.5f} + {1}'.format(start, term)
+
+class Pattern_Array(base.SCAD_CMP_Object):
+    """
+    Base class for arrays of copies of the contained objects. By default the
+    array is emitted as an openscad for loop, so the size of the output does
+    not depend on the number of copies. When inline is True the copies are
+    emitted as a union of transformed objects instead, with the positions
+    computed as a numpy array.
+
+    This is an abstract base class which can not be instantiated,
+    subclasses implement num_instances, positions and cmd_str.
+    """
+
+    def __init__(self, obj, inline=False, *args, **kwargs):
+        if type(self) is Pattern_Array:
+            raise TypeError, 'Pattern_Array is an abstract base class'
+        base.SCAD_CMP_Object.__init__(self, obj, *args, **kwargs)
+        self.inline = inline
+
+    def num_instances(self):
+        """Returns the number of copies in the array."""
+        raise NotImplementedError
+
+    def positions(self):
+        """
+        Returns an (N,3) array of the offsets of the copies, N being
+        num_instances(). Used for inline output and by export2d.
+        """
+        raise NotImplementedError
+
+    def cmd_str(self,tab_level=0):
+        raise NotImplementedError
+
+    def inline_obj(self):
+        """Returns the array as a union of translated objects."""
+        obj_list = [Translate(self.obj, v=p) for p in self.positions().tolist()]
+        return Union(obj_list, mod=self.mod, comment=self.comment)
+
+    def __str__(self, tab_level=0):
+        if self.inline:
+            return self.inline_obj().__str__(tab_level=tab_level)
+        return base.SCAD_CMP_Object.__str__(self, tab_level=tab_level)
+
+class LinearArray(Pattern_Array):
+    """
+    Copies of the contained objects spaced by step vector v. If center is True
+    the array is centered on the origin, otherwise the first copy is at the
+    origin.
+    """
+
+    def __init__(self, obj, n=1, v=[1.0,0.0,0.0], center=False, *args, **kwargs):
+        Pattern_Array.__init__(self, obj, center=center, *args, **kwargs)
+        if n < 1:
+            raise ValueError, 'array count must be at least 1, got {0}'.format(n)
+        self.n = n
+        self.v = v
+
+    def num_instances(self):
+        return self.n
+
+    def start(self):
+        if self.center:
+            return [-0.5*(self.n-1)*x + 0.0 for x in self.v]
+        return [0.0 for x in self.v]
+
+    def positions(self):
+        steps = numpy.arange(self.n).reshape(-1,1)
+        return numpy.asarray(self.start()) + steps*numpy.asarray(self.v, dtype=float)
+
+    def cmd_str(self,tab_level=0):
+        terms = [_linear_expr(x0, dx, 'i') for x0, dx in zip(self.start(), self.v)]
+        return 'for (i = [0:{0:d}]) translate(v=[{1}])'.format(self.n-1, ', '.join(terms))
+
+class GridArray(Pattern_Array):
+    """
+    Copies of the contained objects on a rectangular grid with counts n=(nx,ny)
+    or n=(nx,ny,nz) and spacing v=(dx,dy) or v=(dx,dy,dz). If center is True
+    the grid is centered on the origin.
+    """
+
+    loop_vars = ('i', 'j', 'k')
+
+    def __init__(self, obj, n=(1,1), v=(1.0,1.0), center=False, *args, **kwargs):
+        Pattern_Array.__init__(self, obj, center=center, *args, **kwargs)
+        assert len(n) == len(v), 'counts and spacing must have the same length'
+        if min(n) < 1:
+            raise ValueError, 'array counts must be at least 1, got {0}'.format(n)
+        self.n = n
+        self.v = v
+
+    def num_instances(self):
+        count = 1
+        for n in self.n:
+            count *= n
+        return count
+
+    def start(self):
+        if self.center:
+            return [-0.5*(n-1)*x + 0.0 for n, x in zip(self.n, self.v)]
+        return [0.0 for x in self.v]
+
+    def positions(self):
+        axes = [x0 + dx*numpy.arange(n) for x0, dx, n in zip(self.start(), self.v, self.n)]
+        grids = numpy.meshgrid(*axes, indexing='ij')
+        points = numpy.zeros((self.num_instances(), 3))
+        for i, grid in enumerate(grids):
+            points[:,i] = grid.ravel()
+        return points
+
+    def cmd_str(self,tab_level=0):
+        loops = []
+        terms = []
+        for var, x0, dx, n in zip(self.loop_vars, self.start(), self.v, self.n):
+            loops.append('for ({0} = [0:{1:d}])'.format(var, n-1))
+            terms.append(_linear_expr(x0, dx, var))
+        if len(terms) == 2:
+            terms.append('0')
+        return '{0} translate(v=[{1}])'.format(' '.join(loops), ', '.join(terms))
+
+class PolarArray(Pattern_Array):
+    """
+    n copies of the contained objects rotated about the z axis. The copies are
+    placed at radius r, starting at angle a0 (degrees) and spread over angle a.
+    A full circle, a=360, gives n equally spaced copies.
+    """
+
+    def __init__(self, obj, n=1, r=0.0, a=360.0, a0=0.0, *args, **kwargs):
+        Pattern_Array.__init__(self, obj, *args, **kwargs)
+        if n < 1:
+            raise ValueError, 'array count must be at least 1, got {0}'.format(n)
+        self.n = n
+        self.r = r
+        self.a = a
+        self.a0 = a0
+
+    def num_instances(self):
+        return self.n
+
+    def step(self):
+        if self.a % 360.0 == 0 or self.n < 2:
+            return self.a/float(self.n)
+        return self.a/float(self.n-1)
+
+    def angles(self):
+        """Returns the array of rotation angles (degrees) of the copies."""
+        return self.a0 + self.step()*numpy.arange(self.n)
+
+    def positions(self):
+        angles = numpy.radians(self.angles())
+        points = numpy.zeros((self.n, 3))
+        points[:,0] = self.r*numpy.cos(angles)
+        points[:,1] = self.r*numpy.sin(angles)
+        return points
+
+    def inline_obj(self):
+        obj_list = []
+        for ang in self.angles().tolist():
+            obj = Translate(self.obj, v=[self.r, 0, 0])
+            obj_list.append(Rotate(obj, v=[0, 0, ang]))
+        return Union(obj_list, mod=self.mod, comment=self.comment)
+
+    def cmd_str(self,tab_level=0):
+        a_str = _linear_expr(self.a0, self.step(), 'i')
+        rtn_str = 'for (i = [0:{0:d}]) rotate(a=[0, 0, {1}])'.format(self.n-1, a_str)
+        if self.r:
+            rtn_str = '{0} translate(v=[{1:0.5f}, 0, 0])'.format(rtn_str, self.r)
+        return rtn_str
+
+class PointArray(Pattern_Array):
+    """
+    Copies of the contained objects translated to each of the given points.
+    The points, a list or (N,2) or (N,3) array, are emitted as a single
+    vector which the for loop iterates over.
+    """
+
+    def __init__(self, obj, points, *args, **kwargs):
+        Pattern_Array.__init__(self, obj, *args, **kwargs)
+        if len(points) == 0:
+            raise ValueError, 'point array needs at least one point'
+        self.points = points
+
+    def num_instances(self):
+        return len(self.points)
+
+    def positions(self):
+        points = numpy.asarray(self.points, dtype=float)
+        if points.shape[1] == 2:
+            points = numpy.column_stack([points, numpy.zeros(len(points))])
+        return points
+
+    def cmd_str(self,tab_level=0):
+        points_str = ', '.join(utility.val_to_str(p) for p in self.points)
+        return 'for (p = [{0}]) translate(v=p)'.format(points_str)
+
 # 2D to 3D Extrusion -----------------------------------------------------------
 
 class Linear_Extrude(base.SCAD_CMP_Object):
@@ -0,0 +1,371 @@
+"""
+Copyright 2010  IO Rodeo Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Tree statistics and render complexity estimates.
+
+A cheap pass over a program, or any object tree, which counts the objects by
+class, the tree depth and the number of boolean operations and estimates the
+number of facets openscad will produce. Facets are estimated from the object
+sizes and the $fn, $fa and $fs settings using openscad's fragment formula.
+Use check_budget to reject programs which are too complex before rendering.
+get_bounds estimates the bounding box of a tree in the same way.
+"""
+import math
+import numpy
+import base
+import utility
+import primitives
+import transforms
+import export2d
+
+# Openscad default facet settings
+DEFAULT_FN = 0
+DEFAULT_FA = 12.0
+DEFAULT_FS = 2.0
+GRID_FINE = 0.00000095367431640625
+
+BOOLEAN_TYPES = (transforms.Union, transforms.Difference, transforms.Intersection,
+                 transforms.Hull, transforms.Minkowski)
+
+class Budget_Error(RuntimeError):
+    """Raised by check_budget when a program exceeds its render budget."""
+    pass
+
+def get_fragments(r, fn=None, fa=None, fs=None):
+    """
+    Returns the number of fragments openscad uses for a circle of radius r
+    with the given $fn, $fa and $fs settings. r may be None for an unknown
+    radius when $fn is set, otherwise None is returned.
+    """
+    fn = DEFAULT_FN if fn is None else fn
+    fa = DEFAULT_FA if fa is None else fa
+    fs = DEFAULT_FS if fs is None else fs
+    if r is not None and r < GRID_FINE:
+        return 3
+    if fn > 0:
+        return max(int(fn), 3)
+    if r is None:
+        return None
+    return int(math.ceil(max(min(360.0/fa, r*2*math.pi/fs), 5.0)))
+
+class Tree_Stats(object):
+    """
+    Statistics of an object tree.
+
+    node_counts  = dictionary of the number of objects of each class
+    num_nodes    = total number of objects
+    max_depth    = maximum depth of the tree
+    num_booleans = number of boolean operations (union, difference, etc.)
+    facets       = estimated number of facets (triangles, or edges for 2D)
+    unresolved   = number of objects whose facets could not be estimated,
+                   e.g. imports or sizes given as expressions
+    """
+
+    def __init__(self):
+        self.node_counts = {}
+        self.num_nodes = 0
+        self.max_depth = 0
+        self.num_booleans = 0
+        self.facets = 0
+        self.unresolved = 0
+
+    def __str__(self):
+        lines = [
+                'nodes:      {0}'.format(self.num_nodes),
+                'max depth:  {0}'.format(self.max_depth),
+                'booleans:   {0}'.format(self.num_booleans),
+                'facets:     {0}'.format(self.facets),
+                'unresolved: {0}'.format(self.unresolved),
+                ]
+        for name in sorted(self.node_counts):
+            lines.append('  {0:<20} {1}'.format(name, self.node_counts[name]))
+        return '\n'.join(lines)
+
+class Facet_Settings(object):
+    """Global facet settings and level of detail policy in effect while estimating facets."""
+
+    def __init__(self, fn=None, fa=None, fs=None, lod=None):
+        self.fn = fn
+        self.fa = fa
+        self.fs = fs
+        self.lod = lod
+
+    def fragments(self, obj, r=None, use_lod=True):
+        """
+        Returns the fragments for obj, of feature size r by default, as they
+        will be written. None if they depend on an unknown size.
+        """
+        if r is None:
+            r = obj.feature_size()
+        if use_lod and self.lod is not None and r is not None and self.lod.applies(obj):
+            return self.lod.get_fn(r)
+        if obj.fn:
+            return get_fragments(r, fn=obj.fn)
+        fa = obj.fa if obj.fa else self.fa
+        fs = obj.fs if obj.fs else self.fs
+        return get_fragments(r, fn=self.fn, fa=fa, fs=fs)
+
+def get_stats(prog, fn=None, fa=None, fs=None, lod=None):
+    """
+    Returns the Tree_Stats of prog, a SCAD_Prog, object or list of objects.
+    The global facet settings and level of detail policy are taken from the
+    program, or may be given for objects.
+    """
+    if isinstance(prog, base.SCAD_Prog):
+        fn, fa, fs, lod = prog.fn, prog.fa, prog.fs, prog.lod
+        obj_list = prog.objlist
+    elif type(prog) == list:
+        obj_list = prog
+    else:
+        obj_list = [prog]
+    stats = Tree_Stats()
+    settings = Facet_Settings(fn=fn, fa=fa, fs=fs, lod=lod)
+    for obj in obj_list:
+        stats.facets += _visit(obj, 0, settings, stats)
+    return stats
+
+def check_budget(prog, max_facets=None, max_booleans=None, max_depth=None):
+    """
+    Check the estimated complexity of prog against a render budget. Returns
+    the Tree_Stats, raises a Budget_Error if any limit is exceeded.
+    """
+    stats = get_stats(prog)
+    checks = (
+            ('facets', stats.facets, max_facets),
+            ('boolean operations', stats.num_booleans, max_booleans),
+            ('depth', stats.max_depth, max_depth),
+            )
+    for name, value, limit in checks:
+        if limit is not None and value > limit:
+            raise Budget_Error('estimated {0} {1} exceeds budget {2}'.format(name, value, limit))
+    return stats
+
+def _visit(obj, depth, settings, stats):
+    """Count obj and its children into stats and return its estimated facets."""
+    if isinstance(obj, base.SCAD_Object):
+        name = obj.__class__.__name__
+    elif isinstance(obj, primitives.Variables):
+        name = 'Variables'
+    else:
+        name = 'module call'
+    stats.node_counts[name] = stats.node_counts.get(name, 0) + 1
+    stats.num_nodes += 1
+    stats.max_depth = max(stats.max_depth, depth)
+    if not isinstance(obj, base.SCAD_Object):
+        return 0
+    if isinstance(obj, BOOLEAN_TYPES):
+        stats.num_booleans += 1
+
+    if not obj.is_cmp():
+        facets = primitive_facets(obj, settings)
+        if facets is None:
+            stats.unresolved += 1
+            facets = 0
+        return facets
+
+    child_facets = [_visit(child, depth+1, settings, stats) for child in obj.obj]
+    if isinstance(obj, transforms.Assembly):
+        # Module definitions are only rendered where they are called
+        return 0
+    if isinstance(obj, transforms.Minkowski):
+        facets = 1
+        for val in child_facets:
+            facets *= max(val, 1)
+    elif isinstance(obj, transforms.Linear_Extrude):
+        edges = sum(child_facets)
+        slices = obj.slices if obj.slices else 1
+        facets = 2*edges*slices + 2*max(edges-2, 0)
+    elif isinstance(obj, transforms.Rotate_Extrude):
+        edges = sum(child_facets)
+        facets = 2*edges*settings.fragments(obj, r=1.0e6, use_lod=False)
+    else:
+        facets = sum(child_facets)
+    if isinstance(obj, transforms.Pattern_Array):
+        facets *= obj.num_instances()
+    return facets
+
+def primitive_facets(obj, settings):
+    """
+    Returns the estimated facets of a primitive, triangles for 3D objects and
+    edges for 2D objects, or None if it can not be estimated.
+    """
+    if isinstance(obj, (primitives.Include, primitives.Use)):
+        return 0
+    if isinstance(obj, primitives.Cube):
+        return 12
+    if isinstance(obj, primitives.Square):
+        return 4
+    if isinstance(obj, primitives.Sphere):
+        num = settings.fragments(obj)
+        if num is None:
+            return None
+        rings = (num + 1)//2
+        return 2*num*(rings - 1) + 2*(num - 2)
+    if isinstance(obj, primitives.Cylinder):
+        num = settings.fragments(obj)
+        if num is None:
+            return None
+        # A cone has a single cap and triangular sides
+        if 0 in (utility.as_number(obj.r1), utility.as_number(obj.r2)):
+            return num + (num - 2)
+        return 2*num + 2*(num - 2)
+    if isinstance(obj, primitives.Circle):
+        return settings.fragments(obj)
+    if isinstance(obj, primitives.Polyhedron):
+        return sum(len(face) - 2 for face in obj.faces)
+    if isinstance(obj, primitives.Polygon):
+        return len(obj.points)
+    return None
+
+def get_bounds(prog):
+    """
+    Returns the bounding box ((xmin, ymin, zmin), (xmax, ymax, zmax)) of prog,
+    a SCAD_Prog, object or list of objects, estimated without rendering.
+    Returns None if it is unknown: for scad text, imports, module calls,
+    sizes given as expressions and objects it does not know. The box may be
+    larger than the rendered part, never smaller.
+    """
+    if isinstance(prog, base.SCAD_Prog):
+        prog = prog.objlist
+    bounds = _bounds(prog)
+    if bounds is None:
+        return None
+    return tuple(bounds[0].tolist()), tuple(bounds[1].tolist())
+
+def _vec3(val):
+    """Returns a scalar, 2 or 3 vector as a float 3 vector, z is 0 for a 2 vector."""
+    vec = numpy.zeros(3)
+    val = numpy.asarray(val, dtype=float)
+    if val.ndim == 0:
+        vec[:] = val
+    else:
+        vec[:len(val)] = val[:3]
+    return vec
+
+def _box(lower, upper):
+    return numpy.array([lower, upper], dtype=float)
+
+def _union_bounds(obj_list):
+    boxes = [_bounds(obj) for obj in obj_list if not isinstance(obj, primitives.Variables)]
+    if not boxes or any(box is None for box in boxes):
+        return None
+    boxes = numpy.array(boxes)
+    return _box(boxes[:,0].min(axis=0), boxes[:,1].max(axis=0))
+
+def _linear_bounds(bounds, mat):
+    """Box of the corners of bounds mapped by the linear map mat."""
+    corners = numpy.array([[x, y, z] for x in bounds[:,0] for y in bounds[:,1]
+                           for z in bounds[:,2]])
+    corners = numpy.dot(corners, mat.T)
+    return _box(corners.min(axis=0), corners.max(axis=0))
+
+def _radius_bounds(bounds):
+    """Box of bounds swept about the z axis."""
+    r = numpy.sqrt(numpy.abs(bounds[:,0]).max()**2 + numpy.abs(bounds[:,1]).max()**2)
+    return _box((-r, -r, bounds[0,2]), (r, r, bounds[1,2]))
+
+def _bounds(obj):
+    if isinstance(obj, (list, tuple)):
+        return _union_bounds(obj)
+    if not isinstance(obj, base.SCAD_Object):
+        return None
+    try:
+        bounds = _object_bounds(obj)
+        if bounds is not None and obj.translate:
+            bounds = bounds + _vec3(obj.translate)
+    except (TypeError, ValueError):
+        # Sizes given as openscad expressions
+        return None
+    return bounds
+
+def _object_bounds(obj):
+    if isinstance(obj, (primitives.Cube, primitives.Square)):
+        size = _vec3(obj.size)
+        if isinstance(obj, primitives.Square):
+            size[2] = 0.0
+        lower = -0.5*size if obj.center else numpy.zeros(3)
+        return _box(lower, lower + size)
+    if isinstance(obj, (primitives.Sphere, primitives.Circle)):
+        r = float(obj.r)
+        rz = r if isinstance(obj, primitives.Sphere) else 0.0
+        return _box((-r, -r, -rz), (r, r, rz))
+    if isinstance(obj, primitives.Cylinder):
+        r = max(float(obj.r1), float(obj.r1 if obj.r2 is None else obj.r2))
+        h = float(obj.h)
+        z0 = -0.5*h if obj.center else 0.0
+        return _box((-r, -r, z0), (r, r, z0 + h))
+    if isinstance(obj, (primitives.Polyhedron, primitives.Polygon)):
+        points = numpy.asarray(obj.points, dtype=float)
+        if len(points) == 0:
+            return None
+        lower = _vec3(points.min(axis=0))
+        upper = _vec3(points.max(axis=0))
+        return _box(lower, upper)
+    if not obj.is_cmp() or isinstance(obj, transforms.Assembly):
+        return None
+
+    if isinstance(obj, transforms.Difference):
+        bounds = _union_bounds(obj.obj[:1])
+    elif isinstance(obj, transforms.Minkowski):
+        boxes = [_bounds(child) for child in obj.obj]
+        if not boxes or any(box is None for box in boxes):
+            return None
+        bounds = sum(boxes)
+    elif isinstance(obj, (transforms.Union, transforms.Intersection, transforms.Hull,
+                          transforms.Color)):
+        bounds = _union_bounds(obj.obj)
+    elif isinstance(obj, (transforms.Translate, transforms.Rotate, transforms.Scale,
+                          transforms.Mirror, transforms.Pattern_Array,
+                          transforms.Linear_Extrude, transforms.Rotate_Extrude,
+                          transforms.Projection)):
+        bounds = _union_bounds(obj.obj)
+        if bounds is not None:
+            bounds = _transform_bounds(obj, bounds)
+    else:
+        return None
+    return bounds
+
+def _transform_bounds(obj, bounds):
+    """Box of the contents bounds of a transform."""
+    if isinstance(obj, transforms.Translate):
+        return bounds + _vec3(obj.v)
+    if isinstance(obj, transforms.Rotate):
+        return _linear_bounds(bounds, export2d.rotation_matrix(obj))
+    if isinstance(obj, transforms.Scale):
+        return _linear_bounds(bounds, numpy.diag(_vec3(obj.v)))
+    if isinstance(obj, transforms.Mirror):
+        v = _vec3(obj.v)
+        v = v/numpy.sqrt(numpy.dot(v, v))
+        return _linear_bounds(bounds, numpy.eye(3) - 2*numpy.outer(v, v))
+    if isinstance(obj, transforms.PolarArray):
+        return _radius_bounds(bounds + (float(obj.r), 0.0, 0.0))
+    if isinstance(obj, transforms.Pattern_Array):
+        positions = obj.positions()
+        return _box(bounds[0] + positions.min(axis=0), bounds[1] + positions.max(axis=0))
+    if isinstance(obj, transforms.Linear_Extrude):
+        h = float(obj.h)
+        z0 = -0.5*h if obj.center else 0.0
+        bounds = _box((bounds[0,0], bounds[0,1], z0), (bounds[1,0], bounds[1,1], z0 + h))
+        if float(obj.twist):
+            bounds = _radius_bounds(bounds)
+        return bounds
+    if isinstance(obj, transforms.Rotate_Extrude):
+        # The profile in the xz plane swept about the z axis
+        r = numpy.abs(bounds[:,0]).max()
+        return _box((-r, -r, bounds[0,1]), (r, r, bounds[1,1]))
+    # Projection
+    bounds = bounds.copy()
+    bounds[:,2] = 0.0
+    return bounds
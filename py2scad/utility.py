@@ -14,6 +14,12 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import math
+import hashlib
+import expression
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 TAB_WIDTH = 4
 #DEG2RAD = math.pi/180.0
@@ -51,18 +57,167 @@ def val_to_str(val ,tab_level=0):
     tab_str = '' + ' '*TAB_WIDTH*tab_level
     if type(val) == str:
         return tab_str + val
+    if isinstance(val, expression.Expr):
+        return tab_str + val.expr_str()
     try: # For sequence types produce a comma seperated listing
         iter(val) # prescribed way to check for iteration...
         # Just because I like the fixed width numbers
         str_val = list()
         for item in val:
-            if type(item) != str: # Format as float, five decimals precision
+            if isinstance(item, expression.Expr):
+                item = item.expr_str()
+            elif type(item) != str: # Format as float, five decimals precision
                 item = "{0:0.5f}".format(item)
             str_val.append(item)
         return tab_str + '[' + ', '.join("{0}".format(item) for item in str_val) + ']'
     except TypeError: # Format as float, five decimals precision
         return tab_str + "{0:0.5f}".format(val)
 
+def as_number(val):
+    """Returns val as a float, None for openscad expressions and other values."""
+    if type(val) == str:
+        return None
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+def add_expr(*vals):
+    """
+    Sum of numbers and openscad expressions (expression.Expr, such as
+    animation.Keyframes, or strings). Returns a float if all the values are
+    numbers, an Expr if the others are all Exprs, otherwise an expression
+    string.
+    """
+    total = 0.0
+    expr_sum = None
+    expr_list = []
+    for val in vals:
+        num = as_number(val)
+        if num is not None:
+            total += num
+        elif isinstance(val, expression.Expr):
+            expr_sum = val if expr_sum is None else expr_sum + val
+        else:
+            expr_list.append('({0})'.format(val))
+    if expr_sum is not None:
+        expr_sum = expr_sum + total
+        if not expr_list:
+            return expr_sum
+        expr_list.insert(0, val_to_str(expr_sum))
+    elif not expr_list:
+        return total
+    elif total:
+        expr_list.insert(0, val_to_str(total))
+    return ' + '.join(expr_list)
+
+def neg_expr(val):
+    """Negative of a number or an openscad expression."""
+    if isinstance(val, expression.Expr):
+        return -val
+    num = as_number(val)
+    if num is None:
+        return '-({0})'.format(val)
+    return -num
+
+def as_array(values, dtype=float):
+    """
+    Return values as a contiguous two dimensional array of the given dtype.
+    Values which do not form a regular numeric table, e.g. ragged face lists
+    or lists containing openscad expressions, are returned unchanged as are
+    all values when numpy is not available.
+    """
+    if numpy is None or type(values) == str:
+        return values
+    try:
+        arr = numpy.ascontiguousarray(values, dtype=dtype)
+    except (TypeError, ValueError):
+        return values
+    if arr.ndim != 2:
+        return values
+    return arr
+
+def is_array(values):
+    """Returns True if values is a numpy array."""
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+def check_indices(indices, num_points, name='index'):
+    """
+    Check that the point indices, an array or list of index lists, are in the
+    range [0, num_points). Raises a ValueError for out of range indices.
+    """
+    if is_array(indices):
+        flat = indices.ravel()
+    elif numpy is not None:
+        try:
+            flat = numpy.concatenate([numpy.asarray(x, dtype=int).ravel() for x in indices])
+        except (TypeError, ValueError):
+            return
+    else:
+        flat = [x for row in indices for x in row if type(x) == int]
+    if len(flat) == 0:
+        return
+    if is_array(flat):
+        lo, hi = flat.min(), flat.max()
+    else:
+        lo, hi = min(flat), max(flat)
+    if lo < 0 or hi >= num_points:
+        msg = '{0} out of range, must be in [0, {1}), got [{2}, {3}]'
+        raise ValueError, msg.format(name, num_points, lo, hi)
+
+def array_to_str(arr, tab_level=0, chunk_size=10000):
+    """
+    Format the rows of a two dimensional array, one row per line with each
+    line followed by a comma. Rows are formatted in bulk, straight from the
+    array, floats with five decimals precision and integers without.
+    """
+    tab_str = '' + ' '*TAB_WIDTH*tab_level
+    if arr.dtype.kind in 'iu':
+        item_fmt = '%d'
+    else:
+        item_fmt = '%0.5f'
+    row_fmt = tab_str + '[' + ', '.join([item_fmt]*arr.shape[1]) + '],\n'
+    str_list = []
+    for i in range(0, arr.shape[0], chunk_size):
+        chunk = arr[i:i+chunk_size]
+        str_list.append((row_fmt*chunk.shape[0]) % tuple(chunk.ravel().tolist()))
+    return ''.join(str_list)
+
+def rows_to_str(rows, tab_level=0):
+    """
+    Format the rows of an array or a list of sequences, one row per line with
+    each line followed by a comma.
+    """
+    if is_array(rows):
+        return array_to_str(rows, tab_level=tab_level)
+    return ''.join('{0},\n'.format(val_to_str(row, tab_level=tab_level)) for row in rows)
+
+def canonical_str(val):
+    """
+    Returns a canonical string of a parameter value: dictionaries are sorted
+    by key, tuples, lists and arrays are all written as lists and numbers are
+    written as floats at full precision. Equal parameters give equal strings.
+    """
+    # Exact types first, this is called for every parameter of cached parts
+    val_type = type(val)
+    if val_type is float:
+        return repr(val)
+    if val_type is int or val_type is long:
+        return repr(float(val))
+    if val_type is list or val_type is tuple:
+        return '[' + ', '.join([canonical_str(item) for item in val]) + ']'
+    if isinstance(val, dict):
+        items = sorted([(canonical_str(k), canonical_str(v)) for k, v in val.items()])
+        return '{' + ', '.join(['{0}: {1}'.format(k, v) for k, v in items]) + '}'
+    if numpy is not None and isinstance(val, (numpy.ndarray, numpy.generic)):
+        return canonical_str(val.tolist())
+    if isinstance(val, (list, tuple)):
+        return '[' + ', '.join([canonical_str(item) for item in val]) + ']'
+    return repr(val)
+
+def params_hash(params):
+    """Returns the sha1 hex digest of the canonical string of params."""
+    return hashlib.sha1(canonical_str(params)).hexdigest()
 
 def write_obj_list(obj_list, filename, fn=100):
     fid = open(filename,'w')